@@ -0,0 +1,117 @@
+"""ベンチマーク用のMP3ファイルを作る（エンコーダーは使わず、無音のフレームを並べる）
+
+MPEG-1 Layer III・44.1kHz・ステレオのフレームヘッダーの後を0で埋めると、
+サイド情報がすべて0の（デコードすると無音の）フレームになる。
+VBRのファイルはフレームごとにビットレートを変え、先頭にXingヘッダーを置く。
+"""
+import os
+import json
+import random
+import struct
+
+SAMPLE_RATE = 44100
+SAMPLES_PER_FRAME = 1152
+SIDE_INFO_SIZE = 32  # MPEG-1・ステレオ
+# MPEG-1 Layer III のビットレート（kbps）とヘッダーの番号
+BITRATES = {32: 1, 40: 2, 48: 3, 56: 4, 64: 5, 80: 6, 96: 7, 112: 8, 128: 9, 160: 10, 192: 11, 224: 12, 256: 13, 320: 14}
+VBR_BITRATES = (96, 128, 160, 192, 256, 320)
+CORPUS_VERSION = 2
+
+
+def frame_size(bitrate):
+    return 144000 * bitrate // SAMPLE_RATE
+
+
+def frame(bitrate):
+    """指定したビットレートの無音のフレーム"""
+    size = frame_size(bitrate)
+    header = struct.pack('>I', 0xFFFB0000 | BITRATES[bitrate] << 12)  # 44.1kHz・パディングなし・ステレオ
+    return header + bytes(size - 4)
+
+
+def xing_frame(frame_count, byte_count):
+    """VBRの長さを示すXingヘッダーのフレーム（このフレーム自体は数えない）"""
+    data = bytearray(frame(128))
+    offset = 4 + SIDE_INFO_SIZE
+    data[offset:offset + 16] = b'Xing' + struct.pack('>III', 0x3, frame_count, byte_count)
+    return bytes(data)
+
+
+def write_mp3(path, seconds, vbr=False, tags=None, seed=0):
+    """無音のMP3ファイルを書き、(フレーム数, バイト数) を返す"""
+    frame_count = max(1, round(seconds * SAMPLE_RATE / SAMPLES_PER_FRAME))
+    rng = random.Random(seed)
+    with open(path, 'wb') as f:
+        if vbr:
+            bitrates = [rng.choice(VBR_BITRATES) for _ in range(frame_count)]
+            frames = {bitrate: frame(bitrate) for bitrate in VBR_BITRATES}
+            byte_count = sum(len(frames[bitrate]) for bitrate in bitrates)
+            f.write(xing_frame(frame_count, byte_count))
+            for bitrate in bitrates:
+                f.write(frames[bitrate])
+        else:
+            data = frame(128)
+            f.write(data * frame_count)
+    if tags:
+        from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK
+        id3 = ID3()
+        id3.add(TIT2(encoding=3, text=[tags['title']]))
+        id3.add(TPE1(encoding=3, text=[tags['artist']]))
+        id3.add(TALB(encoding=3, text=[tags['album']]))
+        id3.add(TRCK(encoding=3, text=[tags['track']]))
+        id3.save(path)
+    return frame_count * SAMPLES_PER_FRAME / SAMPLE_RATE
+
+
+def build_corpus(directory, short_files=300, long_seconds=600):
+    """短い曲（タグ付き・CBRとVBR）と長い曲（CBR・VBR）を作り、一覧を返す
+
+    同じ条件で作ったコーパスが既にあればそのまま使う。
+    """
+    manifest_path = os.path.join(directory, 'manifest.json')
+    spec = {'version': CORPUS_VERSION, 'short_files': short_files, 'long_seconds': long_seconds}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('spec') == spec:
+            return manifest
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(1)
+    short = []
+    for i in range(short_files):
+        album = i // 12
+        path = os.path.join(directory, 'short', f"album{album:03d}", f"{i % 12 + 1:02d} track{i:04d}.mp3")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tags = {'title': f"曲 {i:04d}", 'artist': f"Artist {rng.randint(1, 40)}",
+                'album': f"Album {album:03d}", 'track': f"{i % 12 + 1}/12"} if i % 10 else None  # 1割はタグなし
+        seconds = write_mp3(path, rng.uniform(3, 8), vbr=i % 2 == 1, tags=tags, seed=i)
+        short.append({'path': path, 'seconds': seconds, 'vbr': i % 2 == 1, 'tagged': tags is not None})
+    long = {}
+    for kind in ('cbr', 'vbr'):
+        path = os.path.join(directory, 'long', f"long_{kind}.mp3")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tags = {'title': f"Long {kind}", 'artist': "Bench", 'album': "Long", 'track': "1"}
+        seconds = write_mp3(path, long_seconds, vbr=kind == 'vbr', tags=tags, seed=99)
+        frame_count = round(seconds * SAMPLE_RATE / SAMPLES_PER_FRAME)
+        audio_bytes = sum(frame_sizes(kind == 'vbr', 99, frame_count)) + (frame_size(128) if kind == 'vbr' else 0)
+        long[kind] = {'path': path, 'seconds': seconds, 'vbr': kind == 'vbr', 'seed': 99,
+                      'audio_offset': os.path.getsize(path) - audio_bytes}  # 先頭のID3タグの大きさ
+    manifest = {'spec': spec, 'short': short, 'long': long}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def frame_sizes(vbr, seed, frame_count):
+    """write_mp3 が書く音声フレームの大きさを先頭から順に返す（VBRのXingフレームは含めない）"""
+    if not vbr:
+        return [frame_size(128)] * frame_count
+    rng = random.Random(seed)
+    return [frame_size(rng.choice(VBR_BITRATES)) for _ in range(frame_count)]
+
+
+def frame_offset(entry, seconds):
+    """長い曲の指定時間を含むフレームのバイト位置（ファイルを読まずにコーパスの作り方から求める）"""
+    frame_index = int(seconds * SAMPLE_RATE / SAMPLES_PER_FRAME)
+    offset = entry['audio_offset'] + (frame_size(128) if entry['vbr'] else 0)
+    return offset + sum(frame_sizes(entry['vbr'], entry['seed'], frame_index))
@@ -0,0 +1,414 @@
+"""ggkPlayer のベンチマーク（画面なしで実行できる）
+
+    python bench/run.py                               結果を bench/results/<日時>.json に書く
+    python bench/run.py --files 1000 --sizes 1000 10000 50000 --output result.json
+    python bench/run.py --compare old.json new.json   2つの結果を比べる
+
+音声はSDLのダミードライバーに出力する。画面（MusicPlayer）の計測にはディスプレイが必要で、
+DISPLAY が無い場合は Xvfb があれば仮想ディスプレイを起動する（どちらも無ければ画面の計測は
+省略し、結果に理由を記録する）。アプリのコードは作業フォルダにコピーして動かす
+（設定ファイルやキャッシュを src に作らないため）。
+"""
+import os
+# pygameの読み込み前に設定する
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import configparser
+import multiprocessing
+from corpus import build_corpus, frame_offset
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+RESULT_VERSION = 1
+BATCH_DELETE_ROWS = 10000  # まとめて削除する曲数の上限
+# 作業フォルダに書く設定（ログは警告以上だけにし、音量の解析のプロセスは起動しない）
+SETTINGS = {'Audio': {'device_name': ''}, 'Logging': {'level': 'WARNING', 'file': ''},
+            'ReplayGain': {'mode': 'off', 'preamp_db': '0'}}
+
+
+def summarize(values_ms):
+    """計測値（ミリ秒）の要約"""
+    values = sorted(values_ms)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'median_ms': round(values[len(values) // 2], 3),
+        'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        'min_ms': round(values[0], 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def write_settings(base_path):
+    config = configparser.ConfigParser()
+    config.read_dict(SETTINGS)
+    with open(os.path.join(base_path, 'settings.ini'), 'w', encoding='utf-8') as f:
+        config.write(f)
+    return config
+
+
+def remove_metadata_cache(base_path):
+    for suffix in ('', '-wal', '-shm'):
+        path = os.path.join(base_path, 'metadata_cache.db' + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def new_engine(base_path):
+    from player_engine import PlayerEngine
+    os.makedirs(base_path, exist_ok=True)
+    return PlayerEngine(write_settings(base_path), base_path)
+
+
+# --- 再生エンジン（画面なし） ---
+
+def bench_ingest(work_dir, paths):
+    """メタデータの読み込みとプレイリストへの追加（キャッシュなし・あり）"""
+    engine = new_engine(os.path.join(work_dir, 'ingest'))
+    result = {'files': len(paths)}
+    try:
+        for name in ('cold', 'warm'):
+            engine.clear()
+            started = time.perf_counter()
+            for path in paths:
+                engine.append_track(path, engine.load_track(path))
+            engine.save_playlist()
+            engine.metadata_cache.flush()
+            seconds = time.perf_counter() - started
+            result[name] = {'seconds': round(seconds, 4), 'files_per_sec': round(len(paths) / seconds, 1)}
+    finally:
+        engine.shutdown()
+    return result
+
+
+def bench_restore(work_dir, paths):
+    """デーモンの restore_playlist（メタデータキャッシュなし・あり）"""
+    from daemon import PlayerDaemon
+    base_path = os.path.join(work_dir, 'restore')
+    engine = new_engine(base_path)
+    for path in paths:
+        engine.append_track(path, engine.load_track(path))
+    engine.shutdown()
+    result = {'tracks': len(paths)}
+    for name in ('cold', 'warm'):
+        if name == 'cold':
+            remove_metadata_cache(base_path)
+        daemon = PlayerDaemon(base_path)
+        try:
+            started = time.perf_counter()
+            daemon.restore_playlist()
+            result[name] = {'seconds': round(time.perf_counter() - started, 4)}
+        finally:
+            daemon.shutdown()
+    return result
+
+
+def bench_seek(work_dir, long_files, repeat):
+    """長い曲のシーク（フレーム位置のインデックスを使う場合と set_pos の場合）"""
+    engine = new_engine(os.path.join(work_dir, 'seek'))
+    rng = random.Random(2)
+    result = {}
+    try:
+        for kind, entry in sorted(long_files.items()):
+            path = entry['path']
+            engine.append_track(path, engine.load_track(path))
+            engine.play_track(len(engine.playlist) - 1)
+            # インデックスの作成（キャッシュなし）
+            started = time.perf_counter()
+            while path not in engine.seek_indexes and time.perf_counter() - started < 30:
+                time.sleep(0.005)
+            values = {'index_build_ms': round((time.perf_counter() - started) * 1000, 1)}
+            positions = [rng.uniform(0, entry['seconds'] - 5) for _ in range(repeat)]
+            for mode in ('indexed', 'set_pos'):
+                if mode == 'set_pos':
+                    # インデックスで途中から読み込んだストリームでは set_pos の位置がずれるので、
+                    # 曲を先頭から再生し直してからインデックスを捨てる（再生し直すと作り直されるため後で捨てる）
+                    engine.play_track(len(engine.playlist) - 1)
+                    while path in engine.seek_index_pending:
+                        time.sleep(0.005)
+                    engine.seek_indexes.pop(path, None)
+                    if engine.music_file is not None:
+                        raise RuntimeError("set_pos の計測前にファイルを先頭から開き直せませんでした")
+                timings = []
+                for position in positions:
+                    started = time.perf_counter()
+                    engine.seek(position)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if mode == 'indexed':
+                        # 開いたフレームの位置を、インデックスを使わずにコーパスの作り方から求めた位置と比べる
+                        # （set_pos はデコーダーの中で移動するので、外から確かめられる値が無い）
+                        expected = frame_offset(entry, position)
+                        actual = engine.music_file.offset if engine.music_file is not None else None
+                        if actual != expected:
+                            raise RuntimeError(f"{kind} {mode}: {position:.3f}秒へのシークで開いた位置が "
+                                               f"{actual} バイトです（正しくは {expected} バイト）")
+                values[mode] = summarize(timings)
+            result[kind] = values
+    finally:
+        engine.shutdown()
+    return result
+
+
+# --- 画面（MusicPlayer） ---
+
+class VirtualDisplay:
+    """DISPLAY が無ければ Xvfb を起動する"""
+
+    def __init__(self):
+        self.process = None
+        self.reason = None
+
+    def start(self):
+        if sys.platform == 'win32' or os.environ.get('DISPLAY'):
+            return True
+        xvfb = shutil.which('Xvfb')
+        if xvfb is None:
+            self.reason = "ディスプレイが無く、Xvfb も見つかりません"
+            return False
+        display = f":{90 + os.getpid() % 100}"
+        self.process = subprocess.Popen([xvfb, display, '-screen', '0', '1280x800x24', '-nolisten', 'tcp'],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(1.0)
+        if self.process.poll() is not None:
+            self.reason = "Xvfb を起動できませんでした"
+            return False
+        os.environ['DISPLAY'] = display
+        return True
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def open_app(until_idle=True):
+    """MusicPlayer を起動し、プレイリストの読み込みが終わるまでイベントを処理する"""
+    from tkinterdnd2 import TkinterDnD
+    from main import MusicPlayer
+    root = TkinterDnD.Tk()
+    app = MusicPlayer(root)
+    while until_idle:
+        root.update()
+        if not app.loader.is_busy():
+            break
+        time.sleep(0.001)
+    root.update()
+    return root, app
+
+
+def bench_ui_restore(app_dir, paths):
+    """起動してからプレイリストの復元が終わるまで（メタデータキャッシュなし・あり）"""
+    engine = new_engine(app_dir)
+    engine.clear()
+    for path in paths:
+        engine.append_track(path, engine.load_track(path))
+    engine.shutdown()
+    result = {'tracks': len(paths)}
+    for name in ('cold', 'warm'):
+        if name == 'cold':
+            remove_metadata_cache(app_dir)
+        started = time.perf_counter()
+        root, app = open_app()
+        result[name] = {'seconds': round(time.perf_counter() - started, 4), 'loaded': len(app.playlist)}
+        app.on_closing()
+    return result
+
+
+def bench_ui_add(app_dir, paths):
+    """add_to_playlist で1曲ずつ追加する（メタデータキャッシュなし）"""
+    remove_metadata_cache(app_dir)
+    root, app = open_app()
+    try:
+        app.clear_playlist()
+        started = time.perf_counter()
+        for path in paths:
+            app.add_to_playlist(path)
+        root.update_idletasks()
+        seconds = time.perf_counter() - started
+        return {'files': len(paths), 'seconds': round(seconds, 4), 'files_per_sec': round(len(paths) / seconds, 1)}
+    finally:
+        app.on_closing()
+
+
+def bench_ui_playlist_size(app_dir, first_path, sizes, repeat):
+    """プレイリストの曲数ごとの on_delete_key（1曲・まとめて削除）・update_playing_mark の時間"""
+    root, app = open_app()
+    rng = random.Random(3)
+    metadata = {'title': "Synthetic", 'artist': "Bench", 'track_number': "1", 'length': 200.0}
+    result = {}
+    try:
+        for size in sizes:
+            app.clear_playlist()
+            engine = app.engine
+            engine.append_track(first_path, engine.load_track(first_path))  # 再生する曲
+            for i in range(size - 1):
+                engine.append_track(os.path.join(app_dir, 'synthetic', f"{i:06d}.mp3"), metadata)
+            engine.save_playlist()
+            app.view.refresh()
+            root.update()
+            engine.play_track(0)
+            root.update()
+            deletes = []
+            for _ in range(repeat):
+                app.view.select(rng.randrange(1, len(engine.playlist)))
+                started = time.perf_counter()
+                app.on_delete_key(None)
+                root.update_idletasks()
+                deletes.append((time.perf_counter() - started) * 1000)
+            marks = []
+            for _ in range(repeat):
+                engine.current_track = rng.randrange(len(engine.playlist))
+                started = time.perf_counter()
+                app.update_playing_mark()
+                root.update_idletasks()
+                marks.append((time.perf_counter() - started) * 1000)
+            engine.current_track = 0
+            # 最大10,000曲を選択してまとめて削除する
+            rows = rng.sample(range(1, len(engine.playlist)), min(BATCH_DELETE_ROWS, len(engine.playlist) // 2))
+            app.view.set_selection(rows)
+            started = time.perf_counter()
+            app.on_delete_key(None)
+            root.update_idletasks()
+            batch_ms = (time.perf_counter() - started) * 1000
+            engine.stop()
+            result[str(size)] = {'on_delete_key': summarize(deletes), 'update_playing_mark': summarize(marks),
+                                 'on_delete_key_batch': {'rows': len(rows), 'ms': round(batch_ms, 3)}}
+    finally:
+        app.on_closing()
+    return result
+
+
+# --- 実行と比較 ---
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    work_dir = args.workdir or tempfile.mkdtemp(prefix='ggkplayer-bench-')
+    corpus_dir = args.corpus or os.path.join(work_dir, 'corpus')
+    app_dir = os.path.join(work_dir, 'app')
+    shutil.rmtree(app_dir, ignore_errors=True)
+    shutil.copytree(SRC_DIR, app_dir, ignore=shutil.ignore_patterns('__pycache__', 'icon_cache', '*.db', '*.ini',
+                                                                     '*.json', '*.log'))
+    sys.path.insert(0, app_dir)
+    write_settings(app_dir)
+
+    started = time.perf_counter()
+    corpus = build_corpus(corpus_dir, args.files, args.long_seconds)
+    print(f"コーパス: {len(corpus['short'])} 曲 + 長い曲 {len(corpus['long'])} 曲 ({time.perf_counter() - started:.1f}秒)")
+    paths = [entry['path'] for entry in corpus['short']]
+
+    import pygame
+    results = {}
+    benches = [
+        ('ingest', lambda: bench_ingest(work_dir, paths)),
+        ('restore', lambda: bench_restore(work_dir, paths)),
+        ('seek', lambda: bench_seek(work_dir, corpus['long'], args.repeat)),
+    ]
+    display = VirtualDisplay()
+    if args.skip_ui:
+        results['ui'] = {'skipped': "--skip-ui が指定されました"}
+    elif display.start():
+        benches += [
+            ('ui.restore', lambda: bench_ui_restore(app_dir, paths)),
+            ('ui.add_to_playlist', lambda: bench_ui_add(app_dir, paths)),
+            ('ui.playlist_size', lambda: bench_ui_playlist_size(app_dir, paths[0], args.sizes, args.repeat)),
+        ]
+    else:
+        results['ui'] = {'skipped': display.reason}
+    try:
+        for name, bench in benches:
+            started = time.perf_counter()
+            try:
+                results[name] = bench()
+            except Exception as e:
+                results[name] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"{name}: {time.perf_counter() - started:.1f}秒 {json.dumps(results[name], ensure_ascii=False)}")
+    finally:
+        display.stop()
+
+    report = {
+        'version': RESULT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'options': {'files': args.files, 'long_seconds': args.long_seconds, 'sizes': args.sizes,
+                    'repeat': args.repeat},
+        'results': results,
+    }
+    output = args.output or os.path.join(REPO_DIR, 'bench', 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"結果を書き出しました: {output}")
+    if not args.workdir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def flatten(values, prefix=''):
+    """入れ子の結果を 'ingest.cold.seconds' のような名前と数値の組にする"""
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old_path, new_path):
+    """2つの結果の数値を並べて表示する（比は 新 / 旧）"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"旧: {old.get('revision')} ({old.get('created')})  新: {new.get('revision')} ({new.get('created')})")
+    old_values = dict(flatten(old['results']))
+    for name, value in flatten(new['results']):
+        if name in old_values and old_values[name]:
+            print(f"{name:60s} {old_values[name]:>12g} → {value:>12g}  ({value / old_values[name]:.2f}倍)")
+        else:
+            print(f"{name:60s} {'-':>12s} → {value:>12g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ggkPlayer のベンチマーク")
+    parser.add_argument('--files', type=int, default=300, help="短い曲の数（追加・復元の計測用）")
+    parser.add_argument('--long-seconds', type=int, default=600, help="シークの計測に使う長い曲の長さ（秒）")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="削除・再生中マークの計測に使うプレイリストの曲数")
+    parser.add_argument('--repeat', type=int, default=30, help="削除・再生中マーク・シークの計測回数")
+    parser.add_argument('--corpus', help="コーパスを作るフォルダ（省略時は作業フォルダ内。同じ条件なら作り直さない）")
+    parser.add_argument('--workdir', help="作業フォルダ（省略時は一時フォルダを作り、終了時に削除する）")
+    parser.add_argument('--output', help="結果のJSONファイル（省略時は bench/results/<日時>.json）")
+    parser.add_argument('--skip-ui', action='store_true', help="画面の計測を省略する")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="2つの結果を比べる")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    logging.basicConfig(level=logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -1,3 +1,5 @@
  
  rem pyinstaller --onefile --noconsole --add-data "src/icons/*.svg;icons" --console --distpath release --name ggkplayer src/main.py
- pyinstaller --onefile --noconsole --add-data "src/icons/*.svg;icons" --icon=src/icons/ggkplayer.ico --noconsole --distpath release --name ggkplayer src/main.py
+ rem prebuild icon PNGs so that the exe does not load PyQt5 at startup
+ python src/icon_cache.py
+ pyinstaller --onefile --noconsole --add-data "src/icons/*.svg;icons" --add-data "src/icon_cache/*.png;icon_cache" --icon=src/icons/ggkplayer.ico --noconsole --distpath release --name ggkplayer src/main.py
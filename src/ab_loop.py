@@ -0,0 +1,145 @@
+import time
+import pygame
+from mp3_index import OffsetFile
+
+MIN_LOOP_SECONDS = 0.5  # 繰り返す範囲の最短の長さ（キューの補充が間に合う長さ）
+
+
+def decode_segment(file_path, seek_index, start, end):
+    """start～end秒をミキサーの形式（int16）の配列に展開する
+
+    シーク用インデックスがあれば範囲を含むフレームだけを展開する
+    （長い曲でも展開する量は範囲の長さ分で済む）。無ければ曲全体を展開する。
+    """
+    import numpy as np
+    if seek_index is not None:
+        start_offset, start_time, end_offset = seek_index.byte_range(start, end)
+        source = OffsetFile(file_path, start_offset, end_offset)
+        try:
+            sound = pygame.mixer.Sound(file=source)
+        finally:
+            source.close()
+    else:
+        start_time = 0.0
+        sound = pygame.mixer.Sound(file_path)
+    sample_rate = pygame.mixer.get_init()[0]
+    samples = pygame.sndarray.array(sound)
+    first = max(0, round((start - start_time) * sample_rate))
+    last = round((end - start_time) * sample_rate)
+    return np.ascontiguousarray(samples[first:last])
+
+
+class SegmentLoop:
+    """展開済みのA-B間をミキサーのチャンネルで繰り返し再生する
+
+    ファイルは開き直さず、メモリ上の音声を CHUNK_SECONDS ずつに分けてチャンネルの
+    キューに入れ続けるので、繰り返しの継ぎ目はサンプル単位で正確になる。
+    再生位置は再生中の区間の先頭（サンプル数）から求め、区間内の経過時間は
+    区間の長さまでで止める（時計の進みとのずれが区間を越えて溜まらない）。
+    """
+
+    CHUNK_SECONDS = 1.0  # キューに入れる区間の長さ（定期処理が遅れてもキューが空にならない長さ）
+
+    def __init__(self, samples, start, end):
+        self.samples = samples
+        self.start = start
+        self.end = end
+        self.sample_rate = pygame.mixer.get_init()[0]
+        self.frames = len(samples)
+        self.length = self.frames / self.sample_rate
+        self.chunk_frames = max(1, round(self.CHUNK_SECONDS * self.sample_rate))
+        self.volume = 1.0
+        self.channel = None
+        self.current = (0, 0)  # 再生中の区間（A点からのサンプル位置の範囲）
+        self.queued = None  # キューに入れた区間
+        self.current_started = 0.0  # 再生中の区間の再生が始まった（のを確認した）時刻
+        self.paused_at = None  # 一時停止した時刻
+
+    def _chunk_from(self, frame):
+        """指定したサンプル位置から次の区切りまでの区間（Bに達していればAから）"""
+        if frame >= self.frames:
+            frame = 0
+        return frame, min(self.frames, (frame // self.chunk_frames + 1) * self.chunk_frames)
+
+    def _sound(self, chunk):
+        return pygame.sndarray.make_sound(self.samples[chunk[0]:chunk[1]])
+
+    def _offset(self, position):
+        """範囲内の位置をA点からのサンプル位置にする（範囲外の位置はA点）"""
+        offset = position - self.start
+        if not 0 <= offset < self.length:
+            offset = 0.0
+        return min(self.frames - 1, round(offset * self.sample_rate))
+
+    def play(self, position, volume=None):
+        """範囲内の指定位置から繰り返し再生を始める（範囲外の位置はAから）"""
+        if volume is not None:
+            self.volume = volume
+        if self.channel is not None:
+            self.channel.stop()
+        self.current = self._chunk_from(self._offset(position))
+        self.queued = self._chunk_from(self.current[1])
+        self.channel = pygame.mixer.find_channel(True)
+        self.channel.set_volume(self.volume)
+        self.channel.play(self._sound(self.current))
+        self.channel.queue(self._sound(self.queued))
+        self.current_started = time.perf_counter()
+        self.paused_at = None
+
+    def seek(self, position):
+        """再生位置を変える（一時停止中は再開した時にその位置から再生する）"""
+        if self.paused_at is None:
+            self.play(position)
+            return
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
+        self.current = self._chunk_from(self._offset(position))
+        self.queued = None
+        self.current_started = self.paused_at
+
+    def refill(self):
+        """キューの区間が再生され始めていたら、次の区間を入れる（定期処理から呼ぶ）"""
+        if self.channel is None or self.paused_at is not None or self.channel.get_queue() is not None:
+            return
+        if not self.channel.get_busy():
+            # 定期処理が止まっている間にキューの区間も再生し終えた場合は、その続きから再生し直す
+            self.play(self.start + self._chunk_from(self.queued[1])[0] / self.sample_rate)
+            return
+        self.current = self.queued
+        self.current_started = time.perf_counter()
+        self.queued = self._chunk_from(self.current[1])
+        self.channel.queue(self._sound(self.queued))
+
+    def position(self):
+        now = self.paused_at if self.paused_at is not None else time.perf_counter()
+        first, last = self.current
+        played = min(last - first, round((now - self.current_started) * self.sample_rate))
+        return self.start + (first + max(0, played)) / self.sample_rate
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.channel is not None:
+            self.channel.set_volume(volume)
+
+    def pause(self):
+        if self.paused_at is None:
+            if self.channel is not None:
+                self.channel.pause()
+            self.paused_at = time.perf_counter()
+
+    def resume(self):
+        if self.paused_at is None:
+            return
+        if self.channel is None:
+            self.play(self.position())  # 一時停止中に移動した
+            return
+        self.current_started += time.perf_counter() - self.paused_at
+        self.paused_at = None
+        self.channel.unpause()
+        self.refill()
+
+    def stop(self):
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
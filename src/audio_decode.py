@@ -0,0 +1,81 @@
+"""曲をPCMに展開する（音量の解析や波形の表示用。ワーカープロセスで使う）
+
+pygameのミキサーで展開するので、音声デバイスはダミーを使う。
+"""
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import numpy as np
+import pygame
+from mp3_index import OffsetFile, build_seek_index
+from formats import backend_for, uses_seek_index
+
+SAMPLE_RATE = 44100
+CHUNK_SECONDS = 10.0  # decode_chunks で1回に展開する長さ
+MAX_WHOLE_SECONDS = 15 * 60  # ファイル全体を展開する形式で、展開してよい曲の長さの上限
+
+
+class TooLongError(ValueError):
+    """ファイル全体を展開するには長すぎる曲"""
+
+
+def init_worker():
+    """ワーカープロセスの初期化（実際の音声デバイスは開かない）"""
+    if not pygame.mixer.get_init():
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=2)
+
+
+def _to_array(sound):
+    samples = pygame.sndarray.array(sound)
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    return samples
+
+
+def decode(file_path):
+    """ファイル全体を (サンプル数, チャンネル数) のint16配列に展開し、サンプリング周波数と共に返す"""
+    init_worker()
+    return _to_array(pygame.mixer.Sound(file_path)), pygame.mixer.get_init()[0]
+
+
+def decode_chunks(file_path, seconds=CHUNK_SECONDS):
+    """曲を先頭から seconds 秒ずつ展開する
+
+    (全体のサンプル数の目安, サンプリング周波数, int16配列を順に返すイテレーター) を返す。
+    MP3はシーク用のインデックスで区間のフレームだけを展開するので、長い曲でも
+    メモリに置くのは seconds 秒分で済む。それ以外の形式はファイル全体を展開するので、
+    MAX_WHOLE_SECONDS より長い曲は TooLongError にする。
+    """
+    init_worker()
+    sample_rate = pygame.mixer.get_init()[0]
+    step = max(1, round(seconds * sample_rate))
+    seek_index = build_seek_index(file_path) if uses_seek_index(file_path) else None
+    if seek_index is not None:
+        return round(seek_index.length * sample_rate), sample_rate, _index_chunks(file_path, seek_index, step)
+    backend = backend_for(file_path)
+    length = backend.open(file_path).info.length if backend is not None else None
+    if length and length > MAX_WHOLE_SECONDS:
+        raise TooLongError(f"{length / 60:.0f}分（上限 {MAX_WHOLE_SECONDS // 60}分）")
+    samples, _ = decode(file_path)
+    return len(samples), sample_rate, (samples[i:i + step] for i in range(0, len(samples), step))
+
+
+def _index_chunks(file_path, seek_index, step):
+    """シーク用のインデックスで step サンプルずつの区間を展開する"""
+    sample_rate = pygame.mixer.get_init()[0]
+    first = 0
+    while True:
+        start_offset, start_time, end_offset = seek_index.byte_range(first / sample_rate, (first + step) / sample_rate)
+        source = OffsetFile(file_path, start_offset, end_offset)
+        try:
+            samples = _to_array(pygame.mixer.Sound(file=source))
+        finally:
+            source.close()
+        # 前に余分に含めたフレームの分を捨てる
+        skip = first - round(start_time * sample_rate)
+        chunk = samples[skip:skip + step]
+        if len(chunk):
+            yield chunk
+        if len(chunk) < step:
+            break  # 曲の終わり
+        first += step
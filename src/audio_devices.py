@@ -0,0 +1,80 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def list_output_devices():
+    """SDLから出力デバイス名の一覧を取得する（ミキサーを初期化した後に呼ぶこと）"""
+    from pygame._sdl2 import audio as sdl2_audio
+    return list(sdl2_audio.get_audio_device_names(False))
+
+
+class DeviceRegistry:
+    """出力デバイスの一覧をキャッシュし、抜き差しをバックグラウンドで監視する
+
+    一覧の取得は監視スレッドが定期的に行い、画面やコマンドはキャッシュを参照する。
+    SDLのデバイスの追加・削除イベントを受け取った時は rescan() ですぐに取得し直す。
+    ミキサーの初期化し直しと一覧の取得が重ならないよう、lock をエンジンと共有する。
+    """
+
+    POLL_INTERVAL = 3.0  # 一覧を取得し直す間隔（秒）
+
+    def __init__(self):
+        self.lock = threading.Lock()  # SDLの音声サブシステムの利用
+        self.names = []  # 出力デバイス名の一覧（変わる時は新しいリストに置き換える）
+        self.version = 0  # 一覧が変わるたびに増える（画面の更新の確認用）
+        self.scanned = threading.Event()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.failed = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="audio-devices", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.scan()
+            self.wake.wait(self.POLL_INTERVAL)
+            self.wake.clear()
+
+    def scan(self):
+        """デバイスの一覧を取得し直す"""
+        with self.lock:
+            try:
+                names = list_output_devices()
+                self.failed = False
+            except Exception as e:
+                if not self.failed:  # 同じエラーを繰り返し表示しない
+                    logger.warning(f"オーディオデバイスの一覧を取得できませんでした: {e}")
+                self.failed = True
+                names = None
+        if names is not None and names != self.names:
+            if self.scanned.is_set():
+                for name in names:
+                    if name not in self.names:
+                        logger.info(f"オーディオデバイスが接続されました: {name}")
+                for name in self.names:
+                    if name not in names:
+                        logger.warning(f"オーディオデバイスが取り外されました: {name}")
+            self.names = names
+            self.version += 1
+        self.scanned.set()
+
+    def rescan(self):
+        """すぐに一覧を取得し直す（抜き差しのイベントを受け取った時）"""
+        self.wake.set()
+
+    def list(self):
+        """キャッシュしている一覧を返す（最初の取得が終わっていなければ待つ）"""
+        if self.thread is not None:
+            self.scanned.wait(2)
+        return list(self.names)
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
@@ -0,0 +1,397 @@
+"""画面を使わずに再生エンジンだけを動かす（キオスク端末などでの無人運用向け）
+
+    python src/daemon.py              標準入力から1行ずつコマンドを読む
+    python src/daemon.py --port 5577  127.0.0.1:5577 でコマンドを受け付ける
+
+tkinter・PyQt5・Pillow は読み込まない。設定（settings.ini）とプレイリスト
+（playlist.db）は画面版と同じものを使う。応答は1行で、成功時は "OK"（値がある場合は "OK <JSON>"）、
+失敗時は "ERR <理由>"。コマンドの一覧は help で表示される。
+"""
+import os
+# pygameの読み込み前に設定する（ウィンドウは作らず、イベントキューだけを使う）
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import sys
+import json
+import multiprocessing
+import queue
+import argparse
+import threading
+import configparser
+import socketserver
+import logging
+from player_engine import PlayerEngine
+from library_scan import iter_audio_files, SORT_ORDERS
+from m3u import iter_m3u
+from playlist_model import SORT_COLUMNS
+from instrumentation import setup_logging, setup_instrumentation, metrics
+
+logger = logging.getLogger(__name__)
+
+HELP = """play [番号]      再生（番号は0から。省略時は現在の曲を先頭から）
+toggle           再生/一時停止の切り替え
+pause / stop     一時停止 / 停止
+next / prev      次の曲 / 前の曲
+seek 秒          指定位置から再生
+forward 秒 / rewind 秒
+repeat on|off    1トラックリピート
+loop 秒 秒 / loop off  範囲繰り返し（A-B間をメモリに展開して繰り返す）
+replaygain off|track|album  音量の自動調整（曲ごと / アルバムごと）
+add パス         ファイルまたはフォルダを追加
+delete 番号 [番号...] / clear
+move 番号 [番号...] 移動先  曲をまとめて移動先の番号の曲の前へ（末尾なら曲数）
+list / status / devices
+stats            処理時間の集計（[Instrumentation] enabled = true の場合）
+find 検索語      曲名・アーティスト・ファイル名で検索
+sort 列 [列...]  並べ替え（track / title / artist / length。先頭に - で降順）
+duplicates [remove]  音声が同じ曲の一覧（remove で各組の最初の1曲以外を削除）
+playlists        プレイリストの一覧
+open ID          プレイリストの切り替え（再生は停止する）
+new 名前         空のプレイリストを作って切り替える
+import パス      M3U/M3U8を新しいプレイリストとして読み込む
+export パス      現在のプレイリストをM3U8で書き出す
+device [名前]    再生デバイスの切り替え（省略時はデフォルト）
+quit             設定を保存して終了"""
+
+
+class PlayerDaemon:
+    """コマンドを受け取って再生エンジンを操作する
+
+    コマンドは受付スレッドからキューで受け取り、エンジンの操作と定期処理は
+    すべてメインスレッドで行う。
+    """
+
+    TICK_INTERVAL = 0.1  # 再生中の定期処理の間隔（秒）
+    IDLE_INTERVAL = 1.0  # 一時停止・停止中にデバイスの抜き差しを確認する間隔（秒）
+
+    def __init__(self, base_path):
+        self.config_file = os.path.join(base_path, "settings.ini")
+        self.config = configparser.ConfigParser()
+        if os.path.exists(self.config_file):
+            self.config.read(self.config_file, encoding='utf-8')
+        if 'Audio' not in self.config:
+            self.config['Audio'] = {'device_name': ''}
+        setup_logging(self.config, base_path)
+        self.metrics_path = setup_instrumentation(self.config, base_path)  # 計測しない場合はNone
+        self.engine = PlayerEngine(self.config, base_path)
+        self.requests = queue.Queue()  # (コマンド行, 応答を受け取る関数)
+        self.running = True
+        self.commands = {
+            'play': self.cmd_play,
+            'toggle': lambda arg: self.engine.toggle_play(),
+            'pause': lambda arg: self.engine.pause(),
+            'stop': lambda arg: self.engine.stop(),
+            'next': lambda arg: self.engine.next_track(),
+            'prev': lambda arg: self.engine.prev_track(),
+            'seek': lambda arg: self.engine.play_from(float(arg)),
+            'forward': lambda arg: self.engine.forward(float(arg)),
+            'rewind': lambda arg: self.engine.rewind(float(arg)),
+            'repeat': self.cmd_repeat,
+            'loop': self.cmd_loop,
+            'replaygain': self.cmd_replaygain,
+            'add': self.cmd_add,
+            'delete': self.cmd_delete,
+            'move': self.cmd_move,
+            'clear': lambda arg: self.engine.clear(),
+            'list': self.cmd_list,
+            'find': self.cmd_find,
+            'sort': self.cmd_sort,
+            'duplicates': self.cmd_duplicates,
+            'playlists': self.cmd_playlists,
+            'open': self.cmd_open,
+            'new': self.cmd_new,
+            'import': self.cmd_import,
+            'export': self.cmd_export,
+            'status': lambda arg: self.engine.status(),
+            'stats': lambda arg: metrics.summary(),
+            'devices': lambda arg: self.engine.list_devices(),
+            'device': self.cmd_device,
+            'help': lambda arg: HELP.splitlines(),
+            'quit': self.cmd_quit,
+        }
+
+    # --- コマンド ---
+
+    def cmd_play(self, arg):
+        self.engine.play_track(self.parse_index(arg) if arg else None)
+
+    def cmd_repeat(self, arg):
+        if arg not in ('on', 'off'):
+            raise ValueError("on または off を指定してください")
+        self.engine.set_repeat(arg == 'on')
+
+    def cmd_loop(self, arg):
+        if arg == 'off':
+            self.engine.end_loop()
+            return
+        points = arg.split()
+        if len(points) != 2:
+            raise ValueError("開始と終了の秒数、または off を指定してください")
+        self.engine.set_loop(float(points[0]), float(points[1]))
+
+    def cmd_replaygain(self, arg):
+        self.engine.set_replaygain_mode(arg)
+        if 'ReplayGain' not in self.config:
+            self.config['ReplayGain'] = {'mode': 'off', 'preamp_db': '0'}
+        self.config['ReplayGain']['mode'] = arg
+        self.save_settings()
+
+    def cmd_add(self, arg):
+        if not arg:
+            raise ValueError("パスを指定してください")
+        sort_order = self.config.get('Library', 'sort_order', fallback='name')
+        if sort_order not in SORT_ORDERS:
+            sort_order = 'name'
+        return self.add_files(iter_audio_files([arg], sort_order))
+
+    def add_files(self, file_paths):
+        """パスの一覧を順に読み込んで末尾に追加する"""
+        count = 0
+        for i, file_path in enumerate(file_paths, 1):
+            metadata = self.engine.load_track(file_path)
+            if metadata is not None:
+                self.engine.append_track(file_path, metadata)
+                count += 1
+            if i % 100 == 0:
+                self.engine.tick()  # 大きなフォルダの追加中も曲の切り替えを止めない
+        self.engine.metadata_cache.flush()
+        self.engine.scan_loudness()
+        return {'added': count}
+
+    def cmd_delete(self, arg):
+        indexes = [self.parse_index(value) for value in arg.split()]
+        if not indexes:
+            raise ValueError("番号を指定してください")
+        self.engine.delete_tracks(indexes)
+
+    def cmd_move(self, arg):
+        values = arg.split()
+        if len(values) < 2:
+            raise ValueError("移動する曲の番号と移動先を指定してください")
+        before = int(values[-1])
+        if not 0 <= before <= len(self.engine.playlist):
+            raise ValueError(f"移動先が範囲外です: {before}")
+        return {'moved': self.engine.move_tracks([self.parse_index(value) for value in values[:-1]], before)}
+
+    def cmd_list(self, arg):
+        return self.describe(range(len(self.engine.playlist)))
+
+    def cmd_find(self, arg):
+        return self.describe(self.engine.playlist.find(arg) or [])
+
+    def cmd_sort(self, arg):
+        keys = [(name.lstrip('-'), name.startswith('-')) for name in arg.split()]
+        if not keys:
+            raise ValueError("列を指定してください")
+        for column, _ in keys:
+            if column not in SORT_COLUMNS:
+                raise ValueError(f"並べ替えできない列です: {column}")
+        self.engine.sort_playlist(keys)
+
+    def cmd_duplicates(self, arg):
+        if arg not in ('', 'remove'):
+            raise ValueError("remove を指定するか、省略してください")
+        playlist = self.engine.playlist
+        groups = self.engine.duplicates.find_groups(list(playlist.paths))
+        result = [[playlist[i] for i in group] for group in groups]
+        if arg == 'remove':
+            self.engine.remove_tracks([playlist.id_at(i) for group in groups for i in group[1:]])
+        return result
+
+    def describe(self, indexes):
+        """指定した曲の情報の一覧を返す"""
+        playlist = self.engine.playlist
+        result = []
+        for i in indexes:
+            track_number, title, artist, length = playlist.row(i)
+            result.append({'index': i, 'track': track_number, 'title': title, 'artist': artist,
+                           'length': round(length, 3), 'path': playlist[i]})
+        return result
+
+    def cmd_playlists(self, arg):
+        store = self.engine.store
+        return [
+            {'id': playlist_id, 'name': name, 'active': playlist_id == store.active_id}
+            for playlist_id, name in store.list_playlists()
+        ]
+
+    def cmd_open(self, arg):
+        playlist_id = int(arg)
+        if self.engine.store.name_of(playlist_id) is None:
+            raise ValueError(f"プレイリストがありません: {playlist_id}")
+        self.engine.switch_playlist(playlist_id)
+        self.restore_playlist()
+
+    def cmd_new(self, arg):
+        if not arg:
+            raise ValueError("名前を指定してください")
+        playlist_id = self.engine.store.create_playlist(arg)
+        self.engine.switch_playlist(playlist_id)
+        return {'id': playlist_id}
+
+    def cmd_import(self, arg):
+        if not os.path.isfile(arg):
+            raise ValueError(f"ファイルがありません: {arg}")
+        name = os.path.splitext(os.path.basename(arg))[0]
+        playlist_id = self.engine.store.create_playlist(name)
+        self.engine.switch_playlist(playlist_id)
+        result = self.add_files(iter_m3u(arg))
+        result['id'] = playlist_id
+        return result
+
+    def cmd_export(self, arg):
+        if not arg:
+            raise ValueError("パスを指定してください")
+        return {'exported': self.engine.export_m3u(arg)}
+
+    def cmd_device(self, arg):
+        if not self.engine.set_device(arg):
+            raise ValueError(f"デバイスを開けませんでした: {arg}")
+
+    def cmd_quit(self, arg):
+        self.running = False
+
+    def parse_index(self, arg):
+        index = int(arg)
+        if not 0 <= index < len(self.engine.playlist):
+            raise ValueError(f"番号が範囲外です: {index}")
+        return index
+
+    def execute(self, line):
+        """コマンド行を実行して応答の文字列を返す"""
+        name, _, arg = line.strip().partition(' ')
+        if not name:
+            return None
+        command = self.commands.get(name.lower())
+        if command is None:
+            return f"ERR 不明なコマンドです: {name}"
+        try:
+            result = command(arg.strip())
+        except (ValueError, IndexError) as e:
+            return f"ERR {e}"
+        except Exception as e:
+            logger.error(f"コマンドの実行中にエラーが発生しました: {line.strip()}: {e}")
+            return f"ERR {e}"
+        if result is None:
+            return "OK"
+        return "OK " + json.dumps(result, ensure_ascii=False)
+
+    # --- プレイリストと設定 ---
+
+    def restore_playlist(self):
+        """保存されたプレイリストを読み込む"""
+        if self.engine.migrate_playlist(self.config):
+            self.save_settings()
+        for file_path in self.engine.begin_restore():
+            metadata = self.engine.load_track(file_path)
+            if metadata is None:
+                self.engine.drop_missing(file_path)
+                continue
+            self.engine.append_track(file_path, metadata)
+        self.engine.end_restore()
+        self.engine.save_playlist()
+        self.engine.maintain_cache()
+        self.engine.scan_loudness()
+        logger.info(f"プレイリストを復元しました: {len(self.engine.playlist)} 件")
+
+    def save_settings(self):
+        """再生デバイスを保存する（画面版の設定はそのまま残す）"""
+        self.config['Audio']['device_name'] = self.engine.preferred_device
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            self.config.write(f)
+
+    # --- メインループ ---
+
+    def serve(self):
+        """コマンドを処理し、再生中は定期処理を行う（quit まで戻らない）"""
+        while self.running:
+            # 一時停止・停止中は曲の終了の確認が不要なので、デバイスの確認の間隔で待つ
+            timeout = self.IDLE_INTERVAL if self.engine.is_paused else self.TICK_INTERVAL
+            try:
+                line, reply = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                response = self.execute(line)
+                # プレイリストの変更はコマンドごとにまとめて保存する
+                self.engine.save_playlist()
+                if response is not None:
+                    reply(response)
+            self.engine.tick()
+            self.engine.check_devices()
+
+    def shutdown(self):
+        try:
+            self.save_settings()
+        except Exception as e:
+            logger.error(f"設定の保存中にエラーが発生しました: {e}")
+        self.engine.shutdown()
+        if self.metrics_path is not None:
+            metrics.export(self.metrics_path)
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """1行ずつコマンドを受け取り、メインスレッドの応答を返す"""
+
+    def handle(self):
+        for raw in self.rfile:
+            responses = queue.Queue()
+            self.server.player.requests.put((raw.decode('utf-8', 'replace'), responses.put))
+            line = raw.strip()
+            if not line:
+                continue
+            self.wfile.write((responses.get() + "\n").encode('utf-8'))
+            if line.lower() == b'quit':
+                break
+
+
+def read_stdin(requests, output):
+    """標準入力のコマンドをキューに入れる（入力が終わったら終了する）"""
+    def reply(response):
+        output.write(response + "\n")
+        output.flush()
+    for line in sys.stdin:
+        requests.put((line, reply))
+    requests.put(("quit", reply))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画面を使わずに音楽を再生する")
+    parser.add_argument('--port', type=int, help="コマンドを受け付けるポート（127.0.0.1のみ）。省略時は標準入力")
+    args = parser.parse_args()
+
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+
+    # 標準出力は応答専用にし、ログは標準エラー出力に出す
+    output = sys.stdout
+    sys.stdout = sys.stderr
+
+    daemon = PlayerDaemon(base_path)
+    server = None
+    try:
+        daemon.restore_playlist()
+        if args.port:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            server = socketserver.ThreadingTCPServer(('127.0.0.1', args.port), _CommandHandler)
+            server.daemon_threads = True
+            server.player = daemon
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            logger.info(f"コマンドを受け付けています: 127.0.0.1:{args.port}")
+        else:
+            threading.Thread(target=read_stdin, args=(daemon.requests, output), daemon=True).start()
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        daemon.shutdown()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,176 @@
+import os
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+PROBE_RATES = (44100, 48000, 88200, 96000, 176400, 192000)
+MME_NAME_LENGTH = 31  # WindowsのMMEではデバイス名が31文字で切れる
+
+
+def same_device(name, probed_name):
+    """SDLのデバイス名とPyAudioのデバイス名が同じデバイスを指すかどうか"""
+    return name == probed_name or (len(probed_name) == MME_NAME_LENGTH and name.startswith(probed_name))
+
+
+def _is_supported(p, index, channels, rate, sample_format):
+    try:
+        return p.is_format_supported(rate, output_device=index, output_channels=channels,
+                                     output_format=sample_format)
+    except ValueError:
+        return False
+
+
+def probe_device(pyaudio, p, index, info, host_api):
+    """出力デバイスの対応するサンプルレート・形式と、実際に開けるかどうかを調べる"""
+    formats = {'16bit': pyaudio.paInt16, '24bit': pyaudio.paInt24, '32bit float': pyaudio.paFloat32}
+    channels = min(2, info['maxOutputChannels'])
+    entry = {
+        'name': info['name'],
+        'host_api': host_api,
+        'channels': info['maxOutputChannels'],
+        'default_rate': int(info['defaultSampleRate']),
+        'rates': [rate for rate in PROBE_RATES
+                  if _is_supported(p, index, channels, rate, pyaudio.paInt16)],
+        'formats': [],
+        'ok': False,
+    }
+    rate = entry['rates'][0] if entry['rates'] else entry['default_rate']
+    entry['formats'] = [label for label, sample_format in formats.items()
+                        if _is_supported(p, index, channels, rate, sample_format)]
+    # 開けるかどうか（開くだけで再生はしない）
+    try:
+        stream = p.open(format=pyaudio.paInt16, channels=channels, rate=rate, output=True,
+                        output_device_index=index, start=False)
+        stream.close()
+        entry['ok'] = True
+    except Exception as e:
+        logger.warning(f"オーディオデバイスを開けませんでした: {info['name']} ({host_api}): {e}")
+    return entry
+
+
+def probe_devices(known):
+    """PyAudioの出力デバイスを調べて (結果の一覧, 既定のデバイス名) を返す
+
+    known（(名前, ホストAPI) → 前回の結果）で開けたデバイスは調べ直さない。
+    PyAudioは毎回初期化し直す（接続されたデバイスを一覧に含めるため）。
+    """
+    import pyaudio
+    p = pyaudio.PyAudio()
+    try:
+        results = []
+        for index in range(p.get_device_count()):
+            info = p.get_device_info_by_index(index)
+            if info['maxOutputChannels'] <= 0:  # 出力デバイスのみ
+                continue
+            host_api = p.get_host_api_info_by_index(info['hostApi'])['name']
+            cached = known.get((info['name'], host_api))
+            if cached is not None and cached['ok']:
+                results.append(cached)
+            else:
+                results.append(probe_device(pyaudio, p, index, info, host_api))
+        try:
+            default_name = p.get_default_output_device_info()['name']
+        except (IOError, OSError):
+            default_name = None
+        return results, default_name
+    finally:
+        p.terminate()
+
+
+class DeviceProber:
+    """出力デバイスの対応状況をバックグラウンドで調べ、JSONファイルにキャッシュする
+
+    起動時は前回の結果をすぐに使い、調べ直しは request() で専用のスレッドに依頼する
+    （画面は version の変化を見て表示し直す）。結果は (デバイス名, ホストAPI) ごとに持つ。
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.entries = {}  # (名前, ホストAPI) → 結果
+        self.default_name = None  # 既定のデバイスの名前
+        self.version = 0  # 結果が変わるたびに増える
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CACHE_VERSION:
+                return
+            self.entries = {(entry['name'], entry['host_api']): entry for entry in data['devices']}
+            self.default_name = data.get('default_name')
+            self.version += 1
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"デバイス情報のキャッシュを読み込めませんでした: {e}")
+
+    def save(self):
+        data = {'version': CACHE_VERSION, 'default_name': self.default_name,
+                'devices': list(self.entries.values())}
+        temp_path = self.cache_path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"デバイス情報のキャッシュを保存できませんでした: {e}")
+
+    def request(self):
+        """デバイスを調べ直す（起動時とデバイスの一覧が変わった時に呼ぶ）"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="device-probe", daemon=True)
+            self.thread.start()
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            if self.stopped.is_set():
+                return
+            try:
+                results, default_name = probe_devices(self.entries)
+            except Exception as e:
+                logger.warning(f"オーディオデバイスを調べられませんでした: {e}")
+                continue
+            entries = {(entry['name'], entry['host_api']): entry for entry in results}
+            if entries != self.entries or default_name != self.default_name:
+                self.entries = entries
+                self.default_name = default_name
+                self.version += 1
+                self.save()
+
+    def matching(self, name):
+        """SDLのデバイス名に当たる結果の一覧（ホストAPIごと）"""
+        if not name:
+            name = self.default_name
+            if name is None:
+                return []
+        return [entry for entry in self.entries.values() if same_device(name, entry['name'])]
+
+    def usable_names(self, names):
+        """開けないデバイスと重複を除いたデバイス名の一覧（まだ調べていないデバイスは残す）"""
+        result = []
+        for name in dict.fromkeys(names):
+            entries = self.matching(name)
+            if not entries or any(entry['ok'] for entry in entries):
+                result.append(name)
+        return result
+
+    def info(self, name):
+        """デバイスの情報（開けたホストAPIの結果を優先する。分からない場合はNone）"""
+        entries = self.matching(name)
+        if not entries:
+            return None
+        return max(entries, key=lambda entry: (entry['ok'], len(entry['rates']), len(entry['formats'])))
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
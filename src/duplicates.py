@@ -0,0 +1,250 @@
+import os
+import hashlib
+import itertools
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from mp3_index import audio_payload_range
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+def payload_range(f, size):
+    """タグを除いた音声部分の (開始位置, 終了位置) を返す
+
+    MP3はID3・APEタグ、FLACはメタデータブロック（Vorbis Commentなど）、WAVは data チャンク以外を除く。
+    Ogg Vorbis・Opusはタグがページの連番やCRCにも影響するので、ファイル全体で比べる
+    （タグだけが違うファイルは重複として検出できない）。
+    """
+    start, end = audio_payload_range(f, size)  # FLACの先頭にID3タグが付いている場合もある
+    f.seek(start)
+    magic = f.read(12)
+    if magic[:4] == b'fLaC':
+        position = start + 4
+        while position + 4 <= end:
+            f.seek(position)
+            header = f.read(4)
+            position += 4 + int.from_bytes(header[1:4], 'big')
+            if header[0] & 0x80:  # 最後のメタデータブロック
+                break
+        return min(position, end), end
+    if magic[:4] == b'RIFF' and magic[8:12] == b'WAVE':
+        position = start + 12
+        while position + 8 <= end:
+            f.seek(position)
+            header = f.read(8)
+            chunk_size = int.from_bytes(header[4:8], 'little')
+            if header[:4] == b'data':
+                return position + 8, min(position + 8 + chunk_size, end)
+            position += 8 + chunk_size + (chunk_size & 1)  # チャンクは2バイト境界に揃える
+    return start, end
+
+
+def payload_size(file_path):
+    """タグを除いた音声部分の大きさを返す（読めない場合はNone）"""
+    try:
+        with open(file_path, 'rb') as f:
+            start, end = payload_range(f, os.fstat(f.fileno()).st_size)
+        return end - start
+    except OSError:
+        return None
+
+
+def hash_audio(file_path):
+    """タグを除いた音声部分のハッシュを返す（タグだけが違うファイルは同じ値になる）"""
+    try:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            start, end = payload_range(f, os.fstat(f.fileno()).st_size)
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                remaining -= len(data)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+class DuplicateFinder:
+    """音声部分が同じファイルを探す
+
+    まず音声部分の大きさで分け、同じ大きさのファイルが他にある場合だけ
+    全体をハッシュする（大きさが違えば中身も違うので読まずに済む）。
+    どちらもプロセスプールで並列に計算し、結果はパス・サイズ・更新日時をキーに
+    MetadataCache にキャッシュする。
+    """
+
+    BATCH_SIZE = 200  # 追加するファイルを何件ずつ調べるか
+
+    def __init__(self, cache, max_workers=None):
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def fingerprints(self, paths, cancel_event=None):
+        """他に同じ大きさのファイルがあるものだけ {パス: ハッシュ} で返す（キャンセル時はNone）"""
+        paths = list(dict.fromkeys(paths))  # 同じパスは1回だけ調べる
+        stats = {}
+        known = {}  # パス → (音声部分の大きさ, ハッシュ)
+        self._lookup(paths, stats, known)
+        paths = [path for path in paths if path in stats]
+        with self._pool() as pool:
+            # 1. 音声部分の大きさ
+            if not self._measure(pool, paths, stats, known, cancel_event):
+                return None
+            # 2. 同じ大きさのファイルがあるものだけハッシュを計算する
+            by_size = {}
+            for path in paths:
+                if path in known:
+                    by_size.setdefault(known[path][0], []).append(path)
+            candidates = [path for group in by_size.values() if len(group) > 1 for path in group]
+            if not self._hash(pool, candidates, stats, known, cancel_event):
+                return None
+        return {path: known[path][1] for path in candidates if known[path][1] is not None}
+
+    def _pool(self):
+        return ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _lookup(self, paths, stats, known):
+        """ファイルの stat とキャッシュ済みの値を調べる（開けないファイルは stats に入れない）"""
+        for path in paths:
+            if path in stats:
+                continue
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                continue
+            cached = self.cache.get_audio_hash(path, stats[path])
+            if cached is not None:
+                known[path] = cached
+
+    def _measure(self, pool, paths, stats, known, cancel_event):
+        """音声部分の大きさが分かっていないものを計算する（キャンセル時はFalse）"""
+        missing = [path for path in paths if path in stats and path not in known]
+        sizes = self._run(pool, payload_size, missing, cancel_event)
+        if sizes is None:
+            return False
+        for path, size in zip(missing, sizes):
+            if size is not None:
+                known[path] = (size, None)
+        self._store(missing, stats, known)
+        return True
+
+    def _hash(self, pool, paths, stats, known, cancel_event):
+        """ハッシュが分かっていないものを計算する（キャンセル時はFalse）"""
+        missing = [path for path in paths if known[path][1] is None]
+        digests = self._run(pool, hash_audio, missing, cancel_event)
+        if digests is None:
+            return False
+        for path, digest in zip(missing, digests):
+            known[path] = (known[path][0], digest)
+        self._store(missing, stats, known)
+        return True
+
+    def _run(self, pool, func, paths, cancel_event):
+        """func をプロセスプールで実行して結果を順に返す（キャンセル時はNone）"""
+        if not paths:
+            return []
+        chunksize = max(1, min(64, len(paths) // (self.max_workers * 8)))
+        results = []
+        for result in pool.map(func, paths, chunksize=chunksize):
+            if cancel_event is not None and cancel_event.is_set():
+                pool.shutdown(wait=False, cancel_futures=True)
+                return None
+            results.append(result)
+        return results
+
+    def _store(self, paths, stats, known):
+        entries = [(path, stats[path]) + known[path] for path in paths if path in known]
+        if entries:
+            self.cache.put_audio_hashes(entries)
+
+    def find_groups(self, paths, cancel_event=None):
+        """重複しているファイルの組を、paths 内の位置の一覧で返す（各組の先頭が最初に出てきたもの）"""
+        fingerprints = self.fingerprints(paths, cancel_event)
+        if fingerprints is None:
+            return None
+        groups = {}
+        for i, path in enumerate(paths):
+            digest = fingerprints.get(path)
+            if digest is not None:
+                groups.setdefault(digest, []).append(i)
+        # 同じパスが複数回ある場合も重複として扱う
+        seen = {}
+        for i, path in enumerate(paths):
+            if path not in fingerprints:
+                if path in seen:
+                    groups.setdefault(path, [seen[path]]).append(i)
+                else:
+                    seen[path] = i
+        return sorted((group for group in groups.values() if len(group) > 1), key=lambda group: group[0])
+
+    def iter_unique(self, new_paths, existing_paths, cancel_event=None):
+        """追加しようとしているファイルのうち、既存の曲とも互いにも重複しないものを返す
+
+        new_paths（フォルダの走査結果など）は BATCH_SIZE 件ずつ調べて返すので、
+        走査の完了を待たずに追加を始められる。ハッシュを計算するのは、既存の曲や
+        先に返した曲に同じ大きさのものがある場合だけ。
+        """
+        existing_paths = list(dict.fromkeys(existing_paths))
+        stats = {}
+        known = {}  # パス → (音声部分の大きさ, ハッシュ)
+        seen = set(existing_paths)  # 既存・追加済みの曲のパスとハッシュ
+        sizes = set()  # 既存・追加済みの曲の音声部分の大きさ
+        unhashed = {}  # 音声部分の大きさ → ハッシュをまだ計算していない既存・追加済みの曲
+        skipped = 0
+        new_paths = iter(new_paths)
+        with self._pool() as pool:
+            self._lookup(existing_paths, stats, known)
+            if not self._measure(pool, existing_paths, stats, known, cancel_event):
+                return
+            for path in existing_paths:
+                self._remember(path, known, seen, sizes, unhashed)
+            while True:
+                batch = list(itertools.islice(new_paths, self.BATCH_SIZE))
+                if not batch or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                self._lookup(batch, stats, known)
+                if not self._measure(pool, batch, stats, known, cancel_event):
+                    return
+                # 既存の曲やバッチ内の他の曲と大きさが同じものだけハッシュを比べる
+                batch_sizes = {}
+                for path in batch:
+                    if path in known:
+                        batch_sizes[known[path][0]] = batch_sizes.get(known[path][0], 0) + 1
+                targets = [path for path in batch if path in known
+                           and (known[path][0] in sizes or batch_sizes[known[path][0]] > 1)]
+                for size in {known[path][0] for path in targets}:
+                    targets.extend(unhashed.pop(size, []))
+                if not self._hash(pool, targets, stats, known, cancel_event):
+                    return
+                for path in targets:
+                    if path in seen and known[path][1] is not None:
+                        seen.add(known[path][1])  # ハッシュを計算した既存・追加済みの曲
+                for path in batch:
+                    digest = known[path][1] if path in known else None
+                    if path in seen or (digest is not None and digest in seen):
+                        skipped += 1
+                        continue
+                    self._remember(path, known, seen, sizes, unhashed)
+                    yield path
+        if skipped:
+            logger.info(f"重複した曲を追加しませんでした: {skipped} 件")
+
+    @staticmethod
+    def _remember(path, known, seen, sizes, unhashed):
+        """既存・追加済みの曲として記録する"""
+        seen.add(path)
+        if path not in known:
+            return
+        size, digest = known[path]
+        sizes.add(size)
+        if digest is not None:
+            seen.add(digest)
+        else:
+            unhashed.setdefault(size, []).append(path)
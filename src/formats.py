@@ -0,0 +1,95 @@
+import os
+import importlib
+import logging
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# タグのキー（曲名・アーティスト・トラック番号）
+ID3_KEYS = {'title': 'TIT2', 'artist': 'TPE1', 'track_number': 'TRCK'}
+VORBIS_KEYS = {'title': 'title', 'artist': 'artist', 'track_number': 'tracknumber'}
+MP4_KEYS = {'title': '\xa9nam', 'artist': '\xa9ART', 'track_number': 'trkn'}
+
+
+class FormatBackend:
+    """音声ファイルの形式ごとの読み方（mutagenのクラスは使う時に読み込む）
+
+    seek_index: フレーム位置のインデックス（mp3_index）でシークするかどうか
+    playable: pygame（SDL_mixer）で再生できるかどうか（できない形式はプレイリストに追加しない）
+    """
+
+    def __init__(self, name, extensions, module_name, class_name, tag_keys, seek_index=False, playable=True):
+        self.name = name
+        self.extensions = extensions
+        self.module_name = module_name
+        self.class_name = class_name
+        self.tag_keys = tag_keys
+        self.seek_index = seek_index
+        self.playable = playable
+
+    def open(self, file_path):
+        """mutagenでファイルを開く（タグと長さを1回で読む）"""
+        module = importlib.import_module(self.module_name)
+        return getattr(module, self.class_name)(file_path)
+
+    def tag(self, audio, key):
+        """タグの最初の値を文字列で返す（無い場合はNone）"""
+        tags = audio.tags
+        if tags is None or self.tag_keys[key] not in tags:
+            return None
+        values = tags[self.tag_keys[key]]
+        values = getattr(values, 'text', values)  # ID3はフレームの text に値の一覧がある
+        if not values:
+            return None
+        value = values[0]
+        if isinstance(value, tuple):  # MP4のトラック番号は (番号, 総数)
+            number, total = value
+            return f"{number}/{total}" if total else str(number)
+        return str(value)
+
+
+BACKENDS = [
+    FormatBackend('MP3', ('.mp3',), 'mutagen.mp3', 'MP3', ID3_KEYS, seek_index=True),
+    FormatBackend('FLAC', ('.flac',), 'mutagen.flac', 'FLAC', VORBIS_KEYS),
+    FormatBackend('Ogg Vorbis', ('.ogg', '.oga'), 'mutagen.oggvorbis', 'OggVorbis', VORBIS_KEYS),
+    FormatBackend('Opus', ('.opus',), 'mutagen.oggopus', 'OggOpus', VORBIS_KEYS),
+    FormatBackend('WAV', ('.wav',), 'mutagen.wave', 'WAVE', ID3_KEYS),
+    # SDL_mixerにはAACのデコーダーが無いので、タグは読めるが再生はできない
+    FormatBackend('M4A', ('.m4a', '.mp4'), 'mutagen.mp4', 'MP4', MP4_KEYS, playable=False),
+]
+
+_BY_EXTENSION = {extension: backend for backend in BACKENDS for extension in backend.extensions}
+
+# プレイリストに追加できる拡張子（形式を増やす場合は BACKENDS に追加する）
+AUDIO_EXTENSIONS = tuple(extension for backend in BACKENDS if backend.playable for extension in backend.extensions)
+
+
+def backend_for(file_path):
+    """ファイルの拡張子に対応する形式（対応していない場合はNone）"""
+    return _BY_EXTENSION.get(os.path.splitext(file_path)[1].lower())
+
+
+def uses_seek_index(file_path):
+    """フレーム位置のインデックスでシークする形式かどうか"""
+    backend = backend_for(file_path)
+    return backend is not None and backend.seek_index
+
+
+@metrics.timed('tag_parse')
+def probe(file_path):
+    """ファイルを1回だけ開いて、曲名・アーティスト・トラック番号・長さを読む（読めない場合はNone）"""
+    backend = backend_for(file_path)
+    if backend is None:
+        logger.info(f"対応していない形式です: {file_path}")
+        return None
+    try:
+        audio = backend.open(file_path)
+        return {
+            'title': backend.tag(audio, 'title') or os.path.basename(file_path),
+            'artist': backend.tag(audio, 'artist') or 'Unknown Artist',
+            'track_number': backend.tag(audio, 'track_number') or '0',
+            'length': audio.info.length,
+        }
+    except Exception as e:
+        logger.error(f"メタデータの読み込みに失敗しました: {file_path}: {e}")
+        return None
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sys
+import tkinter as tk
+
+
+class IconCache:
+    """SVGアイコンをPNGに変換してディスクにキャッシュする
+
+    キーはSVGの内容・サイズ・拡大率のハッシュなので、アイコンを差し替えても
+    古い画像が使われることはない。キャッシュにあればPNGを tk.PhotoImage で
+    直接読み込み、PyQt5は変換が必要な時だけ読み込む。
+    """
+
+    def __init__(self, cache_dir, bundled_dir=None):
+        """
+        cache_dir: 変換したPNGを保存するフォルダ
+        bundled_dir: ビルドに同梱した変換済みPNGのフォルダ（読み込みのみ）
+        """
+        self.cache_dir = cache_dir
+        self.bundled_dir = bundled_dir
+        self.hits = 0
+        self.misses = 0
+        self.qt_app = None
+
+    @staticmethod
+    def cache_key(svg_data, width, height, scale):
+        digest = hashlib.sha1(svg_data)
+        digest.update(f"{width}x{height}@{scale}".encode('ascii'))
+        return digest.hexdigest()
+
+    def png_path(self, svg_path, width, height, scale=1.0):
+        """変換済みPNGのパスを返す（キャッシュに無ければ変換して保存する）"""
+        with open(svg_path, 'rb') as f:
+            svg_data = f.read()
+        name = self.cache_key(svg_data, width, height, scale) + ".png"
+        for directory in (self.bundled_dir, self.cache_dir):
+            if directory and os.path.exists(os.path.join(directory, name)):
+                self.hits += 1
+                return os.path.join(directory, name)
+        self.misses += 1
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, name)
+        self.rasterize(svg_data, round(width * scale), round(height * scale), path)
+        return path
+
+    def load(self, svg_path, width=32, height=32, scale=1.0, master=None):
+        """SVGファイルを tk.PhotoImage として読み込む"""
+        return tk.PhotoImage(master=master, file=self.png_path(svg_path, width, height, scale))
+
+    def rasterize(self, svg_data, width, height, path):
+        """PyQt5でSVGを描画してPNGで保存する"""
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtSvg import QSvgRenderer
+        from PyQt5.QtCore import QByteArray, Qt
+        from PyQt5.QtGui import QPainter, QImage
+
+        if self.qt_app is None:
+            self.qt_app = QApplication.instance() or QApplication([])
+        renderer = QSvgRenderer(QByteArray(svg_data))
+        image = QImage(width, height, QImage.Format_ARGB32)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        renderer.render(painter)
+        painter.end()
+        # 書き込み途中のファイルを読まないように、一時ファイルから置き換える
+        temp_path = path + ".tmp"
+        if not image.save(temp_path, "PNG"):
+            raise OSError(f"PNGを保存できませんでした: {temp_path}")
+        os.replace(temp_path, path)
+
+    def stats_text(self):
+        return f"アイコンキャッシュ: ヒット {self.hits} 件, 変換 {self.misses} 件"
+
+
+def prebuild(icons_dir, cache_dir, width=32, height=32, scale=1.0):
+    """フォルダ内のSVGをすべて変換しておく（ビルド時に同梱する用）"""
+    cache = IconCache(cache_dir)
+    for name in sorted(os.listdir(icons_dir)):
+        if name.lower().endswith('.svg'):
+            cache.png_path(os.path.join(icons_dir, name), width, height, scale)
+    print(cache.stats_text())
+
+
+if __name__ == "__main__":
+    # python src/icon_cache.py で src/icon_cache に変換済みのアイコンを作る（make_exe.bat から呼ぶ）
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    prebuild(os.path.join(base_path, "icons"), os.path.join(base_path, "icon_cache"))
+    sys.exit(0)
@@ -0,0 +1,192 @@
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class _IterSource:
+    """リストなど、すぐに取り出せるパスの一覧"""
+
+    def __init__(self, paths):
+        self.iterator = iter(paths)
+        self.finished = False
+
+    def take(self, count):
+        items = []
+        for path in self.iterator:
+            items.append(path)
+            if len(items) >= count:
+                return items
+        self.finished = True
+        return items
+
+    def cancel(self):
+        self.finished = True
+
+
+class BackgroundScan:
+    """パスを返すジェネレータを別スレッドで回し、見つかった順に受け渡す
+
+    factory にはキャンセル用の threading.Event を受け取ってイテレータを返す関数を渡す。
+    """
+
+    _DONE = object()
+
+    def __init__(self, factory, maxsize=2000):
+        self.queue = queue.Queue(maxsize)
+        self.cancel_event = threading.Event()
+        self.finished = False
+        self.thread = threading.Thread(target=self._run, args=(factory,), name="library-scan", daemon=True)
+        self.thread.start()
+
+    def _run(self, factory):
+        try:
+            for path in factory(self.cancel_event):
+                if not self._put(path):
+                    return
+        except Exception as e:
+            logger.error(f"フォルダの走査中にエラーが発生しました: {e}")
+        finally:
+            self._put(self._DONE)
+
+    def _put(self, item):
+        # キューが一杯の間もキャンセルに反応できるようにする
+        while not self.cancel_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def take(self, count):
+        items = []
+        while len(items) < count:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._DONE:
+                self.finished = True
+                break
+            items.append(item)
+        return items
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.finished = True
+
+
+class PlaylistLoader:
+    """メタデータをスレッドプールで読み込み、結果をプレイリスト順にTkのメインループへ渡す"""
+
+    # 1回の処理でメインスレッドを占有する最大時間（秒）
+    TIME_BUDGET = 0.008
+    # 結果を確認する間隔（ミリ秒）
+    POLL_INTERVAL = 15
+
+    def __init__(self, root, load_func, on_loaded, on_idle=None, max_workers=None):
+        """
+        load_func: ワーカースレッドで実行される関数 (path -> metadata)
+        on_loaded: メインスレッドで結果ごとに呼ばれる関数 (path, metadata)
+        on_idle: 読み込み待ちが無くなった時にメインスレッドで呼ばれる関数
+        """
+        self.root = root
+        self.load_func = load_func
+        self.on_loaded = on_loaded
+        self.on_idle = on_idle
+        if max_workers is None:
+            max_workers = min(16, (os.cpu_count() or 1) * 2)
+        self.max_workers = max_workers
+        # 同時に投入しておくタスク数（大量のファイルでも一度に投入しない）
+        self.window = max_workers * 8
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="metadata")
+        self.sources = deque()  # (ソース, 完了時のコールバック)
+        self.in_flight = deque()  # (パス, Future) または完了時のコールバック
+        self.after_id = None
+
+    def add(self, paths, on_done=None):
+        """パスの一覧（またはBackgroundScan）を読み込み待ちに追加する"""
+        source = paths if isinstance(paths, BackgroundScan) else _IterSource(paths)
+        self.sources.append((source, on_done))
+        self._schedule(0)
+
+    def is_busy(self):
+        return bool(self.sources or self.in_flight)
+
+    def cancel(self):
+        """読み込み待ちのファイルをすべて破棄する"""
+        while self.sources:
+            source, _ = self.sources.popleft()
+            source.cancel()
+        while self.in_flight:
+            entry = self.in_flight.popleft()
+            if not callable(entry):
+                entry[1].cancel()
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if self.on_idle is not None:
+            self.on_idle()
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self, delay):
+        if self.after_id is None:
+            self.after_id = self.root.after(delay, self._pump)
+
+    def _fill(self):
+        """ウィンドウに空きがあればタスクを投入する"""
+        while self.sources and len(self.in_flight) < self.window:
+            source, on_done = self.sources[0]
+            for path in source.take(self.window - len(self.in_flight)):
+                self.in_flight.append((path, self.executor.submit(self.load_func, path)))
+            if not source.finished:
+                # 走査中のソースは次のファイルが見つかるまで待つ
+                break
+            self.sources.popleft()
+            if on_done is not None:
+                self.in_flight.append(on_done)
+
+    def _head_ready(self):
+        if not self.in_flight:
+            return False
+        entry = self.in_flight[0]
+        return callable(entry) or entry[1].done()
+
+    def _pump(self):
+        self.after_id = None
+        deadline = time.perf_counter() + self.TIME_BUDGET
+        self._fill()
+        # 先頭から完了した順に取り出す（プレイリストの順序を保つ）
+        while self.in_flight and time.perf_counter() < deadline:
+            entry = self.in_flight[0]
+            if callable(entry):
+                self.in_flight.popleft()
+                entry()
+                continue
+            path, future = entry
+            if not future.done():
+                break
+            self.in_flight.popleft()
+            try:
+                metadata = future.result()
+            except Exception as e:
+                logger.error(f"メタデータの読み込み中にエラーが発生しました: {path}: {e}")
+                metadata = None
+            self.on_loaded(path, metadata)
+            if len(self.in_flight) < self.window // 2:
+                self._fill()
+        if self.is_busy():
+            # 時間切れで処理が残っている場合はすぐに続きを処理する
+            # （0msだと再描画などのアイドル処理が後回しになるため1msにする）
+            self._schedule(1 if self._head_ready() else self.POLL_INTERVAL)
+        elif self.on_idle is not None:
+            self.on_idle()
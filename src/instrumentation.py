@@ -0,0 +1,210 @@
+"""ログの設定と、処理時間の計測
+
+ログは標準の logging を使い、[Logging] level より低いレベルのものは出力しない
+（1曲ごとの詳しいログは DEBUG）。処理時間の計測は [Instrumentation] enabled が
+true の場合だけ行い、名前ごとのヒストグラムを終了時にJSONで書き出す。
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import functools
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# ヒストグラムの区切り（ミリ秒。最後の区切りを超えたものは別の区間に数える）
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def setup_logging(config, base_path):
+    """設定に合わせてログの出力先とレベルを決める（file は相対パスなら設定ファイルと同じ場所）"""
+    level = logging.getLevelName(config.get('Logging', 'level', fallback='INFO').upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    handlers = [logging.StreamHandler()]
+    log_file = config.get('Logging', 'file', fallback='')
+    error = None
+    if log_file:
+        try:
+            handlers.append(logging.FileHandler(os.path.join(base_path, log_file), encoding='utf-8'))
+        except OSError as e:
+            error = e
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=handlers, force=True)
+    if error is not None:
+        logging.getLogger(__name__).warning("ログファイルを開けませんでした: %s", error)
+
+
+class Lazy:
+    """ログに出力する時だけ値を求める（出力しないレベルのログで重い処理をしない）"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return str(self.func())
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram:
+    """処理時間の件数・合計・最大と、区間ごとの件数（記録した値そのものは残さない）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0  # 秒
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+    def percentile(self, ratio):
+        """区間の上限で近似したパーセンタイル（ミリ秒）"""
+        target = self.count * ratio
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max * 1000)
+        return self.max * 1000  # 最後の区切りを超えた区間
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total * 1000 / self.count, 3) if self.count else 0,
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'max_ms': round(self.max * 1000, 3),
+            'histogram': dict(zip([f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"],
+                                  self.buckets)),
+        }
+
+
+class Metrics:
+    """名前ごとに処理時間を記録する（無効の間は何もしない。どのスレッドから呼んでもよい）
+
+        @metrics.timed('seek')
+        def seek(...): ...
+
+        with metrics.timer('tag_parse'):
+            ...
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}  # 名前 → Histogram
+
+    def enable(self):
+        self.enabled = True
+
+    def timer(self, name):
+        """with文で囲んだ処理の時間を記録する"""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name):
+        """関数の実行時間を記録するデコレーター（有効かどうかは呼ばれた時に確認する）"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def summary(self):
+        """名前ごとの集計を辞書で返す"""
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def export(self, path):
+        """集計をJSONで書き出し、要約をログに出力する"""
+        summary = self.summary()
+        logger = logging.getLogger(__name__)
+        for name, values in summary.items():
+            logger.info("%s: %d 回, 平均 %.1fms, p50 %.1fms, p95 %.1fms, 最大 %.1fms", name,
+                        values['count'], values['mean_ms'], values['p50_ms'], values['p95_ms'], values['max_ms'])
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'written': time.strftime('%Y-%m-%d %H:%M:%S'), 'metrics': summary},
+                          f, ensure_ascii=False, indent=1)
+            logger.info("処理時間を書き出しました: %s", path)
+        except OSError as e:
+            logger.error("処理時間を書き出せませんでした: %s: %s", path, e)
+
+
+# アプリ全体で共有する計測（setup_instrumentation で有効になる）
+metrics = Metrics()
+
+
+def setup_instrumentation(config, base_path):
+    """[Instrumentation] enabled が true なら計測を有効にし、書き出し先のパスを返す（無効ならNone）"""
+    if not config.getboolean('Instrumentation', 'enabled', fallback=False):
+        return None
+    metrics.enable()
+    return os.path.join(base_path, config.get('Instrumentation', 'output', fallback='instrumentation.json'))
+
+
+class EventLoopMonitor:
+    """Tkのイベントループの遅れ（予約した時刻から実際に呼ばれるまで）を記録する"""
+
+    INTERVAL = 100  # 確認の間隔（ミリ秒）
+
+    def __init__(self, root):
+        self.root = root
+        self.expected = None
+        self.after_id = None
+
+    def start(self):
+        self.expected = time.perf_counter() + self.INTERVAL / 1000
+        self.after_id = self.root.after(self.INTERVAL, self._check)
+
+    def _check(self):
+        metrics.record('tk_lag', max(0.0, time.perf_counter() - self.expected))
+        self.start()
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
@@ -0,0 +1,112 @@
+import os
+import re
+import logging
+from formats import AUDIO_EXTENSIONS  # プレイリストに追加できる拡張子
+
+logger = logging.getLogger(__name__)
+
+# フォルダ内の並び順
+SORT_ORDERS = {
+    'name': "名前順",
+    'name_desc': "名前の逆順",
+    'mtime': "更新日時順",
+    'mtime_desc': "更新日時の新しい順",
+    'none': "並べ替えない",
+}
+
+_NUMBER_RE = re.compile(r'(\d+)')
+
+
+def natural_key(name):
+    """数字を数値として比較するソートキー（track2 < track10）"""
+    return [int(part) if part.isdigit() else part.casefold() for part in _NUMBER_RE.split(name)]
+
+
+def _sort_entries(entries, sort_order):
+    if sort_order == 'none':
+        return entries
+    if sort_order in ('mtime', 'mtime_desc'):
+        def key(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+        return sorted(entries, key=key, reverse=(sort_order == 'mtime_desc'))
+    return sorted(entries, key=lambda entry: natural_key(entry.name), reverse=(sort_order == 'name_desc'))
+
+
+def _dir_id(path):
+    """シンボリックリンクのループ検出用にフォルダを識別する"""
+    st = os.stat(path)
+    if st.st_ino:
+        return (st.st_dev, st.st_ino)
+    # inode が取得できない環境では実体パスで代用する
+    return os.path.normcase(os.path.realpath(path))
+
+
+def iter_audio_files(paths, sort_order='name', cancel_event=None, extensions=AUDIO_EXTENSIONS):
+    """ファイルとフォルダの一覧から音楽ファイルのパスを見つけた順に返す
+
+    フォルダは os.scandir で1階層ずつ読み、中のファイルを返してからサブフォルダへ進む。
+    ツリー全体を先に列挙しないので、巨大なライブラリでも最初のファイルがすぐに返る。
+    """
+    visited = set()
+    for path in paths:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if os.path.isdir(path):
+            yield from _walk(path, sort_order, cancel_event, extensions, visited)
+        elif path.lower().endswith(extensions):
+            yield path
+
+
+def _walk(top, sort_order, cancel_event, extensions, visited):
+    try:
+        top_id = _dir_id(top)
+    except OSError as e:
+        logger.warning(f"フォルダを開けませんでした: {top}: {e}")
+        return
+    if top_id in visited:
+        return
+    visited.add(top_id)
+
+    # 深さ優先で処理する（スタックには逆順で積む）
+    stack = [top]
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        directory = stack.pop()
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry)
+                        elif entry.name.lower().endswith(extensions) and entry.is_file():
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"フォルダを開けませんでした: {directory}: {e}")
+            continue
+
+        for entry in _sort_entries(files, sort_order):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield entry.path
+
+        children = []
+        for entry in _sort_entries(subdirs, sort_order):
+            try:
+                dir_id = _dir_id(entry.path)
+            except OSError:
+                continue
+            if dir_id in visited:
+                # シンボリックリンク等によるループ・重複はスキップ
+                logger.info(f"既に走査済みのフォルダをスキップしました: {entry.path}")
+                continue
+            visited.add(dir_id)
+            children.append(entry.path)
+        stack.extend(reversed(children))
@@ -0,0 +1,319 @@
+import os
+import math
+import threading
+import multiprocessing
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_LUFS = -18.0  # ReplayGain 2.0 の基準の音量
+SEGMENT_SECONDS = 0.1  # 音量を求める区間（400msのブロックを100msずつずらす）
+BLOCK_SEGMENTS = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+MODES = ('off', 'track', 'album')
+
+
+def k_weighting_power(freqs, sample_rate):
+    """K特性フィルタ（ITU-R BS.1770）のパワー応答 |H(f)|^2"""
+    import numpy as np
+    # 高域シェルフ
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0)
+    shelf_a = (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    # 低域カット
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass_b = (1.0, -2.0, 1.0)
+    highpass_a = (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+
+    z = np.exp(-2j * np.pi * np.asarray(freqs) / sample_rate)  # z^-1
+
+    def response(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    return np.abs(response(shelf_b, shelf_a) * response(highpass_b, highpass_a)) ** 2
+
+
+def segment_power(samples, sample_rate):
+    """100msの区間ごとのK特性をかけた平均パワーを返す（区間に満たない末尾のサンプルは使わない）
+
+    IIRフィルタを1サンプルずつかける代わりに、100msの区間ごとのスペクトルに
+    K特性のパワー応答をかけて区間のエネルギーを求める（NumPyでまとめて計算できる）。
+    """
+    import numpy as np
+    segment = int(sample_rate * SEGMENT_SECONDS)
+    count = len(samples) // segment
+    size = 2 * segment  # 区間の外にはみ出すフィルタの応答も含める
+    weights = k_weighting_power(np.fft.rfftfreq(size, 1 / sample_rate), sample_rate)
+    # 片側スペクトルから全体のエネルギーを求めるための係数（直流とナイキスト以外は2倍）
+    weights[1:-1] *= 2
+    weights /= size * segment
+    power = np.zeros(count)
+    for channel in range(samples.shape[1]):  # チャンネルの重みはL/Rとも1
+        data = samples[:count * segment, channel].reshape(count, segment) / 32768.0
+        spectrum = np.fft.rfft(data, n=size, axis=1)
+        power += (spectrum.real ** 2 + spectrum.imag ** 2) @ weights
+    return power
+
+
+def gated_loudness(power):
+    """区間ごとのパワーから、ゲート付きの平均音量（LUFS）とゲートを通過したブロック数を返す"""
+    import numpy as np
+    if len(power) < BLOCK_SEGMENTS:
+        return None, 0
+    # 400msのブロック（100msの区間4つ）の平均パワー
+    cumulative = np.concatenate(([0.0], np.cumsum(power)))
+    blocks = (cumulative[BLOCK_SEGMENTS:] - cumulative[:-BLOCK_SEGMENTS]) / BLOCK_SEGMENTS
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[block_loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return None, 0
+    threshold = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+    gated = blocks[block_loudness > max(threshold, ABSOLUTE_GATE)]
+    return -0.691 + 10 * math.log10(gated.mean()), len(gated)
+
+
+def integrated_loudness(samples, sample_rate):
+    """ゲート付きの平均音量（LUFS）と、ゲートを通過したブロック数を返す"""
+    return gated_loudness(segment_power(samples, sample_rate))
+
+
+def _parse_gain(text):
+    """"-6.20 dB" のようなタグの値を数値にする"""
+    try:
+        return float(str(text).strip().split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+REPLAYGAIN_KEYS = ('replaygain_track_gain', 'replaygain_track_peak',
+                   'replaygain_album_gain', 'replaygain_album_peak')
+R128_KEYS = ('r128_track_gain', 'r128_album_gain')
+R128_OFFSET = 5.0  # R128（-23 LUFS基準）のゲインを ReplayGain 2.0（-18 LUFS基準）に直す
+
+
+def read_replaygain_tags(file_path):
+    """ReplayGainタグを読む。無ければ空の辞書
+
+    ID3のTXXX、Vorbis Comment（FLAC・Ogg Vorbis・Opus）、MP4の ---- を同じように読む。
+    OpusのR128_TRACK_GAIN・R128_ALBUM_GAIN（1/256 dB単位）はReplayGainの値に直して使う。
+    """
+    from mutagen import MutagenError
+    from formats import backend_for
+    backend = backend_for(file_path)
+    if backend is None:
+        return {}
+    try:
+        tags = backend.open(file_path).tags
+    except (MutagenError, OSError):
+        return {}
+    if tags is None:
+        return {}
+    values = {}
+    for key, value in tags.items():
+        # ID3は "TXXX:REPLAYGAIN_TRACK_GAIN"、MP4は "----:com.apple.iTunes:replaygain_track_gain"
+        name = key.rsplit(':', 1)[-1].lower()
+        if name not in REPLAYGAIN_KEYS and name not in R128_KEYS:
+            continue
+        value = getattr(value, 'text', value)  # ID3はフレームの text に値の一覧がある
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        value = _parse_gain(value) if value is not None else None
+        if value is None:
+            continue
+        if name in R128_KEYS:
+            values.setdefault(name[len('r128_'):], value / 256 + R128_OFFSET)
+        else:
+            values[name[len('replaygain_'):]] = value
+    return values
+
+
+def analyze(file_path):
+    """曲の音量を調べる（ReplayGainタグがあればそれを使い、無ければ展開して計算する）
+
+    展開は decode_chunks で一定の長さずつ行い、区間ごとのパワーとピークだけを残す
+    （長い曲でも曲全体をメモリに展開しない）。長すぎて展開できない曲は、
+    音量を未設定のまま 'skipped' に理由を入れて返す。
+    """
+    entry = {
+        'album': os.path.dirname(file_path),  # アルバムはフォルダ単位とみなす
+        'track_gain': None, 'track_peak': None, 'album_gain': None, 'album_peak': None,
+        'loudness': None, 'blocks': 0,
+    }
+    tags = read_replaygain_tags(file_path)
+    if 'track_gain' in tags:
+        entry.update(tags)
+        return entry
+    import numpy as np
+    from audio_decode import decode_chunks, TooLongError
+    try:
+        _, sample_rate, chunks = decode_chunks(file_path)
+    except TooLongError as e:
+        entry['skipped'] = str(e)
+        return entry
+    segment = int(sample_rate * SEGMENT_SECONDS)
+    powers = []
+    peak = 0
+    rest = None  # 区間に満たずに次の展開分へ回すサンプル
+    for samples in chunks:
+        peak = max(peak, -int(samples.min()), int(samples.max()))
+        if rest is not None:
+            samples = np.concatenate((rest, samples))
+        used = len(samples) // segment * segment
+        powers.append(segment_power(samples[:used], sample_rate))
+        rest = samples[used:]
+    loudness, blocks = gated_loudness(np.concatenate(powers) if powers else np.zeros(0))
+    entry['track_peak'] = peak / 32768.0
+    if loudness is not None:
+        entry['track_gain'] = REFERENCE_LUFS - loudness
+        entry['loudness'] = loudness
+        entry['blocks'] = blocks
+    return entry
+
+
+def album_values(entries):
+    """同じアルバムの解析結果から (アルバムゲイン, アルバムのピーク) を求める"""
+    total_blocks = sum(entry['blocks'] for entry in entries if entry['loudness'] is not None)
+    if not total_blocks:
+        return None, None
+    power = sum(entry['blocks'] * 10 ** ((entry['loudness'] + 0.691) / 10)
+                for entry in entries if entry['loudness'] is not None) / total_blocks
+    peak = max((entry['track_peak'] or 0.0) for entry in entries)
+    return REFERENCE_LUFS - (-0.691 + 10 * math.log10(power)), peak
+
+
+def gain_factor(gain, peak, preamp_db=0.0):
+    """ゲイン（dB）を音量の倍率にする（ピークで音割れしない範囲、かつ1以下）"""
+    if gain is None:
+        return 1.0
+    factor = 10 ** ((gain + preamp_db) / 20)
+    if peak:
+        factor = min(factor, 1.0 / peak)
+    return min(factor, 1.0)  # pygameでは音量を上げられない
+
+
+def _init_worker():
+    from audio_decode import init_worker
+    init_worker()
+
+
+class LoudnessScanner:
+    """プレイリストの曲の音量をバックグラウンドで解析してキャッシュする
+
+    解析（展開とFFT）はプロセスプールで行い、キャッシュの確認と書き込みは
+    専用のスレッドで行う（画面・再生の処理は待たせない）。
+    依頼が無くなるとプロセスプールを終了し、次の依頼で作り直す。
+    """
+
+    def __init__(self, cache, max_workers=None):
+        self.cache = cache
+        # 再生や画面の処理のためにCPUを半分残す
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.requests = deque()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.analyzed = 0
+
+    def scan(self, paths, first=False):
+        """解析を依頼する（解析済みの曲は読み飛ばす）。first=True なら先に解析する"""
+        with self.lock:
+            if first:
+                self.requests.extendleft(reversed(list(paths)))
+            else:
+                self.requests.extend(paths)
+            if self.thread is None and not self.stopped.is_set():
+                self.thread = threading.Thread(target=self._run, name="loudness", daemon=True)
+                self.thread.start()
+
+    def _next_request(self):
+        with self.lock:
+            if self.requests:
+                return self.requests.popleft()
+            return None
+
+    def _run(self):
+        pool = None
+        pending = {}  # Future → (パス, stat)
+        try:
+            while not self.stopped.is_set():
+                while len(pending) < self.max_workers * 2:
+                    file_path = self._next_request()
+                    if file_path is None:
+                        break
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    if (any(path == file_path for path, _ in pending.values())
+                            or self.cache.get_loudness(file_path, stat) is not None):
+                        continue  # 解析中・解析済み
+                    if pool is None:
+                        pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                   initializer=_init_worker)
+                    pending[pool.submit(analyze, file_path)] = (file_path, stat)
+                if not pending:
+                    with self.lock:
+                        if not self.requests:
+                            self.thread = None
+                            break
+                    continue
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, stat = pending.pop(future)
+                    try:
+                        entry = future.result()
+                        if entry.get('skipped'):
+                            logger.warning(f"長い曲のため音量を解析しませんでした: {file_path}: {entry['skipped']}")
+                        self.cache.put_loudness(file_path, stat, entry)
+                        self.analyzed += 1
+                    except Exception as e:
+                        logger.error(f"音量の解析中にエラーが発生しました: {file_path}: {e}")
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            if self.analyzed:
+                logger.info(f"音量の解析が終わりました: {self.analyzed} 件")
+                self.analyzed = 0
+
+    def gain(self, file_path, mode, preamp_db=0.0):
+        """再生する曲の音量の倍率を返す（未解析の場合は先に解析するよう依頼して1.0を返す）"""
+        if mode not in ('track', 'album'):
+            return 1.0
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return 1.0
+        entry = self.cache.get_loudness(file_path, stat)
+        if entry is None:
+            self.scan([file_path], first=True)
+            return 1.0
+        gain, peak = entry['track_gain'], entry['track_peak']
+        if mode == 'album':
+            if entry['album_gain'] is not None:
+                gain, peak = entry['album_gain'], entry['album_peak'] or peak
+            else:
+                album_gain, album_peak = album_values(self.cache.album_loudness(entry['album']))
+                if album_gain is not None:
+                    gain, peak = album_gain, album_peak
+        return gain_factor(gain, peak, preamp_db)
+
+    def stop(self):
+        """解析を中止する（解析中の曲は破棄し、キャッシュへの書き込みが終わるのを待つ）"""
+        self.stopped.set()
+        with self.lock:
+            self.requests.clear()
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout=2)
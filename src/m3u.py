@@ -0,0 +1,57 @@
+import os
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+from library_scan import AUDIO_EXTENSIONS
+
+
+def _decode(raw, encoding):
+    """1行分のバイト列を文字列にする（.m3u はUTF-8で読めなければShift_JISとみなす）"""
+    if encoding:
+        return raw.decode(encoding, 'replace')
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp932', 'replace')
+
+
+def iter_m3u(m3u_path, cancel_event=None, extensions=AUDIO_EXTENSIONS):
+    """M3U/M3U8ファイルの曲のパスを1行ずつ読みながら返す
+
+    相対パスはプレイリストのあるフォルダからのパスとして扱う。
+    #EXTINF などのコメント行と、対応していない拡張子・URLの行は読み飛ばす。
+    """
+    base_dir = os.path.dirname(os.path.abspath(m3u_path))
+    encoding = 'utf-8' if m3u_path.lower().endswith('.m3u8') else None
+    with open(m3u_path, 'rb') as f:
+        for line_number, raw in enumerate(f):
+            if cancel_event is not None and line_number % 1000 == 0 and cancel_event.is_set():
+                return
+            if line_number == 0 and raw.startswith(b'\xef\xbb\xbf'):
+                raw = raw[3:]  # BOM
+            line = _decode(raw, encoding).strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.lower().startswith('file://'):
+                line = url2pathname(unquote(urlparse(line).path))
+            elif '://' in line:
+                continue  # ストリーミングのURLには対応していない
+            if not line.lower().endswith(extensions):
+                continue
+            yield os.path.normpath(os.path.join(base_dir, line))
+
+
+def write_m3u(m3u_path, entries):
+    """曲の一覧をM3U（拡張形式、UTF-8）で書き出し、書き出した曲数を返す
+
+    entries: (パス, 曲名, アーティスト, 長さ（秒）) を順に返すイテラブル
+    書き込み途中で失敗しても元のファイルが壊れないよう、一時ファイルから置き換える。
+    """
+    temp_path = m3u_path + ".tmp"
+    count = 0
+    with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write("#EXTM3U\n")
+        for path, title, artist, length in entries:
+            f.write(f"#EXTINF:{int(round(length or 0))},{artist} - {title}\n{path}\n")
+            count += 1
+    os.replace(temp_path, m3u_path)
+    return count
@@ -1,24 +1,44 @@
+import time
+STARTED = time.perf_counter()  # 起動時間の計測開始（モジュールの読み込みも含める）
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-import pygame
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import os
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+import bisect
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import pyaudio
-import time
-import traceback
+import threading
+import multiprocessing
 import configparser
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtSvg import QSvgRenderer
-from PyQt5.QtCore import QByteArray, Qt
-from PyQt5.QtGui import QPixmap, QPainter, QImage
-import json
 import sys
+import logging
+from player_engine import PlayerEngine
+from ingest import PlaylistLoader, BackgroundScan
+from library_scan import iter_audio_files, SORT_ORDERS
+from m3u import iter_m3u
+from playlist_view import PlaylistView
+from waveform import PeakLoader
+from waveform_view import WaveformView
+from device_probe import DeviceProber
+from ui_scheduler import TickScheduler
+from icon_cache import IconCache
+from startup_timer import StartupTimer
+from instrumentation import setup_logging, setup_instrumentation, metrics, Lazy, EventLoopMonitor
+
+logger = logging.getLogger(__name__)
+
+# PyAudio・PyQt5・Pillow・mutagen は起動を速くするため、使う時に読み込む
 
 class MusicPlayer:
+    SAVE_DELAY = 1000  # プレイリストの変更から保存までの時間（ミリ秒）
+    FILTER_DELAY = 300  # 絞り込み中に曲が追加されてから表示を更新するまでの時間（ミリ秒）
+    MAX_SORT_KEYS = 3  # 並べ替えで考慮する列の数（最近クリックした順）
+    # 見出しの列 → 並べ替えに使うプレイリストの列
+    SORT_COLUMN_OF = {"track": "track", "title": "title", "artist": "artist", "duration": "length"}
+    DEVICE_CHECK_INTERVAL = 1000  # デバイスの一覧の変化を確認する間隔（ミリ秒）
+    DEFAULT_DEVICE_LABEL = "既定のデバイス"  # コンボボックスの先頭に表示する項目
+    
     def __init__(self, root):
+        self.startup = StartupTimer(STARTED)
+        self.startup.mark("モジュール読み込み")
         self.root = root
         self.root.title("シンプル音楽プレイヤー")
         
@@ -36,6 +56,11 @@ class MusicPlayer:
         # 設定ファイルの読み込み
         self.config = configparser.ConfigParser()
         self.load_settings()
+        setup_logging(self.config, self.base_path)
+        # 処理時間の計測（[Instrumentation] enabled = true の場合だけ。終了時に書き出す）
+        self.metrics_path = setup_instrumentation(self.config, self.base_path)
+        self.event_loop_monitor = EventLoopMonitor(self.root) if self.metrics_path else None
+        self.startup.mark("設定読み込み")
         
         # ウィンドウサイズを設定
         try:
@@ -43,54 +68,136 @@ class MusicPlayer:
             height = int(self.config['Window']['height'])
             self.root.geometry(f"{width}x{height}")
         except Exception as e:
-            print(f"ウィンドウサイズの設定中にエラーが発生しました: {e}")
+            logger.error(f"ウィンドウサイズの設定中にエラーが発生しました: {e}")
             self.root.geometry("800x600")
         
-        # 音楽プレイヤーの初期化
-        pygame.mixer.init()
-        
-        # プレイリスト
-        self.playlist = []
-        self.current_track = 0
-        self.current_track_length = 0  # 現在の曲の長さ（秒）
-        self.current_position = 0  # 現在の再生位置（秒）
-        self.last_update_time = 0  # 最後に更新した時間
-        self.repeat_track = False  # トラックリピートフラグ
-        self.is_paused = True  # 一時停止状態を記録
-        
-        # オーディオデバイスの初期化
-        self.p = pyaudio.PyAudio()
-        self.audio_devices = self.get_audio_devices()
-        self.current_device_index = self.p.get_default_output_device_info()['index']
+        # 再生エンジン（プレイリスト・再生操作・デバイス選択。画面に依存しない部分）
+        self.engine = PlayerEngine(self.config, self.base_path, on_change=self.on_engine_change)
+        self.state_log = Lazy(self.engine.state_text)  # ログに出力する時だけ再生状態を調べる
+        self.playlist = self.engine.playlist  # ファイルパスとメタデータ（self.playlist[i] でパスを返す）
+        self.shown_second = 0  # 表示中の経過時間（秒）
+        # 波形表示用のピーク（キャッシュに無い曲はワーカープロセスで計算する）
+        self.peak_loader = PeakLoader(self.engine.metadata_cache)
+        self.waveform_file = None  # 波形を表示している曲
+        self.waveform_after_id = None  # ピークの計算結果の確認の予約
+        
+        # メタデータをバックグラウンドで読み込むローダー
+        self.loader = PlaylistLoader(self.root, self.engine.load_track, self.on_track_loaded,
+                                     on_idle=self.on_loader_idle)
+        self.loaded_count = 0  # 今回の読み込みで追加した曲数
+        self.closing = False  # ウィンドウを閉じる処理中かどうか（バックグラウンドの処理を新たに始めない）
+        self.save_after_id = None  # プレイリストの保存の予約
+        self.filter_rows = None  # 絞り込み中に表示している曲の番号（絞り込んでいない場合はNone）
+        self.filter_after_id = None  # 絞り込み結果の更新の予約
+        self.filter_query = ""  # 絞り込みに使った検索語
+        self.sort_keys = []  # 並べ替えの (列名, 降順かどうか)。先頭が最後にクリックした列
+        self.duplicate_scan = None  # 重複の検索中は (スレッド, キャンセル用Event, 結果, パス, 曲ID)
+        self.startup.mark("再生エンジン")
+        
+        # オーディオデバイス（一覧は再生エンジンが監視し、対応状況はバックグラウンドで調べる）
+        self.device_probe = None
+        self.probe_version = 0  # 表示に使った調査結果のバージョン
+        self.audio_devices = []  # コンボボックスに表示しているデバイス名（先頭は既定のデバイス）
         
         # ドラッグ&ドロップの設定
         self.root.drop_target_register(DND_FILES)
         self.root.dnd_bind('<<Drop>>', self.drop_files)
         
-        # Qt5の初期化
-        self.qt_app = QApplication.instance()
-        if not self.qt_app:
-            self.qt_app = QApplication([])
+        # 変換済みアイコンのキャッシュ（ビルドに同梱したものを優先する）
+        bundled_dir = os.path.join(sys._MEIPASS, "icon_cache") if getattr(sys, 'frozen', False) else None
+        self.icon_cache = IconCache(os.path.join(self.base_path, "icon_cache"), bundled_dir)
+        # 高DPI環境ではTkの拡大率に合わせた大きさで描画する（96dpiで1.0）
+        self.icon_scale = max(1.0, round(float(self.root.tk.call('tk', 'scaling')) * 72 / 96 * 4) / 4)
         
         self.create_widgets()
-        self.set_audio_device()  # 保存された設定を適用
-        self.update_audio_device_info()
+        self.startup.mark("画面作成")
         
-        # プログレスバーの更新用タイマー
-        self.update_progress()
+        # 再生中の定期処理（一時停止・停止中は止まる）
+        self.scheduler = TickScheduler(self.root, lambda: not self.engine.is_paused)
+        # 曲の終了確認はウィンドウが最小化されていても続ける
+        self.scheduler.subscribe(self.engine.tick, lambda: 250 if self.scheduler.hidden else 100, when_hidden=True)
+        # 表示の更新は秒やピクセルが変わるタイミングに合わせる
+        self.scheduler.subscribe(self.update_progress, self.progress_interval)
         
         # プレイリストの復元（最後に実行）
         self.restore_playlist()
         
-    def get_audio_devices(self):
-        devices = []
-        for i in range(self.p.get_device_count()):
-            device_info = self.p.get_device_info_by_index(i)
-            if device_info['maxOutputChannels'] > 0:  # 出力デバイスのみを取得
-                devices.append((i, device_info['name']))
-        return devices
+        # 最初の描画が終わったら起動時間を報告し、オーディオデバイスを初期化する
+        self.root.after_idle(self.on_first_idle)
+    
+    def on_first_idle(self):
+        """起動後、最初の描画が終わった時の処理"""
+        self.startup.mark("初回描画")
+        logger.info(self.icon_cache.stats_text())
+        self.startup.report(self.config.getint('Startup', 'budget_ms', fallback=0))
+        if self.event_loop_monitor is not None:
+            self.event_loop_monitor.start()
+        self.init_audio_devices()
+    
+    def init_audio_devices(self):
+        """前回調べたデバイスの対応状況で一覧と情報を表示し、調べ直しをバックグラウンドで始める"""
+        started = time.perf_counter()
+        self.device_probe = DeviceProber(os.path.join(self.base_path, "device_probe.json"))
+        self.device_probe.request()
+        self.probe_version = self.device_probe.version
+        self.refresh_device_list()
+        self.update_audio_device_info()
+        logger.info(f"オーディオデバイスの初期化: {(time.perf_counter() - started) * 1000:.0f}ms")
+        # デバイスの抜き差しは再生エンジンの監視スレッドが見つけるので、一覧の変化だけを確認する
+        self.root.after(self.DEVICE_CHECK_INTERVAL, self.check_devices)
+
+    def refresh_device_list(self):
+        """再生エンジンが監視しているデバイスのうち、開けるものをコンボボックスに表示する"""
+        names = self.device_probe.usable_names(self.engine.devices.names)
+        # 開けないと判定されたデバイスでも、再生に使っている場合は表示する
+        if self.engine.device_name and self.engine.device_name not in names:
+            names.append(self.engine.device_name)
+        self.audio_devices = [self.DEFAULT_DEVICE_LABEL] + names
+        self.device_combo['values'] = self.audio_devices
+        self.set_audio_device()
+
+    def check_devices(self):
+        """デバイスの一覧や対応状況が変わっていれば表示し直す（取り外された場合はエンジンが切り替える）"""
+        if self.engine.check_devices():
+            self.device_probe.request()  # 接続されたデバイスを調べる
+            self.refresh_device_list()
+            self.update_audio_device_info()
+        elif self.device_probe.version != self.probe_version:
+            self.probe_version = self.device_probe.version
+            self.refresh_device_list()
+            self.update_audio_device_info()
+        self.root.after(self.DEVICE_CHECK_INTERVAL, self.check_devices)
         
     def create_widgets(self):
+        # メニューバー
+        menubar = tk.Menu(self.root)
+        playlist_menu = tk.Menu(menubar, tearoff=0)
+        playlist_menu.add_command(label="新しいプレイリスト...", command=self.new_playlist)
+        playlist_menu.add_command(label="名前の変更...", command=self.rename_playlist)
+        playlist_menu.add_command(label="削除", command=self.delete_playlist)
+        playlist_menu.add_separator()
+        playlist_menu.add_command(label="M3U/M3U8の読み込み...", command=self.import_m3u)
+        playlist_menu.add_command(label="M3U8に書き出す...", command=self.export_m3u)
+        playlist_menu.add_separator()
+        playlist_menu.add_command(label="重複した曲を探す...", command=self.find_duplicates)
+        playlist_menu.add_separator()
+        playlist_menu.add_command(label="選択した曲を上へ移動", accelerator="Alt+↑", command=self.move_selection_up)
+        playlist_menu.add_command(label="選択した曲を下へ移動", accelerator="Alt+↓", command=self.move_selection_down)
+        playlist_menu.add_command(label="選択した曲を削除", accelerator="Delete", command=lambda: self.on_delete_key(None))
+        self.skip_duplicates_var = tk.BooleanVar(
+            value=self.config.getboolean('Library', 'skip_duplicates', fallback=False))
+        playlist_menu.add_checkbutton(label="ドロップ時に重複した曲を追加しない",
+                                      variable=self.skip_duplicates_var, command=self.on_skip_duplicates_change)
+        menubar.add_cascade(label="プレイリスト", menu=playlist_menu)
+        playback_menu = tk.Menu(menubar, tearoff=0)
+        self.replaygain_var = tk.StringVar(value=self.engine.replaygain_mode)
+        for label, mode in (("音量の自動調整なし", 'off'), ("曲ごとに音量を揃える（ReplayGain）", 'track'),
+                            ("アルバムごとに音量を揃える（ReplayGain）", 'album')):
+            playback_menu.add_radiobutton(label=label, value=mode, variable=self.replaygain_var,
+                                          command=self.on_replaygain_change)
+        menubar.add_cascade(label="再生", menu=playback_menu)
+        self.root.config(menu=menubar)
+        
         # ステータスバー
         self.status_frame = tk.Frame(self.root, bd=1, relief=tk.SUNKEN)
         self.status_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=2)
@@ -106,28 +213,26 @@ class MusicPlayer:
         # デバイス選択用のコンボボックス
         self.device_var = tk.StringVar()
         self.device_combo = ttk.Combobox(device_frame, textvariable=self.device_var, state="readonly", width=50)
-        self.device_combo['values'] = [name for _, name in self.audio_devices]
         self.device_combo.pack(side=tk.LEFT, padx=5)
         self.device_combo.bind('<<ComboboxSelected>>', self.on_device_change)
         
-        # 保存されたデバイス名を取得して設定
-        try:
-            saved_device_name = self.config['Audio']['device_name']
-            if saved_device_name:  # デバイス名が指定されている場合
-                for i, (_, device_name) in enumerate(self.audio_devices):
-                    if device_name == saved_device_name:
-                        self.device_combo.current(i)
-                        self.current_device_index = i
-                        print(f"保存されたデバイスを設定しました: {saved_device_name}")
-                        break
-        except Exception as e:
-            print(f"保存されたデバイスの設定中にエラーが発生しました: {e}")
-            self.device_combo.current(self.current_device_index)
-        
         # デバイス情報を表示するラベル
         self.device_info_label = tk.Label(self.status_frame, text="", anchor=tk.W)
         self.device_info_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        # ファイル読み込み中の表示とキャンセルボタン（読み込み中のみ表示）
+        self.loading_frame = tk.Frame(self.status_frame)
+        self.loading_label = tk.Label(self.loading_frame, text="")
+        self.loading_label.pack(side=tk.LEFT)
+        self.cancel_loading_button = ttk.Button(self.loading_frame, text="キャンセル", command=self.cancel_loading)
+        self.cancel_loading_button.pack(side=tk.LEFT, padx=5)
+        
+        # 重複した曲の検索中の表示とキャンセルボタン（検索中のみ表示）
+        self.duplicate_frame = tk.Frame(self.status_frame)
+        tk.Label(self.duplicate_frame, text="重複した曲を検索中...").pack(side=tk.LEFT)
+        ttk.Button(self.duplicate_frame, text="キャンセル",
+                   command=self.cancel_duplicate_scan).pack(side=tk.LEFT, padx=5)
+        
         # Treeviewのスタイルを設定
         style = ttk.Style()
         style.theme_use('default')  # デフォルトテーマを使用
@@ -153,25 +258,55 @@ class MusicPlayer:
             artist_width = int(self.config['Columns']['artist_width'])
             duration_width = int(self.config['Columns']['duration_width'])
         except Exception as e:
-            print(f"カラム幅の設定中にエラーが発生しました: {e}")
+            logger.error(f"カラム幅の設定中にエラーが発生しました: {e}")
             track_width = 30
             title_width = 400
             artist_width = 200
             duration_width = 70
         
-        # プレイリスト表示用のTreeview
-        self.tree = ttk.Treeview(self.root, columns=("playing", "track", "title", "artist", "duration"), show="headings", style="Treeview")
+        # プレイリストのタブ（タブは切り替え用で、曲の一覧は下のTreeviewを共有する）
+        self.playlist_tabs = ttk.Notebook(self.root)
+        self.playlist_tabs.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.playlist_tabs.bind("<<NotebookTabChanged>>", self.on_playlist_tab_changed)
+        self.tab_ids = []  # タブの順番 → プレイリストID
+        self.refresh_playlist_tabs()
+        
+        # 検索ボックス（曲名・アーティスト・ファイル名で絞り込む）
+        filter_frame = tk.Frame(self.root)
+        filter_frame.pack(fill=tk.X, padx=10, pady=(5, 0))
+        tk.Label(filter_frame, text="検索:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var)
+        self.filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        # 入力中はスペースキーや左右キーの再生操作（ウィンドウ全体のバインド）を行わない
+        self.filter_entry.bindtags((str(self.filter_entry), "TEntry", "all"))
+        self.filter_entry.bind("<Return>", self.on_filter_enter)
+        self.filter_entry.bind("<Down>", self.on_filter_enter)
+        self.filter_entry.bind("<Escape>", self.on_filter_escape)
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+        self.root.bind("<Control-f>", lambda e: self.filter_entry.focus_set())
+        
+        # プレイリスト表示用のTreeview（表示されている行だけアイテムを作る）
+        self.view = PlaylistView(self.root, ("playing", "track", "title", "artist", "duration"),
+                                 self.row_count, self.get_row_values, style="Treeview",
+                                 on_move=self.on_move_rows)
+        self.tree = self.view.tree
         self.tree.heading("playing", text="")  # 再生中マーク用の列
-        self.tree.heading("track", text="TRK")  # 「トラック」を「TRK」に変更
-        self.tree.heading("title", text="曲名")
-        self.tree.heading("artist", text="アーティスト")
-        self.tree.heading("duration", text="Time")  # 「再生時間」を「Time」に変更
+        self.heading_texts = {
+            "track": "TRK",  # 「トラック」を「TRK」に変更
+            "title": "曲名",
+            "artist": "アーティスト",
+            "duration": "Time",  # 「再生時間」を「Time」に変更
+        }
+        for column, text in self.heading_texts.items():
+            # 見出しのクリックで並べ替え
+            self.tree.heading(column, text=text, command=lambda c=column: self.sort_by(c))
         self.tree.column("playing", width=20, anchor="center", stretch=False)  # 再生中マーク用の列
         self.tree.column("track", width=track_width, anchor="e", stretch=False)  # 固定幅
         self.tree.column("title", width=title_width, stretch=True)  # 伸縮可能
         self.tree.column("artist", width=artist_width, stretch=True)  # 伸縮可能
         self.tree.column("duration", width=duration_width, anchor="e", stretch=False)  # 固定幅で右端に配置
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # ダブルクリックイベントの設定
         self.tree.bind("<Double-1>", self.on_enter_key)  # ダブルクリックでEnterキーと同じ処理を実行
@@ -184,8 +319,15 @@ class MusicPlayer:
         self.root.bind("<Right>", self.on_right_key)  # 右カーソルキーのバインドを追加
         self.root.bind("<Control-Left>", self.on_ctrl_left_key)  # Ctrl+左矢印のバインドを追加
         self.root.bind("<Control-Right>", self.on_ctrl_right_key)  # Ctrl+右矢印のバインドを追加
+        self.root.bind("<l>", lambda e: self.mark_loop_point())  # 範囲繰り返しのA点・B点・解除
+        self.root.bind("<Escape>", lambda e: self.cancel_loading())  # 読み込みのキャンセル
         self.tree.bind("<Up>", self.on_up_key)
         self.tree.bind("<Down>", self.on_down_key)
+        self.tree.bind("<Shift-Up>", lambda e: self.on_up_key(e, extend=True))  # 選択範囲を広げる
+        self.tree.bind("<Shift-Down>", lambda e: self.on_down_key(e, extend=True))
+        self.tree.bind("<Alt-Up>", lambda e: self.move_selection_up())  # 選択した曲を移動
+        self.tree.bind("<Alt-Down>", lambda e: self.move_selection_down())
+        self.tree.bind("<Control-a>", lambda e: self.view.select_all())
         
         # プログレスバーと時間表示用のフレーム
         progress_frame = tk.Frame(self.root, bd=2, relief=tk.GROOVE, padx=5, pady=5)
@@ -199,13 +341,9 @@ class MusicPlayer:
         self.current_time_label = tk.Label(progress_frame, text="00:00")
         self.current_time_label.pack(side=tk.LEFT)
         
-        # プログレスバー
-        self.progress_var = tk.DoubleVar()
-        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
-        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        
-        # プログレスバーのクリックイベントを設定
-        self.progress_bar.bind('<Button-1>', self.on_progress_click)
+        # 波形を表示するプログレスバー（クリックした位置から再生）
+        self.waveform = WaveformView(progress_frame, on_seek=self.on_progress_click)
+        self.waveform.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         
         # 曲の長さを表示するラベル
         self.total_time_label = tk.Label(progress_frame, text="00:00")
@@ -239,6 +377,9 @@ class MusicPlayer:
             self.next_icon = self.load_svg_to_photoimage("icons/next.svg")
             self.repeat_off_icon = self.load_svg_to_photoimage("icons/repeat_off.svg")
             self.repeat_on_icon = self.load_svg_to_photoimage("icons/repeat_on.svg")
+            self.loop_off_icon = self.load_svg_to_photoimage("icons/loop_off.svg")
+            self.loop_a_icon = self.load_svg_to_photoimage("icons/loop_a.svg")
+            self.loop_on_icon = self.load_svg_to_photoimage("icons/loop_on.svg")
         except Exception as e:
             # アイコンが読み込めない場合はテキストボタンを使用
             self.prev_icon = None
@@ -251,6 +392,9 @@ class MusicPlayer:
             self.next_icon = None
             self.repeat_off_icon = None
             self.repeat_on_icon = None
+            self.loop_off_icon = None
+            self.loop_a_icon = None
+            self.loop_on_icon = None
         
         # ボタンの作成
         self.prev_button = ttk.Button(control_frame, style='Icon.TButton', 
@@ -320,6 +464,15 @@ class MusicPlayer:
         self.repeat_button.bind("<Enter>", lambda e: self.show_tooltip(e, "リピート: OFF"))
         self.repeat_button.bind("<Leave>", lambda e: self.hide_tooltip())
         
+        # 範囲繰り返しボタン（押すたびにA点、B点、解除）
+        self.loop_button = ttk.Button(control_frame, style='Icon.TButton',
+                                    image=self.loop_off_icon if self.loop_off_icon else None,
+                                    text="A-B" if not self.loop_off_icon else "",
+                                    command=self.mark_loop_point)
+        self.loop_button.pack(side=tk.LEFT, padx=5)
+        self.loop_button.bind("<Enter>", lambda e: self.show_tooltip(e, "範囲繰り返し（A点・B点・解除）"))
+        self.loop_button.bind("<Leave>", lambda e: self.hide_tooltip())
+        
         # ツールチップ用のラベルを作成
         self.tooltip = tk.Label(self.root, text="", background="#ffffe0", relief="solid", borderwidth=1, font=('', 12))
         self.tooltip.place_forget()  # 最初は非表示
@@ -328,139 +481,159 @@ class MusicPlayer:
         if not self.playlist:  # プレイリストが空の場合は何もしない
             return
         
-        self.repeat_track = not self.repeat_track
+        self.engine.set_repeat(not self.engine.repeat_track)
         if self.repeat_on_icon and self.repeat_off_icon:
             self.repeat_button.configure(
-                image=self.repeat_on_icon if self.repeat_track else self.repeat_off_icon
+                image=self.repeat_on_icon if self.engine.repeat_track else self.repeat_off_icon
             )
         else:
             self.repeat_button.configure(
-                text=f"リピート: {'ON' if self.repeat_track else 'OFF'}"
+                text=f"リピート: {'ON' if self.engine.repeat_track else 'OFF'}"
             )
     
+    def mark_loop_point(self):
+        self.engine.mark_loop_point()
+
+    def update_loop_button(self):
+        """範囲繰り返しの状態をボタンと波形に表示する"""
+        engine = self.engine
+        if engine.loop_points is not None:
+            icon, text = self.loop_on_icon, "A-B ●"
+        elif engine.loop_mark is not None:
+            icon, text = self.loop_a_icon, "A-"
+        else:
+            icon, text = self.loop_off_icon, "A-B"
+        if icon:
+            self.loop_button.configure(image=icon)
+        else:
+            self.loop_button.configure(text=text)
+        length = engine.current_track_length
+        points = engine.loop_points or ((engine.loop_mark,) if engine.loop_mark is not None else ())
+        self.waveform.set_markers([point / length for point in points] if length > 0 else [])
+
     def forward(self, seconds):
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        if pygame.mixer.music.get_busy():
-            self.current_position = min(self.current_track_length, self.current_position + seconds)
-            pygame.mixer.music.set_pos(self.current_position)
-            self.last_update_time = time.time()
+        self.engine.forward(seconds)
+        self.show_progress(self.engine.current_position)
     
     def rewind(self, seconds):
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        if pygame.mixer.music.get_busy():
-            self.current_position = max(0, self.current_position - seconds)
-            pygame.mixer.music.set_pos(self.current_position)
-            self.last_update_time = time.time()
+        self.engine.rewind(seconds)
+        self.show_progress(self.engine.current_position)
     
-    def on_progress_click(self, event):
-        if self.current_track_length > 0:
+    def on_progress_click(self, fraction):
+        if self.engine.current_track_length > 0:
             # クリック位置から再生位置を計算
-            progress_bar_width = self.progress_bar.winfo_width()
-            click_x = event.x
-            percentage = click_x / progress_bar_width
-            new_position = self.current_track_length * percentage
+            new_position = self.engine.current_track_length * fraction
             
-            # 再生位置を変更
-            if pygame.mixer.music.get_busy():
-                pygame.mixer.music.set_pos(new_position)
-            else:
-                pygame.mixer.music.load(self.playlist[self.current_track])
-                pygame.mixer.music.play(start=new_position)
-                self.play_button.config(text="一時停止")
-            
-            # 現在の再生位置を更新
-            self.current_position = new_position
-            self.last_update_time = time.time()
+            # 再生位置を変更（停止・一時停止中はその位置から再生）
+            self.engine.play_from(new_position)
             
             # プログレスバーと時間表示を即座に更新
-            self.progress_var.set(percentage * 100)
-            self.current_time_label.config(text=self.format_time(new_position))
+            self.show_progress(new_position)
     
     def format_time(self, seconds):
         minutes = int(seconds // 60)
         seconds = int(seconds % 60)
         return f"{minutes:02d}:{seconds:02d}"
     
+    def on_engine_change(self):
+        """再生エンジンの状態が変わった時に表示を更新する"""
+        engine = self.engine
+        if engine.is_paused:
+            if self.play_icon:
+                self.play_button.configure(image=self.play_icon)
+            else:
+                self.play_button.configure(text="再生")
+        else:
+            if self.pause_icon:
+                self.play_button.configure(image=self.pause_icon)
+            else:
+                self.play_button.configure(text="一時停止")
+            self.scheduler.wake()  # 定期処理を再開する
+        if engine.current_title is not None:
+            self.current_track_label.config(text=f"再生中の曲: {engine.current_title} - {engine.current_artist}")
+        else:
+            self.current_track_label.config(text="再生中の曲: ")
+        self.update_playing_mark()
+        self.update_waveform()
+        self.update_loop_button()
+        self.show_progress(engine.current_position)
+    
+    def update_waveform(self):
+        """再生中の曲が変わったら波形を表示する（未計算の場合は計算が終わってから表示する）"""
+        file_path = self.engine.current_file
+        if file_path == self.waveform_file:
+            return
+        self.waveform_file = file_path
+        peaks = self.peak_loader.request(file_path) if file_path is not None else None
+        self.waveform.set_peaks(peaks)
+        if self.peak_loader.is_busy() and self.waveform_after_id is None:
+            self.waveform_after_id = self.root.after(200, self.check_waveform)
+
+    def check_waveform(self):
+        """計算が終わったピークを、その曲を再生中なら表示する"""
+        self.waveform_after_id = None
+        for file_path, peaks in self.peak_loader.poll():
+            if file_path == self.waveform_file and peaks is not None:
+                self.waveform.set_peaks(peaks)
+        if self.peak_loader.is_busy():
+            self.waveform_after_id = self.root.after(200, self.check_waveform)
+    
     def update_progress(self):
-        if not self.is_paused:  # 一時停止中は更新しない
-            current_time = time.time()
-            elapsed = current_time - self.last_update_time
-            self.current_position += elapsed
-            self.last_update_time = current_time
-            
-            # プログレスバーの更新
-            if self.current_track_length > 0:
-                # 曲の長さを超えないように制限
-                if self.current_position > self.current_track_length:
-                    self.current_position = self.current_track_length
-                
-                progress = (self.current_position / self.current_track_length) * 100
-                self.progress_var.set(progress)
-                
-                # 経過時間の表示を更新
-                self.current_time_label.config(text=self.format_time(self.current_position))
-            
-            # 曲が終了した場合
-            if self.current_position >= self.current_track_length and self.playlist:  # 再生中の場合のみ次の曲へ
-                print(f"曲の再生が終了しました (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
-                if self.repeat_track:
-                    print("リピートモード: 同じ曲を先頭から再生します")
-                    self.current_position = 0
-                    pygame.mixer.music.load(self.playlist[self.current_track])
-                    pygame.mixer.music.play()
-                else:
-                    print("次の曲に進みます")
-                    self.next_track()  # 次の曲を再生
-        
-        self.root.after(100, self.update_progress)
+        """再生位置の表示を更新する"""
+        engine = self.engine
+        if not engine.is_paused:
+            # ミキサーの実際の再生位置を使う（経過時間の積算はずれるため）
+            engine.current_position = engine.get_playback_position()
+        self.show_progress(engine.current_position)
+    
+    def show_progress(self, position):
+        """プログレスバーと経過時間を表示する（表示が変わる時だけ書き換える）"""
+        length = self.engine.current_track_length
+        fraction = min(1.0, position / length) if length > 0 else 0
+        self.waveform.set_fraction(fraction)
+        second = int(position)
+        if second != self.shown_second:
+            self.shown_second = second
+            self.current_time_label.config(text=self.format_time(position))
+    
+    def progress_interval(self):
+        """次に表示（秒またはピクセル）が変わるまでの時間（ミリ秒）"""
+        position = self.engine.current_position
+        until_next = 1 - (position % 1)  # 次の秒まで
+        length = self.engine.current_track_length
+        width = self.waveform.width()
+        if length > 0 and width > 1:
+            seconds_per_pixel = length / width
+            until_next = min(until_next, seconds_per_pixel - (position % seconds_per_pixel))
+        return min(1000, max(30, int(until_next * 1000) + 5))
         
     def on_device_change(self, event):
         selected_index = self.device_combo.current()
         if selected_index >= 0:
-            # 現在の再生状態を保存
-            was_playing = pygame.mixer.music.get_busy()
-            current_pos = self.current_position if was_playing else 0
-            
-            # 新しいデバイスを設定
-            self.current_device_index = self.audio_devices[selected_index][0]
-            
-            # pygameを再初期化
-            pygame.mixer.quit()
-            pygame.mixer.init(devicename=self.audio_devices[selected_index][1])
+            # 新しいデバイスを設定（再生中・一時停止中の曲は同じ位置から続ける）
+            device_name = self.audio_devices[selected_index] if selected_index > 0 else ''
+            if not self.engine.set_device(device_name):
+                self.set_audio_device()  # 切り替えられなかった場合は元のデバイスを表示する
             
             # デバイス情報を更新
             self.update_audio_device_info()
-            
-            # 再生中だった場合は、新しいデバイスで再生を再開
-            if was_playing and self.playlist:
-                pygame.mixer.music.load(self.playlist[self.current_track])
-                pygame.mixer.music.play(start=current_pos)
-                self.play_button.config(text="一時停止")
-                self.current_position = current_pos
-                self.last_update_time = time.time()
     
     def update_audio_device_info(self):
         try:
-            device_info = self.p.get_device_info_by_index(self.current_device_index)
-            device_name = device_info.get('name', '不明')
-            device_type = "USB" if "USB" in device_name.upper() else "内蔵"
-            channels = device_info.get('maxOutputChannels', 2)
-            sample_rate = device_info.get('defaultSampleRate', 44100)
+            # デバイスの対応状況（まだ調べていない場合は表示しない）
+            device_info = self.device_probe.info(self.engine.device_name) if self.device_probe else None
+            lines = []
+            if device_info is not None:
+                rates = "/".join(str(rate) for rate in device_info['rates']) or str(device_info['default_rate'])
+                lines.append(f"チャンネル: {device_info['channels']}, サンプルレート: {rates}Hz, "
+                             f"形式: {', '.join(device_info['formats']) or '不明'} ({device_info['host_api']})")
             
             # pygameの情報も取得
-            pygame_info = pygame.mixer.get_init()
+            pygame_info = self.engine.mixer_info()
             if pygame_info:
                 pygame_freq, pygame_format, pygame_channels = pygame_info
-                device_text = (
-                    f"チャンネル: {channels}, サンプルレート: {sample_rate}Hz\n"
-                    f"Pygame設定: {pygame_freq}Hz, フォーマット: {pygame_format}, チャンネル: {pygame_channels}"
-                )
-            else:
-                device_text = f"チャンネル: {channels}, サンプルレート: {sample_rate}Hz"
+                lines.append(f"Pygame設定: {pygame_freq}Hz, フォーマット: {pygame_format}, チャンネル: {pygame_channels}")
+            device_text = "\n".join(lines)
             
         except Exception as e:
             device_text = f"オーディオデバイス情報の取得に失敗しました: {str(e)}"
@@ -468,266 +641,344 @@ class MusicPlayer:
         self.device_info_label.config(text=device_text)
         
     def drop_files(self, event):
-        print(f"ドラッグアンドドロップ開始 (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
-        # Windowsのパス形式に対応
-        files = event.data.split('} {')
-        for file in files:
-            # 中括弧を削除
-            file = file.strip('{}')
-            if file.lower().endswith('.mp3'):
-                print(f"MP3ファイルを検出: {file}")
-                # ダブルクリックイベントを一時的に無効化
-                print("ダブルクリックイベントを無効化")
-                self.tree.unbind("<Double-1>")
-                print("プレイリストに追加開始")
-                self.add_to_playlist(file)  # 自動再生は行わない
-                print("プレイリストに追加完了")
-                # 選択状態を解除
-                print("選択状態を解除")
-                self.tree.selection_clear()
-                # 100ms後にダブルクリックイベントを再バインド
-                print("ダブルクリックイベントを再バインド予約")
-                self.root.after(100, lambda: self.tree.bind("<Double-1>", self.on_enter_key))
-        print(f"ドラッグアンドドロップ終了 (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
+        logger.debug("ドラッグアンドドロップ開始 (再生状態: %s)", self.state_log)
+        # Tclのリスト形式（空白を含むパスは中括弧で囲まれる）を分解
+        items = list(self.root.tk.splitlist(event.data))
+        
+        if items:
+            # ダブルクリックイベントを一時的に無効化
+            self.tree.unbind("<Double-1>")
+            # 選択状態を解除
+            self.view.clear_selection()
+            # 100ms後にダブルクリックイベントを再バインド
+            self.root.after(100, lambda: self.tree.bind("<Double-1>", self.on_enter_key))
+            # フォルダはバックグラウンドで走査し、見つかったファイルから順にプレイリストへ追加する（自動再生は行わない）
+            sort_order = self.config.get('Library', 'sort_order', fallback='name')
+            if sort_order not in SORT_ORDERS:
+                sort_order = 'name'
+            if self.skip_duplicates_var.get():
+                # プレイリストにある曲や、ドロップしたファイル同士で音声が同じものは追加しない
+                existing = list(self.playlist.paths)
+                finder = self.engine.duplicates
+                scan = BackgroundScan(lambda cancel_event: finder.iter_unique(
+                    iter_audio_files(items, sort_order, cancel_event), existing, cancel_event))
+            else:
+                scan = BackgroundScan(lambda cancel_event: iter_audio_files(items, sort_order, cancel_event))
+            self.loader.add(scan, on_done=lambda: logger.info("ドロップされたファイルの追加が完了しました"))
+            self.show_loading()
+        logger.debug("ドラッグアンドドロップ終了 (再生状態: %s)", self.state_log)
 
-    def add_to_playlist(self, file_path):
-        print(f"プレイリストに追加開始: {file_path} (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
+    def on_track_loaded(self, file_path, metadata):
+        """ローダーから読み込み順に呼ばれ、プレイリストに追加する"""
+        if metadata is None:
+            # ファイルが存在しない場合は追加せず、キャッシュと保存済みのプレイリストからも削除
+            self.engine.drop_missing(file_path)
+            return
+        self.append_track(file_path, metadata)
+        self.loaded_count += 1
+        if self.loaded_count % 100 == 0:
+            self.loading_label.config(text=f"読み込み中: {self.loaded_count} 件")
+
+    def show_loading(self):
+        """読み込み中の表示とキャンセルボタンを出す"""
+        self.loading_label.config(text=f"読み込み中: {self.loaded_count} 件")
+        self.loading_frame.pack(side=tk.RIGHT)
+
+    def on_loader_idle(self):
+        """読み込みが完了またはキャンセルされた時の処理"""
+        if self.loaded_count:
+            logger.info(f"プレイリストに追加しました: {self.loaded_count} 件")
+        self.loaded_count = 0
+        self.loading_frame.pack_forget()
+        if self.engine.restoring:
+            # 復元がキャンセルされた場合、読み込まれなかった曲は削除せずに次回の起動時に読み込み直す
+            # （キャンセルすると on_restore_finished は呼ばれないので、キャッシュの書き込みもここで行う）
+            self.engine.end_restore(discard=False)
+            self.engine.maintain_cache()
+        if self.closing:
+            return  # 終了時の loader.shutdown() から呼ばれた
+        self.schedule_save()
+        # 追加した曲の音量をバックグラウンドで解析する
+        self.engine.scan_loudness()
+
+    def cancel_loading(self):
+        """フォルダの走査とメタデータの読み込みを中止する"""
+        if self.loader.is_busy():
+            logger.info("ファイルの読み込みをキャンセルしました")
+            self.loader.cancel()
+
+    @metrics.timed('tree_insert')
+    def append_track(self, file_path, metadata):
+        """読み込み済みのメタデータで曲をプレイリストの末尾に追加する"""
+        self.engine.append_track(file_path, metadata)
+        # 連続して追加される場合もまとめて1回だけ再描画・保存する
+        if self.filter_rows is not None:
+            self.schedule_filter()
+        self.view.schedule_refresh()
+        self.schedule_save()
+
+    def row_count(self):
+        """表示する行数（絞り込み中は該当する曲の数）"""
+        return len(self.filter_rows) if self.filter_rows is not None else len(self.playlist)
+
+    def track_index(self, row):
+        """表示上の行からプレイリストの曲番号を求める"""
+        return self.filter_rows[row] if self.filter_rows is not None else row
+
+    def row_of_track(self, index):
+        """プレイリストの曲番号から表示上の行を求める（表示されていない場合はNone）"""
+        if index is None or self.filter_rows is None:
+            return index
+        row = bisect.bisect_left(self.filter_rows, index)
+        if row < len(self.filter_rows) and self.filter_rows[row] == index:
+            return row
+        return None
+
+    def apply_filter(self):
+        """検索ボックスの内容でプレイリストの表示を絞り込む"""
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+            self.filter_after_id = None
+        selected = self.selected_track_ids()
+        query = self.filter_var.get()
+        self.filter_rows = self.playlist.find(query)
+        if query != self.filter_query:
+            self.filter_query = query
+            self.view.top = 0
+        # 選択中の曲が絞り込み後も表示されていれば選択を残す
+        self.restore_selection(selected)
+        self.update_playing_mark()
+
+    def selected_track_ids(self):
+        """選択中の曲のIDと基準の曲のID（並び順や絞り込みが変わった後に選択を戻すため）"""
+        rows = self.view.selection()
+        current = self.view.current()
+        return ([self.playlist.id_at(self.track_index(row)) for row in rows],
+                self.playlist.id_at(self.track_index(current)) if current is not None else None)
+
+    def restore_selection(self, selected):
+        """selected_track_ids で記録した曲のうち、表示されているものを選択し直す"""
+        track_ids, current_id = selected
+        rows = [self.row_of_track(self.playlist.index_of(track_id)) for track_id in track_ids]
+        cursor = self.row_of_track(self.playlist.index_of(current_id)) if current_id is not None else None
+        self.view.set_selection([row for row in rows if row is not None], cursor)
+
+    def clear_filter_rows(self):
+        """プレイリストを空にする前に絞り込み結果も空にする（古い曲番号で再描画しないように）"""
+        if self.filter_rows is not None:
+            self.filter_rows = []
+
+    def schedule_filter(self):
+        """曲の追加が続く間はまとめて1回だけ絞り込み直す"""
+        if self.filter_after_id is None:
+            self.filter_after_id = self.root.after(self.FILTER_DELAY, self.apply_filter)
+
+    def on_filter_enter(self, event):
+        """検索ボックスからプレイリストに移動する"""
+        self.tree.focus_set()
+        if self.row_count() and not self.view.selection():
+            self.view.select(0)
+        return "break"
+
+    def on_filter_escape(self, event):
+        """検索語を消す（空の場合はプレイリストに移動する）"""
+        if self.filter_var.get():
+            self.filter_var.set("")
+        else:
+            self.tree.focus_set()
+        return "break"
+
+    def sort_by(self, column):
+        """見出しのクリックでプレイリストを並べ替える（同じ列をもう一度クリックすると逆順）"""
+        sort_column = self.SORT_COLUMN_OF[column]
+        if self.sort_keys and self.sort_keys[0][0] == sort_column:
+            sort_keys = [(sort_column, not self.sort_keys[0][1])] + self.sort_keys[1:]
+        else:
+            # 前にクリックした列を2番目以降のキーにする
+            sort_keys = [(sort_column, False)] + [key for key in self.sort_keys if key[0] != sort_column]
+            sort_keys = sort_keys[:self.MAX_SORT_KEYS]
+        selected = self.selected_track_ids()
         try:
-            # MP3ファイルのメタデータを取得
-            audio = MP3(file_path)
-            title = audio.get('TIT2', [os.path.basename(file_path)])[0]
-            artist = audio.get('TPE1', ['Unknown Artist'])[0]
-            track_number = audio.get('TRCK', ['0'])[0]
-            duration = self.format_time(audio.info.length)
-        except:
-            title = os.path.basename(file_path)
-            artist = "Unknown Artist"
-            track_number = "0"
-            duration = "00:00"
-        
-        print(f"メタデータ取得完了: {title} - {artist}")
-        self.playlist.append(file_path)
-        print("プレイリストにファイルパスを追加")
-        self.tree.insert("", "end", values=("", track_number, title, artist, duration))  # 再生中マーク用の列を追加
-        print("Treeviewにアイテムを追加")
+            self.engine.sort_playlist(sort_keys)
+        except ValueError as e:
+            logger.warning("%s", e)
+            return
+        self.sort_keys = sort_keys
+        self.schedule_save()
+        # 見出しに並べ替えの向きを表示
+        for heading, text in self.heading_texts.items():
+            if self.SORT_COLUMN_OF[heading] == sort_column:
+                text += " ▼" if sort_keys[0][1] else " ▲"
+            self.tree.heading(heading, text=text)
+        # 絞り込み結果と選択中の曲を新しい並び順に合わせる
+        if self.filter_rows is not None:
+            self.filter_rows = self.playlist.find(self.filter_query)
+        self.restore_selection(selected)
+        self.update_playing_mark()
+
+    def get_row_values(self, row):
+        """プレイリスト表示用の行の値（再生中マーク以外）"""
+        track_number, title, artist, length = self.playlist.row(self.track_index(row))
+        return (track_number, title, artist, self.format_time(length))
+
+    def add_to_playlist(self, file_path):
+        logger.debug("プレイリストに追加開始: %s (再生状態: %s)", file_path, self.state_log)
+        metadata = self.engine.get_metadata(file_path)
+        title = metadata['title']
+        artist = metadata['artist']
+        
+        logger.debug("メタデータ取得完了: %s - %s", title, artist)
+        self.append_track(file_path, metadata)
+        logger.debug("プレイリストとTreeviewにアイテムを追加")
         # 再生中マークの更新は行わない（再生していないため）
-        print(f"プレイリストに追加完了: {title} - {artist} (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
+        logger.debug("プレイリストに追加完了: %s - %s (再生状態: %s)", title, artist, self.state_log)
         
         # 現在の再生状態を保持
-        was_playing = pygame.mixer.music.get_busy()
-        if was_playing:
-            pygame.mixer.music.pause()
-            self.play_button.config(text="再生")
-            self.is_paused = True
+        if not self.engine.is_paused:
+            self.engine.pause()
     
     def play_selected(self, event):
-        print(f"ダブルクリックによる再生開始 (再生状態: {'一時停止中' if self.is_paused else '再生中' if pygame.mixer.music.get_busy() else '停止中'})")
-        selection = self.tree.selection()
-        if selection:
-            self.current_track = self.tree.index(selection[0])
-            print(f"選択された曲のインデックス: {self.current_track}")
-            self.play_track()
+        logger.debug("ダブルクリックによる再生開始 (再生状態: %s)", self.state_log)
+        current = self.view.current()
+        if current is not None:
+            logger.debug("選択された曲のインデックス: %d", self.track_index(current))
+            self.engine.play_track(self.track_index(current))
     
     def play_track(self):
         """選択された曲を再生"""
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        try:
-            # 再生を開始
-            pygame.mixer.music.load(self.playlist[self.current_track])
-            pygame.mixer.music.play()
-            self.is_paused = False
-            # アイコンを一時停止用に変更
-            if self.pause_icon:
-                self.play_button.configure(image=self.pause_icon)
-            else:
-                self.play_button.configure(text="一時停止")
-            
-            # 曲の長さを取得
-            audio = MP3(self.playlist[self.current_track])
-            self.current_track_length = audio.info.length
-            
-            # 曲名を表示
-            try:
-                tags = ID3(self.playlist[self.current_track])
-                title = str(tags.get('TIT2', [''])[0])
-                artist = str(tags.get('TPE1', [''])[0])
-                if not title:
-                    title = os.path.basename(self.playlist[self.current_track])
-                if not artist:
-                    artist = "Unknown Artist"
-            except:
-                title = os.path.basename(self.playlist[self.current_track])
-                artist = "Unknown Artist"
-            
-            self.current_track_label.config(text=f"再生中の曲: {title} - {artist}")
-            
-            # 再生中マークを更新
-            self.update_playing_mark()
-            
-        except Exception as e:
-            print(f"曲の再生中にエラーが発生しました: {e}")
-            # エラーが発生した場合は、アイコンを再生用に変更
-            self.is_paused = True
-            if self.play_icon:
-                self.play_button.configure(image=self.play_icon)
-            else:
-                self.play_button.configure(text="再生")
+        self.engine.play_track()
     
     def toggle_play(self):
         """再生/一時停止を切り替える"""
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        if self.is_paused:
-            pygame.mixer.music.unpause()
-            self.is_paused = False
-            # アイコンを一時停止用に変更
-            if self.pause_icon:
-                self.play_button.configure(image=self.pause_icon)
-            else:
-                self.play_button.configure(text="一時停止")
-        else:
-            pygame.mixer.music.pause()
-            self.is_paused = True
-            # アイコンを再生用に変更
-            if self.play_icon:
-                self.play_button.configure(image=self.play_icon)
-            else:
-                self.play_button.configure(text="再生")
+        self.engine.toggle_play()
     
     def next_track(self):
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        if self.current_track < len(self.playlist) - 1:
-            self.current_track += 1
-            self.current_position = 0
-            self.last_update_time = time.time()
-            self.progress_var.set(0)
-            self.play_track()
+        self.engine.next_track()
     
     def prev_track(self):
-        if not self.playlist:  # プレイリストが空の場合は何もしない
-            return
-        
-        if self.current_track > 0:
-            self.current_track -= 1
-            self.current_position = 0
-            self.last_update_time = time.time()
-            self.progress_var.set(0)
-            self.play_track()
+        self.engine.prev_track()
     
     def on_enter_key(self, event):
         """Enterキーで選択された曲を先頭から再生する"""
         if not self.playlist:  # プレイリストが空の場合は何もしない
             return
         
-        selection = self.tree.selection()
-        if not selection:  # 選択されていない場合は何もしない
+        current = self.view.current()
+        if current is None:  # 選択されていない場合は何もしない
             return
         
         try:
-            # 選択された曲を再生
-            selected_index = self.tree.index(selection[0])
-            self.current_track = selected_index
-            self.current_position = 0  # 再生位置をリセット
-            self.last_update_time = time.time()  # 更新時間をリセット
-            self.progress_var.set(0)  # プログレスバーをリセット
-            self.current_time_label.config(text="00:00")  # 時間表示をリセット
-            self.play_track()
+            # 選択された曲（複数選択中は最後にクリックした曲）を先頭から再生
+            self.engine.play_track(self.track_index(current))
             
         except Exception as e:
-            print(f"Enterキーの処理中にエラーが発生しました: {e}")
+            logger.error(f"Enterキーの処理中にエラーが発生しました: {e}")
     
     def on_delete_key(self, event):
-        """Deleteキーで選択された曲を削除"""
+        """Deleteキーで選択された曲をまとめて削除"""
         if not self.playlist:  # プレイリストが空の場合は何もしない
             return
         
-        selection = self.tree.selection()
+        selection = self.view.selection()
         if not selection:  # 選択されていない場合は何もしない
             return
         
         try:
-            # 選択されたアイテムのインデックスを取得
-            selected_item = selection[0]
-            selected_index = self.tree.index(selected_item)
-            
-            # 選択された曲が現在再生中の曲の場合
-            if selected_index == self.current_track:
-                # 再生を停止
-                pygame.mixer.music.stop()
-                self.play_button.config(text="再生")
-                self.is_paused = True
-            
-            # 曲をプレイリストから削除
-            del self.playlist[selected_index]
-            self.tree.delete(selected_item)  # 選択されたアイテムを削除
-            
-            # 現在の再生位置を更新
-            if self.current_track >= len(self.playlist):
-                self.current_track = max(0, len(self.playlist) - 1)
-            
-            # プレイリストが空になった場合
-            if not self.playlist:
-                self.current_track = 0
-                self.current_track_length = 0
-                self.current_position = 0
-                self.progress_var.set(0)
-                self.current_time_label.config(text="00:00")
-                self.total_time_label.config(text="00:00")
-                self.current_track_label.config(text="再生中の曲: ")
-            else:
-                # 削除された曲の次の曲を選択（最後の曲の場合は新たな最後の曲を選択）
-                next_index = min(selected_index, len(self.playlist) - 1)
-                if next_index >= 0:  # インデックスが有効な場合のみ
-                    next_item = self.tree.get_children()[next_index]
-                    self.tree.selection_set(next_item)
-                    self.tree.focus(next_item)
-                    self.tree.see(next_item)
-            
-            self.update_playing_mark()  # 再生中マークを更新
+            # 曲をプレイリストから削除（再生中の曲が含まれていれば停止する）。再描画は最後に1回だけ行う
+            with self.view.batch():
+                indexes = [self.track_index(row) for row in selection]  # 行の順 = 曲番号の順
+                if self.filter_rows is not None:
+                    # 削除した曲より後ろの曲番号を詰める（削除後の再描画より前に行う）
+                    removed = set(indexes)
+                    self.filter_rows = [i - bisect.bisect_left(indexes, i)
+                                        for i in self.filter_rows if i not in removed]
+                self.engine.delete_tracks(indexes)
+                self.schedule_save()
+                
+                # プレイリストが空になった場合
+                if not self.playlist:
+                    self.total_time_label.config(text="00:00")
+                    self.view.clear_selection()
+                elif not self.row_count():
+                    self.view.clear_selection()
+                else:
+                    # 削除された最初の曲の位置の曲を選択（最後の曲の場合は新たな最後の曲を選択）
+                    self.view.select(min(selection[0], self.row_count() - 1))
             
         except Exception as e:
-            print(f"曲の削除中にエラーが発生しました: {e}")
-            # エラーが発生した場合は、プレイリストを再構築
-            self.update_playlist_display()
+            logger.error(f"曲の削除中にエラーが発生しました: {e}")
+            # エラーが発生した場合は、表示中の行を再描画
+            self.view.refresh()
     
-    def on_up_key(self, event):
-        # 上矢印キーの処理
-        selection = self.tree.selection()
-        if selection:
-            current_index = self.tree.index(selection[0])
-            if current_index > 0:
-                prev_item = self.tree.get_children()[current_index - 1]
-                self.tree.selection_set(prev_item)
-                self.tree.focus(prev_item)
-                self.tree.see(prev_item)
+    def on_up_key(self, event, extend=False):
+        # 上矢印キーの処理（Shiftを押している場合は選択範囲を広げる）
+        current_index = self.view.current()
+        if current_index is not None and current_index > 0:
+            if extend:
+                self.view.select_range(current_index - 1)
+            else:
+                self.view.select(current_index - 1)
         return "break"  # イベントの伝播を停止
 
-    def on_down_key(self, event):
-        # 下矢印キーの処理
-        selection = self.tree.selection()
-        if selection:
-            current_index = self.tree.index(selection[0])
-            if current_index < len(self.playlist) - 1:
-                next_item = self.tree.get_children()[current_index + 1]
-                self.tree.selection_set(next_item)
-                self.tree.focus(next_item)
-                self.tree.see(next_item)
+    def on_down_key(self, event, extend=False):
+        # 下矢印キーの処理（Shiftを押している場合は選択範囲を広げる）
+        current_index = self.view.current()
+        if current_index is not None and current_index < self.row_count() - 1:
+            if extend:
+                self.view.select_range(current_index + 1)
+            else:
+                self.view.select(current_index + 1)
         return "break"  # イベントの伝播を停止
+
+    def move_selection_up(self):
+        """選択した曲を、選択範囲の1つ上の曲の前へまとめて移動する"""
+        selection = self.view.selection()
+        if selection and selection[0] > 0:
+            self.on_move_rows(selection, selection[0] - 1)
+        return "break"
+
+    def move_selection_down(self):
+        """選択した曲を、選択範囲の1つ下の曲の後ろへまとめて移動する"""
+        selection = self.view.selection()
+        if selection and selection[-1] < self.row_count() - 1:
+            self.on_move_rows(selection, selection[-1] + 2)
+        return "break"
+
+    def on_move_rows(self, rows, before_row):
+        """表示上の行 rows を before_row の行の前へ移動する（ドラッグ・Alt+↑↓）"""
+        if not rows:
+            return
+        indexes = [self.track_index(row) for row in rows]
+        # 末尾に移動する場合は表示されている最後の曲の次
+        before = (self.track_index(before_row) if before_row < self.row_count()
+                  else self.track_index(self.row_count() - 1) + 1)
+        current = self.view.current()
+        current_id = self.playlist.id_at(self.track_index(current)) if current is not None else None
+        with self.view.batch():
+            try:
+                moved = self.engine.move_tracks(indexes, before)
+            except ValueError as e:
+                logger.warning("%s", e)
+                return
+            if moved == indexes:
+                return  # 並び順が変わらない
+            # 手動で並べ替えたので見出しの並べ替えの表示を消す
+            self.sort_keys = []
+            for heading, text in self.heading_texts.items():
+                self.tree.heading(heading, text=text)
+            if self.filter_rows is not None:
+                self.filter_rows = self.playlist.find(self.filter_query)
+            cursor = self.row_of_track(self.playlist.index_of(current_id)) if current_id is not None else None
+            self.view.set_selection([self.row_of_track(index) for index in moved], cursor)
+            self.update_playing_mark()
+            self.schedule_save()
     
     def update_playing_mark(self):
-        # すべての行の再生中マークをクリア
-        for item in self.tree.get_children():
-            self.tree.set(item, "playing", "")
-        
-        # 現在再生中の曲にマークを表示
-        if self.playlist and pygame.mixer.music.get_busy():
-            current_item = self.tree.get_children()[self.current_track]
-            self.tree.set(current_item, "playing", ">")
+        # 現在再生中の曲にマークを表示（表示中の行だけが書き換えられる）
+        if self.engine.is_playing():
+            self.view.set_playing(self.row_of_track(self.engine.current_track))
+        else:
+            self.view.set_playing(None)
     
     def on_space_key(self, event):
         self.toggle_play()
@@ -749,77 +1000,261 @@ class MusicPlayer:
         self.forward(10)  # 10秒進め
         return "break"  # イベントの伝播を停止
     
-    def __del__(self):
-        # PyAudioの終了処理
-        if hasattr(self, 'p'):
-            self.p.terminate()
-
     def load_settings(self):
         """設定ファイルを読み込む"""
         if os.path.exists(self.config_file):
             self.config.read(self.config_file, encoding='utf-8')
-        else:
-            # デフォルト設定
+        # デフォルト設定（daemon.py が作成した設定ファイルには画面の設定が無いので、セクションごとに補う）
+        if 'Audio' not in self.config:
             self.config['Audio'] = {'device_name': ''}  # 空文字列はデフォルトデバイスを意味する
+        if 'Window' not in self.config:
             self.config['Window'] = {'width': '800', 'height': '600'}
+        if 'Columns' not in self.config:
             self.config['Columns'] = {
                 'track_width': '30',
                 'title_width': '400',
                 'artist_width': '200',
                 'duration_width': '70'
             }
-            self.config['Playlist'] = {}  # プレイリスト用のセクションを追加
+        
+        # 後から追加された設定項目のデフォルト値
+        if 'Library' not in self.config:
+            # フォルダをドロップした時のファイルの並び順（name, name_desc, mtime, mtime_desc, none）と
+            # 音声が同じ曲をドロップ時に除外するかどうか
+            self.config['Library'] = {'sort_order': 'name', 'skip_duplicates': 'false'}
+        if 'Playback' not in self.config:
+            # ギャップレス再生と、曲の切り替え時のフェード時間（ミリ秒、0で無効）
+            self.config['Playback'] = {'gapless': 'true', 'crossfade_ms': '0'}
+        if 'Startup' not in self.config:
+            # 起動時間の目標（ミリ秒）。超えた場合はログに警告を出す（0で無効）
+            self.config['Startup'] = {'budget_ms': '1500'}
+        if 'ReplayGain' not in self.config:
+            # 音量の自動調整（off, track, album）と、調整量に加える値（dB）
+            self.config['ReplayGain'] = {'mode': 'off', 'preamp_db': '0'}
+        if 'Logging' not in self.config:
+            # ログのレベル（DEBUG, INFO, WARNING, ERROR）と、ログを書き込むファイル（空欄なら書き込まない）
+            self.config['Logging'] = {'level': 'INFO', 'file': ''}
+        if 'Instrumentation' not in self.config:
+            # 処理時間の計測（タグの読み込み・プレイリストへの追加・曲の読み込み・シーク・イベントループの遅れ）と書き出し先
+            self.config['Instrumentation'] = {'enabled': 'false', 'output': 'instrumentation.json'}
 
     def restore_playlist(self):
         """プレイリストを復元する"""
-        if 'Playlist' in self.config:
-            for key in self.config['Playlist']:
-                file_path = self.config['Playlist'][key]
-                if os.path.exists(file_path):  # ファイルが存在する場合のみ追加
-                    self.add_to_playlist(file_path)
+        # 以前のバージョンで settings.ini に保存したプレイリストは playlist.db に移す
+        if self.engine.migrate_playlist(self.config):
+            self.save_settings()
+        self.load_active_playlist()
+
+    def load_active_playlist(self):
+        """選択中のプレイリストの曲を読み込む"""
+        # ファイルの存在確認とメタデータの読み込みはバックグラウンドで行う
+        paths = self.engine.begin_restore()
+        self.loader.add(paths, on_done=self.on_restore_finished)
+        if paths:
+            self.show_loading()
+
+    def on_restore_finished(self):
+        """プレイリストの復元完了時の処理"""
+        self.engine.end_restore()
+        # キャッシュを書き込み、長期間使われていないエントリを削除
+        self.engine.maintain_cache()
+
+    def refresh_playlist_tabs(self):
+        """プレイリストの一覧からタブを作り直す"""
+        self.tab_ids = []  # 作り直している間のタブ切り替えイベントは無視する
+        for tab in self.playlist_tabs.tabs():
+            self.playlist_tabs.forget(tab)
+            self.root.nametowidget(tab).destroy()
+        for playlist_id, name in self.engine.store.list_playlists():
+            self.playlist_tabs.add(ttk.Frame(self.playlist_tabs, height=1), text=name)
+            self.tab_ids.append(playlist_id)
+        self.playlist_tabs.select(self.tab_ids.index(self.engine.store.active_id))
+
+    def on_playlist_tab_changed(self, event):
+        if not self.tab_ids:
+            return
+        index = self.playlist_tabs.index("current")
+        if index < len(self.tab_ids) and self.tab_ids[index] != self.engine.store.active_id:
+            self.open_playlist(self.tab_ids[index])
+
+    def open_playlist(self, playlist_id):
+        """プレイリストを切り替える（前のプレイリストはメモリから解放する）"""
+        logger.info(f"プレイリストを切り替えます: {self.engine.store.name_of(playlist_id)}")
+        # 読み込み途中の曲は次に開いた時にまた読み込む
+        self.engine.end_restore(discard=False)
+        self.loader.cancel()
+        self.clear_filter_rows()
+        self.engine.switch_playlist(playlist_id)
+        self.total_time_label.config(text="00:00")
+        self.view.top = 0
+        self.view.clear_selection()
+        self.apply_filter()
+        self.load_active_playlist()
+
+    def new_playlist(self):
+        count = len(self.tab_ids)
+        name = simpledialog.askstring("新しいプレイリスト", "プレイリストの名前:",
+                                      initialvalue=f"プレイリスト{count + 1}", parent=self.root)
+        if name:
+            playlist_id = self.engine.store.create_playlist(name)
+            self.open_playlist(playlist_id)
+            self.refresh_playlist_tabs()
+        return name
+
+    def rename_playlist(self):
+        store = self.engine.store
+        name = simpledialog.askstring("名前の変更", "プレイリストの名前:",
+                                      initialvalue=store.name_of(store.active_id), parent=self.root)
+        if name:
+            store.rename_playlist(store.active_id, name)
+            self.refresh_playlist_tabs()
+
+    def delete_playlist(self):
+        store = self.engine.store
+        if len(self.tab_ids) <= 1:
+            messagebox.showinfo("プレイリストの削除", "最後のプレイリストは削除できません。", parent=self.root)
+            return
+        name = store.name_of(store.active_id)
+        if not messagebox.askyesno("プレイリストの削除", f"プレイリスト「{name}」を削除しますか？", parent=self.root):
+            return
+        # 隣のプレイリストに切り替えてから削除する
+        deleted_id = store.active_id
+        index = self.tab_ids.index(deleted_id)
+        self.open_playlist(self.tab_ids[index + 1] if index + 1 < len(self.tab_ids) else self.tab_ids[index - 1])
+        store.delete_playlist(deleted_id)
+        self.refresh_playlist_tabs()
+
+    def import_m3u(self):
+        """M3U/M3U8ファイルを新しいプレイリストとして読み込む"""
+        m3u_path = filedialog.askopenfilename(
+            parent=self.root, title="プレイリストの読み込み",
+            filetypes=[("M3U/M3U8", "*.m3u *.m3u8"), ("すべてのファイル", "*.*")])
+        if not m3u_path:
+            return
+        name = os.path.splitext(os.path.basename(m3u_path))[0]
+        playlist_id = self.engine.store.create_playlist(name)
+        self.open_playlist(playlist_id)
+        self.refresh_playlist_tabs()
+        # 大きなファイルも1行ずつ読み、見つかった曲から順に追加する
+        scan = BackgroundScan(lambda cancel_event: iter_m3u(m3u_path, cancel_event))
+        self.loader.add(scan, on_done=lambda: logger.info(f"プレイリストを読み込みました: {m3u_path}"))
+        self.show_loading()
+
+    def export_m3u(self):
+        """選択中のプレイリストをM3U8ファイルに書き出す"""
+        store = self.engine.store
+        m3u_path = filedialog.asksaveasfilename(
+            parent=self.root, title="プレイリストの書き出し", defaultextension=".m3u8",
+            initialfile=f"{store.name_of(store.active_id)}.m3u8",
+            filetypes=[("M3U8", "*.m3u8"), ("M3U", "*.m3u")])
+        if not m3u_path:
+            return
+        try:
+            count = self.engine.export_m3u(m3u_path)
+            logger.info(f"プレイリストを書き出しました: {m3u_path} ({count} 曲)")
+        except OSError as e:
+            messagebox.showerror("プレイリストの書き出し", f"書き出しに失敗しました: {e}", parent=self.root)
+
+    def on_skip_duplicates_change(self):
+        self.config['Library']['skip_duplicates'] = 'true' if self.skip_duplicates_var.get() else 'false'
+        self.save_settings()
+
+    def on_replaygain_change(self):
+        mode = self.replaygain_var.get()
+        self.engine.set_replaygain_mode(mode)
+        self.config['ReplayGain']['mode'] = mode
+        self.save_settings()
+
+    def find_duplicates(self):
+        """音声が同じ曲をバックグラウンドで探す（タグだけが違うファイルも重複とみなす）"""
+        if self.duplicate_scan is not None:
+            return
+        paths = list(self.playlist.paths)
+        track_ids = list(self.playlist.ids)
+        cancel_event = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                result['groups'] = self.engine.duplicates.find_groups(paths, cancel_event)
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=run, name="duplicates", daemon=True)
+        self.duplicate_scan = (thread, cancel_event, result, paths, track_ids)
+        logger.info(f"重複した曲の検索を開始します: {len(paths)} 件")
+        thread.start()
+        self.duplicate_frame.pack(side=tk.RIGHT)
+        self.root.after(200, self.check_duplicate_scan)
+
+    def cancel_duplicate_scan(self):
+        if self.duplicate_scan is not None:
+            self.duplicate_scan[1].set()
+
+    def check_duplicate_scan(self):
+        """重複の検索が終わっていれば結果を表示する"""
+        thread, cancel_event, result, paths, track_ids = self.duplicate_scan
+        if thread.is_alive():
+            self.root.after(200, self.check_duplicate_scan)
+            return
+        self.duplicate_scan = None
+        self.duplicate_frame.pack_forget()
+        if 'error' in result:
+            logger.error(f"重複した曲の検索中にエラーが発生しました: {result['error']}")
+            messagebox.showerror("重複した曲", f"検索中にエラーが発生しました: {result['error']}", parent=self.root)
+            return
+        groups = result.get('groups')
+        if groups is None:
+            logger.info("重複した曲の検索をキャンセルしました")
+            return
+        if not groups:
+            messagebox.showinfo("重複した曲", "重複した曲は見つかりませんでした。", parent=self.root)
+            return
+        duplicates = sum(len(group) - 1 for group in groups)
+        lines = []
+        for group in groups:
+            names = " / ".join(os.path.basename(paths[i]) for i in group)
+            logger.info(f"重複: {names}")
+            if len(lines) < 10:
+                lines.append(f"・{names}")
+        if len(groups) > len(lines):
+            lines.append(f"ほか {len(groups) - len(lines)} 組")
+        message = (f"{len(groups)} 組の重複（{duplicates} 曲）が見つかりました。\n\n" + "\n".join(lines)
+                   + "\n\n各組の最初の1曲を残して、残りをプレイリストから削除しますか？")
+        if not messagebox.askyesno("重複した曲", message, parent=self.root):
+            return
+        # 検索中にプレイリストが変わっていてもIDで削除する
+        self.clear_filter_rows()
+        self.engine.remove_tracks([track_ids[i] for group in groups for i in group[1:]])
+        self.view.clear_selection()
+        self.apply_filter()
+        self.schedule_save()
+        logger.info(f"重複した曲を削除しました: {duplicates} 件")
+
+    def schedule_save(self):
+        """プレイリストの変更を少し待ってからまとめて保存する（連続した変更は1回で書き込む）"""
+        if self.save_after_id is None:
+            self.save_after_id = self.root.after(self.SAVE_DELAY, self.save_playlist)
+
+    def save_playlist(self):
+        self.save_after_id = None
+        self.engine.save_playlist()
 
     def save_settings(self):
-        """設定をファイルに保存する"""
-        # プレイリストの保存
-        self.config['Playlist'] = {}  # プレイリストセクションをクリア
-        for i, file_path in enumerate(self.playlist):
-            self.config['Playlist'][f'item_{i}'] = file_path
-        
+        """設定をファイルに保存する（プレイリストは playlist.db に保存する）"""
         with open(self.config_file, 'w', encoding='utf-8') as f:
             self.config.write(f)
 
     def set_audio_device(self):
-        """保存された再生デバイスを設定する"""
-        try:
-            saved_device_name = self.config['Audio']['device_name']
-            if saved_device_name:  # デバイス名が指定されている場合
-                devices = self.get_audio_devices()
-                # デバイス名に一致するデバイスを探す
-                for device_id, device_name in devices:
-                    if device_name == saved_device_name:
-                        pygame.mixer.quit()
-                        pygame.mixer.init(devicename=device_name)
-                        self.current_device_index = device_id
-                        self.device_var.set(device_name)
-                        print(f"再生デバイスを設定しました: {device_name}")
-                        return
-                print("保存されたデバイスが見つかりません。デフォルトデバイスを使用します。")
-            else:
-                print("デフォルトデバイスを使用します。")
-            pygame.mixer.quit()
-            pygame.mixer.init()
-        except Exception as e:
-            print(f"デバイス設定中にエラーが発生しました: {e}")
-            print("デフォルトデバイスを使用します。")
-            pygame.mixer.quit()
-            pygame.mixer.init()
+        """エンジンが開いた再生デバイス（保存された設定）をコンボボックスに反映する"""
+        self.device_var.set(self.engine.device_name or self.DEFAULT_DEVICE_LABEL)
 
     def on_closing(self):
         """ウィンドウを閉じる時の処理"""
-        # 現在の再生デバイス名を保存
+        self.closing = True
+        # 選択した再生デバイス名を保存（取り外されていて既定のデバイスで再生していた場合も、選択したデバイスを保存する）
         try:
-            current_device_name = self.device_var.get()
-            self.config['Audio']['device_name'] = current_device_name
+            self.config['Audio']['device_name'] = self.engine.preferred_device
             
             # ウィンドウサイズを保存
             self.config['Window']['width'] = str(self.root.winfo_width())
@@ -833,13 +1268,31 @@ class MusicPlayer:
             
             self.save_settings()
         except Exception as e:
-            print(f"設定の保存中にエラーが発生しました: {e}")
-        
-        pygame.mixer.quit()
+            logger.error(f"設定の保存中にエラーが発生しました: {e}")
+        
+        # 復元中に閉じた場合、まだ読み込んでいない曲は次回また読み込む
+        self.engine.end_restore(discard=False)
+        self.loader.shutdown()
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.cancel_duplicate_scan()
+        if self.waveform_after_id is not None:
+            self.root.after_cancel(self.waveform_after_id)
+        self.peak_loader.shutdown()
+        if self.device_probe is not None:
+            self.device_probe.stop()
+        if self.event_loop_monitor is not None:
+            self.event_loop_monitor.stop()
+        if self.save_after_id is not None:
+            self.root.after_cancel(self.save_after_id)
+        self.engine.shutdown()  # プレイリストの残りの変更もここで書き込まれる
+        if self.metrics_path is not None:
+            metrics.export(self.metrics_path)
         self.root.destroy()
 
     def create_text_icon(self, text):
         """テキストを使用したアイコンを作成する"""
+        from PIL import Image, ImageTk, ImageDraw, ImageFont
         width = 24
         height = 24
         image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
@@ -854,7 +1307,7 @@ class MusicPlayer:
         return ImageTk.PhotoImage(image)
 
     def load_svg_to_photoimage(self, svg_path, width=32, height=32):
-        """SVGファイルをPhotoImageに変換する"""
+        """SVGファイルをPhotoImageに変換する（変換済みのPNGがあればそれを読み込む）"""
         try:
             # 実行環境に応じてアイコンファイルのパスを設定
             if getattr(sys, 'frozen', False):
@@ -864,29 +1317,9 @@ class MusicPlayer:
                 # 通常のPythonスクリプトとして実行された場合
                 icon_path = os.path.join(self.base_path, svg_path)
             
-            # SVGファイルを読み込む
-            with open(icon_path, 'rb') as f:
-                svg_data = f.read()
-            
-            # SVGレンダラーを作成
-            renderer = QSvgRenderer(QByteArray(svg_data))
-            
-            # QImageを作成してSVGを描画
-            image = QImage(width, height, QImage.Format_ARGB32)
-            image.fill(Qt.transparent)
-            painter = QPainter(image)
-            renderer.render(painter)
-            painter.end()
-            
-            # QImageをPIL Imageに変換
-            image_data = image.constBits().asstring(image.byteCount())
-            pil_image = Image.frombuffer('RGBA', (width, height), image_data, 'raw', 'BGRA')
-            
-            # PIL ImageをPhotoImageに変換
-            photo_image = ImageTk.PhotoImage(pil_image)
-            return photo_image
+            return self.icon_cache.load(icon_path, width, height, self.icon_scale, master=self.root)
         except Exception as e:
-            print(f"アイコンの読み込みに失敗しました: {e}")
+            logger.error(f"アイコンの読み込みに失敗しました: {e}")
             return None
 
     def show_tooltip(self, event, text):
@@ -907,31 +1340,23 @@ class MusicPlayer:
 
     def clear_playlist(self):
         """プレイリストをクリアする"""
-        # 再生を停止
-        pygame.mixer.music.stop()
-        self.play_button.config(text="再生")
-        self.is_paused = True
-        
-        # プレイリストをクリア
-        self.playlist.clear()
-        self.current_track = 0
-        self.current_track_length = 0
-        self.current_position = 0
-        self.progress_var.set(0)
-        self.current_time_label.config(text="00:00")
+        # 読み込み中のファイルを破棄
+        self.loader.cancel()
+        
+        # 再生を停止してプレイリストをクリア
+        self.clear_filter_rows()
+        self.engine.clear()
         self.total_time_label.config(text="00:00")
-        self.current_track_label.config(text="再生中の曲: ")
         
         # Treeviewをクリア
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.view.clear_selection()
+        self.apply_filter()
         
-        # 設定ファイルのプレイリストセクションもクリア
-        if 'Playlist' in self.config:
-            self.config['Playlist'] = {}
-            self.save_settings()
+        # 保存済みのプレイリストもすぐにクリア
+        self.engine.save_playlist()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 重複検出のプロセスプール（PyInstallerでビルドした場合に必要）
     root = TkinterDnD.Tk()
     app = MusicPlayer(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)  # ウィンドウを閉じる時の処理を設定
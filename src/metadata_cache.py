@@ -0,0 +1,293 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class MetadataCache:
+    """曲のメタデータをSQLiteにキャッシュする（パス・サイズ・更新日時をキーにする）"""
+
+    # 何日間参照されなかったエントリを削除するか
+    MAX_AGE_DAYS = 180
+    # まとめて書き込む件数
+    COMMIT_INTERVAL = 200
+    # キャッシュの形式（値の求め方を変えた時に上げ、古い値を捨てる）
+    # 2: 重複検出でFLACのメタデータブロックとWAVの data 以外のチャンクを除くようにした
+    VERSION = 2
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.hits = 0  # キャッシュヒット数
+        self.misses = 0  # キャッシュミス数（新規・更新されたファイル）
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.touched = set()  # 今回参照されたパス（最終参照日の更新用）
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " title TEXT,"
+            " artist TEXT,"
+            " track_number TEXT,"
+            " length REAL,"
+            " last_seen INTEGER NOT NULL)"
+        )
+        # MP3のシーク用インデックス（フレームごとのバイト位置）
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seek_index ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sample_rate INTEGER NOT NULL,"
+            " samples_per_frame INTEGER NOT NULL,"
+            " typecode TEXT NOT NULL,"
+            " offsets BLOB NOT NULL)"
+        )
+        # 重複検出用の音声部分（タグを除く）の大きさとハッシュ
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio_hash ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " payload_size INTEGER NOT NULL,"
+            " digest TEXT)"
+        )
+        # ReplayGain（タグから読んだ値、または解析した値）
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS loudness ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " album TEXT NOT NULL,"
+            " track_gain REAL,"
+            " track_peak REAL,"
+            " album_gain REAL,"
+            " album_peak REAL,"
+            " loudness REAL,"
+            " blocks INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS loudness_album ON loudness (album)")
+        # 波形表示用のピーク（区間ごとの最小値・最大値）
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS waveform ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " peaks BLOB NOT NULL)"
+        )
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 2:
+            self.conn.execute("DELETE FROM audio_hash WHERE path NOT LIKE '%.mp3'")
+        if version < self.VERSION:
+            self.conn.execute(f"PRAGMA user_version = {self.VERSION}")
+        self.conn.commit()
+
+    @staticmethod
+    def today():
+        return int(time.time() // 86400)
+
+    def get(self, file_path, stat=None):
+        """キャッシュ済みのメタデータを返す。未登録または古い場合はNone"""
+        if stat is None:
+            stat = os.stat(file_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, title, artist, track_number, length FROM metadata WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+            if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched.add(file_path)
+        return {
+            'title': row[2],
+            'artist': row[3],
+            'track_number': row[4],
+            'length': row[5],
+        }
+
+    def put(self, file_path, metadata, stat=None):
+        """メタデータを登録する（古いエントリは置き換える）"""
+        if stat is None:
+            stat = os.stat(file_path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata"
+                " (path, size, mtime_ns, title, artist, track_number, length, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns,
+                 metadata['title'], metadata['artist'], metadata['track_number'],
+                 metadata['length'], self.today()),
+            )
+            self.touched.discard(file_path)
+            self.pending_writes += 1
+            if self.pending_writes >= self.COMMIT_INTERVAL:
+                self._commit()
+
+    def lookup(self, file_path, loader):
+        """キャッシュを参照し、無ければloaderで読み込んで登録する"""
+        stat = os.stat(file_path)
+        metadata = self.get(file_path, stat)
+        if metadata is None:
+            metadata = loader(file_path)
+            if metadata is not None:
+                self.put(file_path, metadata, stat)
+        return metadata
+
+    def get_seek_index(self, file_path, stat=None):
+        """キャッシュ済みのシーク用インデックスを (sample_rate, samples_per_frame, typecode, offsets) で返す"""
+        if stat is None:
+            stat = os.stat(file_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, sample_rate, samples_per_frame, typecode, offsets FROM seek_index WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2], row[3], row[4], row[5]
+
+    def put_seek_index(self, file_path, sample_rate, samples_per_frame, typecode, offsets, stat=None):
+        """シーク用インデックスを登録する"""
+        if stat is None:
+            stat = os.stat(file_path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO seek_index"
+                " (path, size, mtime_ns, sample_rate, samples_per_frame, typecode, offsets)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns, sample_rate, samples_per_frame, typecode, offsets),
+            )
+            self._commit()
+
+    def get_audio_hash(self, file_path, stat):
+        """キャッシュ済みの (音声部分の大きさ, ハッシュ) を返す（ハッシュは未計算ならNone）"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, payload_size, digest FROM audio_hash WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2], row[3]
+
+    def put_audio_hashes(self, entries):
+        """(パス, stat, 音声部分の大きさ, ハッシュ) の一覧をまとめて登録する"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO audio_hash (path, size, mtime_ns, payload_size, digest)"
+                " VALUES (?, ?, ?, ?, ?)",
+                ((path, stat.st_size, stat.st_mtime_ns, payload_size, digest)
+                 for path, stat, payload_size, digest in entries),
+            )
+            self._commit()
+
+    LOUDNESS_COLUMNS = ('album', 'track_gain', 'track_peak', 'album_gain', 'album_peak', 'loudness', 'blocks')
+
+    def get_loudness(self, file_path, stat):
+        """キャッシュ済みのReplayGainの値を辞書で返す。未登録または古い場合はNone"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, " + ", ".join(self.LOUDNESS_COLUMNS) + " FROM loudness WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return dict(zip(self.LOUDNESS_COLUMNS, row[2:]))
+
+    def put_loudness(self, file_path, stat, entry):
+        """ReplayGainの値を登録する"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO loudness (path, size, mtime_ns, " + ", ".join(self.LOUDNESS_COLUMNS) + ")"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns) + tuple(entry[key] for key in self.LOUDNESS_COLUMNS),
+            )
+            self.pending_writes += 1
+            if self.pending_writes >= self.COMMIT_INTERVAL:
+                self._commit()
+
+    def album_loudness(self, album):
+        """同じアルバムの解析済みの曲のReplayGainの値の一覧"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT " + ", ".join(self.LOUDNESS_COLUMNS) + " FROM loudness WHERE album = ?",
+                (album,),
+            ).fetchall()
+        return [dict(zip(self.LOUDNESS_COLUMNS, row)) for row in rows]
+
+    def get_waveform(self, file_path, stat):
+        """キャッシュ済みの波形のピークを返す。未登録または古い場合はNone"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, peaks FROM waveform WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def put_waveform(self, file_path, peaks, stat):
+        """波形のピークを登録する"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO waveform (path, size, mtime_ns, peaks) VALUES (?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns, peaks),
+            )
+            self._commit()
+
+    def discard(self, file_path):
+        """存在しなくなったファイルのエントリを削除する"""
+        with self.lock:
+            self.conn.execute("DELETE FROM metadata WHERE path = ?", (file_path,))
+            self.conn.execute("DELETE FROM seek_index WHERE path = ?", (file_path,))
+            self.conn.execute("DELETE FROM audio_hash WHERE path = ?", (file_path,))
+            self.conn.execute("DELETE FROM loudness WHERE path = ?", (file_path,))
+            self.conn.execute("DELETE FROM waveform WHERE path = ?", (file_path,))
+            self.pending_writes += 1
+
+    def evict_stale(self):
+        """長期間参照されていないエントリを削除する"""
+        with self.lock:
+            cur = self.conn.execute(
+                "DELETE FROM metadata WHERE last_seen < ?",
+                (self.today() - self.MAX_AGE_DAYS,),
+            )
+            # メタデータが無くなったファイルのインデックスも削除
+            self.conn.execute("DELETE FROM seek_index WHERE path NOT IN (SELECT path FROM metadata)")
+            self.conn.execute("DELETE FROM audio_hash WHERE path NOT IN (SELECT path FROM metadata)")
+            self.conn.execute("DELETE FROM loudness WHERE path NOT IN (SELECT path FROM metadata)")
+            self.conn.execute("DELETE FROM waveform WHERE path NOT IN (SELECT path FROM metadata)")
+            self.conn.commit()
+            return cur.rowcount
+
+    def flush(self):
+        """未書き込みの変更と最終参照日をコミットする"""
+        with self.lock:
+            self._commit()
+
+    def _commit(self):
+        if self.touched:
+            today = self.today()
+            self.conn.executemany(
+                "UPDATE metadata SET last_seen = ? WHERE path = ? AND last_seen < ?",
+                ((today, path, today) for path in self.touched),
+            )
+            self.touched.clear()
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def stats_text(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"メタデータキャッシュ: ヒット {self.hits} 件, ミス {self.misses} 件 (ヒット率 {rate:.1f}%)"
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            self.conn.close()
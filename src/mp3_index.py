@@ -0,0 +1,216 @@
+import io
+import mmap
+import os
+from array import array
+
+# ビットレート表（kbps） [MPEG1か][レイヤー] → インデックス順
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# サンプリング周波数 [バージョンID] → インデックス順
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG1
+    2: (22050, 24000, 16000),  # MPEG2
+    0: (11025, 12000, 8000),  # MPEG2.5
+}
+
+
+def parse_frame_header(b0, b1, b2, b3):
+    """MPEGオーディオのフレームヘッダーを解析する
+
+    (フレーム長, サンプリング周波数, 1フレームのサンプル数) を返す。不正な場合はNone。
+    """
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version_id = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version_id == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version_id == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_id][rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, sample_rate, 384
+    if layer == 2:
+        return 144 * bitrate // sample_rate + padding, sample_rate, 1152
+    if mpeg1:
+        return 144 * bitrate // sample_rate + padding, sample_rate, 1152
+    return 72 * bitrate // sample_rate + padding, sample_rate, 576
+
+
+def _id3v2_size(data):
+    """先頭のID3v2タグの大きさ（タグが無ければ0）"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    if data[5] & 0x10:  # フッターあり
+        size += 10
+    return size + 10
+
+
+def audio_payload_range(f, size):
+    """タグ（先頭のID3v2、末尾のID3v1・APEv2）を除いた音声部分の (開始位置, 終了位置) を返す"""
+    f.seek(0)
+    start = min(_id3v2_size(f.read(10)), size)
+    end = size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b'TAG':
+            end -= 128  # ID3v1タグ
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            tag_size = int.from_bytes(footer[12:16], 'little')
+            if int.from_bytes(footer[20:24], 'little') & 0x80000000:  # ヘッダーあり
+                tag_size += 32
+            end = max(start, end - tag_size)
+    return start, end
+
+
+def _is_info_frame(data, pos, length):
+    """Xing/Info/VBRIヘッダーだけを持つ（音声を含まない）フレームかどうか"""
+    frame = data[pos:pos + min(length, 64)]
+    return b'Xing' in frame or b'Info' in frame or frame[36:40] == b'VBRI'
+
+
+class SeekIndex:
+    """MP3の各フレームのファイル内の位置"""
+
+    def __init__(self, sample_rate, samples_per_frame, offsets):
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.offsets = offsets  # フレーム番号 → バイト位置（array）
+
+    @property
+    def frame_duration(self):
+        return self.samples_per_frame / self.sample_rate
+
+    @property
+    def length(self):
+        return len(self.offsets) * self.frame_duration
+
+    def locate(self, seconds):
+        """指定した時間を含むフレームの (バイト位置, フレームの開始時間) を返す"""
+        if not self.offsets:
+            return 0, 0.0
+        frame = int(seconds / self.frame_duration)
+        frame = max(0, min(frame, len(self.offsets) - 1))
+        return self.offsets[frame], frame * self.frame_duration
+
+    def byte_range(self, start, end, margin_frames=2):
+        """start～end秒を含むフレームの (開始位置, 開始時間, 終了位置) を返す
+
+        前後に margin_frames ずつ余分に含める（先頭はビットリザーバのため、末尾は
+        デコーダーの遅延のため）。終了位置がファイルの終わりまでの場合はNone。
+        """
+        margin = margin_frames * self.frame_duration
+        start_offset, start_time = self.locate(max(0.0, start - margin))
+        end_frame = int((end + margin) / self.frame_duration) + 1
+        end_offset = self.offsets[end_frame] if end_frame < len(self.offsets) else None
+        return start_offset, start_time, end_offset
+
+    def to_bytes(self):
+        return self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, sample_rate, samples_per_frame, typecode, data):
+        offsets = array(typecode)
+        offsets.frombytes(data)
+        return cls(sample_rate, samples_per_frame, offsets)
+
+
+def build_seek_index(file_path, cancel_event=None):
+    """MP3ファイルのフレームヘッダーを走査してシーク用のインデックスを作る"""
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return None
+    typecode = 'L' if size < 2 ** 32 else 'Q'
+    offsets = array(typecode)
+    sample_rate = None
+    samples_per_frame = None
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = _id3v2_size(data[:10])
+        end = size
+        if size >= 128 and data[size - 128:size - 125] == b'TAG':
+            end -= 128  # ID3v1タグ
+        first = True
+        while pos + 4 <= end:
+            if cancel_event is not None and len(offsets) % 4096 == 0 and cancel_event.is_set():
+                return None
+            header = parse_frame_header(data[pos], data[pos + 1], data[pos + 2], data[pos + 3])
+            if header is None or (sample_rate is not None and header[1] != sample_rate):
+                # 同期が外れた場合は次の同期ワードを探す
+                pos = data.find(b'\xff', pos + 1, end)
+                if pos < 0:
+                    break
+                continue
+            length, rate, samples = header
+            if first:
+                first = False
+                sample_rate = rate
+                samples_per_frame = samples
+                if _is_info_frame(data, pos, length):
+                    pos += length
+                    continue
+            offsets.append(pos)
+            pos += length
+    if not offsets:
+        return None
+    return SeekIndex(sample_rate, samples_per_frame, offsets)
+
+
+class OffsetFile(io.RawIOBase):
+    """ファイルの途中（フレームの先頭）をファイルの先頭に見せるラッパー
+
+    pygame.mixer.music.load にファイルオブジェクトとして渡すと、
+    デコーダーは指定したフレームから読み始める。
+    """
+
+    def __init__(self, file_path, offset, end=None):
+        self.file = open(file_path, 'rb')
+        self.offset = offset
+        self.end = end  # ここまでをファイルの終わりに見せる（Noneは実際のファイルの終わり）
+        self.file.seek(offset)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _remaining(self):
+        return max(0, self.end - self.file.tell())
+
+    def readinto(self, buffer):
+        if self.end is not None:
+            buffer = memoryview(buffer)[:self._remaining()]
+        return self.file.readinto(buffer)
+
+    def read(self, size=-1):
+        if self.end is not None:
+            size = self._remaining() if size is None or size < 0 else min(size, self._remaining())
+        return self.file.read(size)
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position += self.offset
+        elif whence == io.SEEK_END and self.end is not None:
+            position += self.end
+            whence = io.SEEK_SET
+        return self.file.seek(position, whence) - self.offset
+
+    def tell(self):
+        return self.file.tell() - self.offset
+
+    def close(self):
+        self.file.close()
+        super().close()
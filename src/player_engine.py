@@ -0,0 +1,988 @@
+import io
+import os
+import time
+import wave
+import bisect
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+import logging
+from metadata_cache import MetadataCache
+from playlist_model import PlaylistModel
+from playlist_store import PlaylistStore
+from m3u import write_m3u
+from mp3_index import SeekIndex, OffsetFile, build_seek_index
+from duplicates import DuplicateFinder
+from loudness import LoudnessScanner, MODES as REPLAYGAIN_MODES
+from ab_loop import SegmentLoop, decode_segment, MIN_LOOP_SECONDS
+from audio_devices import DeviceRegistry
+from formats import probe, uses_seek_index
+from instrumentation import metrics
+
+
+def _silent_wav(seconds=0.1, sample_rate=44100):
+    """無音のWAVファイルの中身"""
+    data = io.BytesIO()
+    with wave.open(data, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(4 * int(sample_rate * seconds)))
+    return data.getvalue()
+
+
+# キューに入れた曲を取り消す時に代わりに入れる（pygameにはキューを取り消す方法が無い）
+SILENCE_WAV = _silent_wav()
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerEngine:
+    """画面に依存しない再生エンジン（プレイリスト・再生操作・リピート・デバイス選択）
+
+    tkinter・PyQt5・Pillow は読み込まないので、画面の無い環境（daemon.py）でも動く。
+    Tkの画面（main.py）もこのクラスを使って再生する。
+    状態が変わった時は on_change() が呼ばれる。曲の終了の確認などの定期処理のため、
+    再生中は tick() を100ミリ秒程度の間隔で呼ぶこと。
+    すべてのメソッドは同じスレッド（画面ならTkのスレッド）から呼ぶこと。
+    """
+
+    MAX_SEEK_INDEXES = 8  # メモリに残すシーク用インデックスの数
+
+    def __init__(self, config, base_path, on_change=None):
+        self.config = config
+        self.on_change = on_change
+
+        # メタデータキャッシュ（設定ファイルと同じ場所に保存）
+        self.metadata_cache = MetadataCache(os.path.join(base_path, "metadata_cache.db"))
+        self.duplicates = DuplicateFinder(self.metadata_cache)
+
+        # 保存された再生デバイスでミキサーを初期化
+        self.device_name = ''  # 空文字列はデフォルトデバイス
+        self.devices = DeviceRegistry()  # 出力デバイスの一覧（抜き差しをバックグラウンドで監視する）
+        self.device_version = 0  # 確認済みのデバイスの一覧の版
+        # 選択されたデバイス（取り外されている間は既定のデバイスで再生し、接続されたら戻す）
+        self.preferred_device = self.config.get('Audio', 'device_name', fallback='')
+        self.open_device(self.preferred_device)
+        self.devices.start()
+
+        # 曲の終了をミキサーのイベントで受け取る
+        # （pygameのイベントキューにはビデオの初期化が必要。ウィンドウは作らない）
+        self.end_event = None
+        try:
+            pygame.display.init()
+            self.end_event = pygame.USEREVENT + 1
+        except pygame.error as e:
+            logger.warning(f"イベントキューを初期化できませんでした（再生状態の監視で代用します）: {e}")
+
+        # プレイリスト
+        self.playlist = PlaylistModel()  # ファイルパスとメタデータ（self.playlist[i] でパスを返す）
+        self.store = PlaylistStore(os.path.join(base_path, "playlist.db"))  # 変更だけを保存する
+        self.restoring = deque()  # 復元中の (行ID, パス)（読み込み順に対応付ける）
+        self.current_track = 0
+        self.current_track_length = 0  # 現在の曲の長さ（秒）
+        self.current_position = 0  # 現在の再生位置（秒）
+        self.current_title = None  # 再生中の曲名（未再生の場合はNone）
+        self.current_artist = None
+        self.seek_offset = 0  # ミキサーの再生時間（get_pos）と実際の再生位置の差（秒）
+        self.repeat_track = False  # トラックリピートフラグ
+        self.is_paused = True  # 一時停止状態を記録
+
+        # ギャップレス再生（次の曲をミキサーのキューに入れておく）
+        self.gapless = self.config.getboolean('Playback', 'gapless', fallback=True)
+        self.crossfade_ms = max(0, self.config.getint('Playback', 'crossfade_ms', fallback=0))
+        self.queued_track_id = None  # キューに入れた曲のID
+        self.queued_gain = 1.0  # キューに入れた曲のReplayGainによる音量の倍率（入れた時に求めておく）
+        self.queue_cancelled = False  # キューの曲を無音に差し替えたかどうか
+        self.last_mixer_pos = 0  # 前回取得したミキサーの再生位置（ミリ秒）
+        self.fading_in = False  # 曲の切り替え直後のフェードイン中かどうか
+        self.current_volume = 1.0  # フェードによる音量
+
+        # ReplayGain（曲ごとの音量の差をなくす。解析はバックグラウンドで行う）
+        self.loudness = LoudnessScanner(self.metadata_cache)
+        self.replaygain_mode = self.config.get('ReplayGain', 'mode', fallback='off')
+        if self.replaygain_mode not in REPLAYGAIN_MODES:
+            self.replaygain_mode = 'off'
+        self.replaygain_preamp = self.config.getfloat('ReplayGain', 'preamp_db', fallback=0.0)
+        self.gain = 1.0  # 再生中の曲のReplayGainによる音量の倍率
+
+        # MP3のシーク用インデックス（バックグラウンドで作成し、キャッシュに保存する）
+        self.current_file = None  # 再生中のファイル
+        self.music_file = None  # フレーム位置から再生する時に開いているファイル
+        self.seek_indexes = OrderedDict()  # ファイルパス → SeekIndex（最近再生した曲ほど後ろ）
+        self.seek_index_lock = threading.Lock()  # 並べ替えと追加・削除をワーカースレッドと分ける
+        self.seek_index_pending = set()
+        self.seek_index_cancel = threading.Event()
+        self.seek_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="seek-index")
+
+        # 範囲繰り返し（A-B間を展開してメモリから繰り返す）
+        self.loop_mark = None  # A点だけを設定した時の位置（秒）
+        self.loop_points = None  # 繰り返す範囲 (A, B)（秒）
+        self.loop_file = None  # 範囲を設定した曲
+        self.loop_future = None  # A-B間の展開中の Future
+        self.loop = None  # 繰り返し再生中の SegmentLoop
+
+    def notify(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    # --- 状態 ---
+
+    def is_playing(self):
+        """曲を再生中かどうか（一時停止・停止中はFalse）"""
+        if self.loop is not None:
+            return not self.is_paused
+        return bool(self.playlist) and pygame.mixer.music.get_busy()
+
+    def state_text(self):
+        """ログ用の再生状態"""
+        if self.is_paused:
+            return '一時停止中'
+        return '再生中' if self.is_playing() else '停止中'
+
+    def status(self):
+        """現在の状態を辞書で返す"""
+        return {
+            'state': 'paused' if self.is_paused else 'playing' if self.is_playing() else 'stopped',
+            'track': self.current_track if self.playlist else None,
+            'count': len(self.playlist),
+            'title': self.current_title,
+            'artist': self.current_artist,
+            'position': round(self.get_playback_position(), 3),
+            'length': round(self.current_track_length, 3),
+            'repeat': self.repeat_track,
+            'loop': list(self.loop_points) if self.loop_points else [self.loop_mark, None] if self.loop_mark is not None else None,
+            'device': self.device_name,
+        }
+
+    # --- メタデータ ---
+
+    def read_metadata(self, file_path):
+        """ファイルのメタデータを形式に合わせて読み込む（読めない場合はNone）"""
+        return probe(file_path)
+
+    def get_metadata(self, file_path):
+        """キャッシュを使ってメタデータを取得する"""
+        try:
+            metadata = self.metadata_cache.lookup(file_path, self.read_metadata)
+        except OSError as e:
+            logger.error(f"ファイル情報の取得に失敗しました: {file_path}: {e}")
+            metadata = None
+        if metadata is None:
+            metadata = {
+                'title': os.path.basename(file_path),
+                'artist': "Unknown Artist",
+                'track_number': "0",
+                'length': 0,
+            }
+        return metadata
+
+    def load_track(self, file_path):
+        """ワーカースレッドから呼んでよい。ファイルが存在しない場合はNoneを返す"""
+        if not os.path.exists(file_path):
+            return None
+        return self.get_metadata(file_path)
+
+    def maintain_cache(self):
+        """キャッシュを書き込み、長期間使われていないエントリを削除する"""
+        self.metadata_cache.flush()
+        evicted = self.metadata_cache.evict_stale()
+        if evicted:
+            logger.info(f"古いメタデータキャッシュを削除しました: {evicted} 件")
+        logger.info(self.metadata_cache.stats_text())
+
+    # --- プレイリストの保存と復元 ---
+
+    def migrate_playlist(self, config):
+        """settings.ini の [Playlist]（旧形式）をプレイリストのDBに移す。移した場合はTrue"""
+        if not self.store.is_new or 'Playlist' not in config:
+            return False
+        paths = [config['Playlist'][key] for key in config['Playlist']]
+        self.store.import_paths(paths)
+        config.remove_section('Playlist')
+        logger.info(f"プレイリストを playlist.db に移行しました: {len(paths)} 件")
+        return True
+
+    def begin_restore(self):
+        """保存されたプレイリストのパスを返す。読み込んだ順に append_track か drop_missing を呼ぶこと"""
+        rows = self.store.load()
+        self.restoring = deque(rows)
+        return [path for _, path in rows]
+
+    def _take_restoring(self, file_path):
+        """復元中の行なら行IDを返す"""
+        if self.restoring and self.restoring[0][1] == file_path:
+            return self.restoring.popleft()[0]
+        return None
+
+    def drop_missing(self, file_path):
+        """存在しなくなったファイルをキャッシュと保存済みのプレイリストから削除する"""
+        self.metadata_cache.discard(file_path)
+        row_id = self._take_restoring(file_path)
+        if row_id is not None:
+            self.store.delete_row(row_id)
+
+    def end_restore(self, discard=True):
+        """復元の完了・キャンセル時に呼ぶ
+
+        discard: 読み込まれなかった行を保存済みのプレイリストからも削除するかどうか
+        （復元中に終了する場合はFalseにして、次回の起動時に読み込み直す）
+        """
+        if discard:
+            for row_id, _ in self.restoring:
+                self.store.delete_row(row_id)
+        self.restoring.clear()
+
+    def save_playlist(self):
+        """プレイリストの変更を書き込む"""
+        try:
+            self.store.flush()
+        except Exception as e:
+            logger.error(f"プレイリストの保存中にエラーが発生しました: {e}")
+
+    def switch_playlist(self, playlist_id):
+        """再生を停止し、別のプレイリストに切り替える
+
+        メモリに読み込むのは選択中のプレイリストだけなので、切り替え後に
+        begin_restore() から曲を読み込むこと。
+        """
+        self.save_playlist()
+        pygame.mixer.music.stop()
+        self.is_paused = True
+        self.queued_track_id = None
+        self.restoring.clear()
+        self.playlist.clear()  # 保存済みの曲は削除しない（store.clear は呼ばない）
+        self.reset_track()
+        self.store.activate(playlist_id)
+        self.notify()
+
+    def export_m3u(self, m3u_path):
+        """選択中のプレイリストをM3Uで書き出し、曲数を返す"""
+        playlist = self.playlist
+        return write_m3u(m3u_path, ((playlist[i], playlist.titles[i], playlist.artists[i], playlist.lengths[i])
+                                    for i in range(len(playlist))))
+
+    # --- プレイリストの編集 ---
+
+    def append_track(self, file_path, metadata):
+        """読み込み済みのメタデータで曲をプレイリストの末尾に追加する"""
+        track_id = self.playlist.append(file_path, metadata)
+        row_id = self._take_restoring(file_path)
+        if row_id is not None:
+            self.store.bind(track_id, row_id)
+        else:
+            self.store.append(track_id, file_path)
+        # 最後の曲を再生中だった場合は、追加した曲をキューに入れる
+        if self.queued_track_id is None and self.current_track == len(self.playlist) - 2 and pygame.mixer.music.get_busy():
+            self.queue_next_track()
+
+    def delete(self, index):
+        """曲をプレイリストから削除する（再生中の曲なら停止する）"""
+        self.delete_tracks([index])
+
+    def delete_tracks(self, indexes):
+        """複数の曲をまとめて削除する（再生中の曲が含まれていれば停止する）"""
+        indexes = sorted(set(indexes))
+        if not indexes:
+            return
+        if self.current_track in indexes:
+            self.clear_loop()
+            pygame.mixer.music.stop()
+            self.is_paused = True
+            self.queued_track_id = None  # 停止するとキューも破棄される
+
+        # 再生中の曲はIDで追跡する
+        current_id = self.playlist.id_at(self.current_track) if self.current_track < len(self.playlist) else None
+        for index in indexes:
+            self.store.delete(self.playlist.id_at(index))
+        self.playlist.delete_rows(indexes)
+
+        current_index = self.playlist.index_of(current_id) if current_id is not None else None
+        if current_index is not None:
+            self.current_track = current_index
+        else:
+            # 削除した曲の位置には次の曲が詰まっている
+            self.current_track -= bisect.bisect_left(indexes, self.current_track)
+            if self.current_track >= len(self.playlist):
+                self.current_track = max(0, len(self.playlist) - 1)
+        self.refresh_queue()
+
+        if not self.playlist:
+            self.reset_track()
+        self.notify()
+
+    def remove_tracks(self, track_ids):
+        """指定したIDの曲をまとめて削除する"""
+        indexes = [self.playlist.index_of(track_id) for track_id in track_ids]
+        self.delete_tracks([i for i in indexes if i is not None])
+
+    def move_tracks(self, indexes, before):
+        """複数の曲を before の位置（移動前の行番号。末尾なら曲数）の前にまとめて移動する
+
+        移動する曲は元の順番のまま連続して並ぶ。移動後の行番号の一覧を返す。
+        """
+        if self.restoring:
+            raise ValueError("プレイリストの読み込み中は曲を移動できません")
+        indexes = sorted(set(indexes))
+        if not indexes:
+            return []
+        moving = set(indexes)
+        rest = [i for i in range(len(self.playlist)) if i not in moving]
+        position = bisect.bisect_left(rest, before)  # 移動先より前に残る曲の数
+        order = rest[:position] + indexes + rest[position:]
+        moved = list(range(position, position + len(indexes)))
+        if indexes == moved:
+            return moved  # 並び順が変わらない
+        # 再生中の曲はIDで追跡する
+        current_id = self.playlist.id_at(self.current_track) if self.current_track < len(self.playlist) else None
+        self.playlist.reorder(order)
+        self.store.reorder(self.playlist.ids)
+        if current_id is not None:
+            self.current_track = self.playlist.index_of(current_id)
+        self.refresh_queue()
+        self.notify()
+        return moved
+
+    def sort_playlist(self, keys):
+        """プレイリストを並べ替える（keys は (列名, 降順かどうか) の一覧で先頭ほど優先）"""
+        if self.restoring:
+            raise ValueError("プレイリストの読み込み中は並べ替えできません")
+        # 再生中の曲はIDで追跡する
+        current_id = self.playlist.id_at(self.current_track) if self.current_track < len(self.playlist) else None
+        self.playlist.reorder(self.playlist.sort_order(keys))
+        self.store.reorder(self.playlist.ids)
+        if current_id is not None:
+            self.current_track = self.playlist.index_of(current_id)
+        self.refresh_queue()
+        self.notify()
+
+    def clear(self):
+        """再生を停止してプレイリストを空にする"""
+        pygame.mixer.music.stop()
+        self.is_paused = True
+        self.queued_track_id = None
+        self.playlist.clear()
+        self.store.clear()
+        self.restoring.clear()
+        self.reset_track()
+        self.notify()
+
+    def reset_track(self):
+        self.clear_loop()
+        self.current_track = 0
+        self.current_track_length = 0
+        self.current_position = 0
+        self.current_title = None
+        self.current_artist = None
+
+    # --- 再生操作 ---
+
+    def play_track(self, index=None):
+        """曲を先頭から再生する（省略時は現在の曲）"""
+        if not self.playlist:  # プレイリストが空の場合は何もしない
+            return
+        if index is not None:
+            self.current_track = index
+        self.current_position = 0
+
+        try:
+            # 再生を開始（次の曲もキューに入れる）
+            self.start_music(self.playlist[self.current_track])
+            self.is_paused = False
+
+            # 曲の長さと曲名はプレイリストに追加した時に読んだものを使う（ファイルは開き直さない）
+            metadata = self.playlist.metadata(self.current_track)
+            self.current_track_length = metadata['length']
+            self.current_title = metadata['title']
+            self.current_artist = metadata['artist']
+
+        except Exception as e:
+            logger.error(f"曲の再生中にエラーが発生しました: {e}")
+            self.is_paused = True
+        self.notify()
+
+    def toggle_play(self):
+        """再生/一時停止を切り替える"""
+        if not self.playlist:  # プレイリストが空の場合は何もしない
+            return
+
+        if self.loop is not None:
+            if self.is_paused:
+                self.loop.resume()
+            else:
+                self.loop.pause()
+            self.is_paused = not self.is_paused
+        elif self.is_paused:
+            if pygame.mixer.music.get_pos() < 0:
+                # 停止中（未再生・最後まで再生済み）の場合は現在の曲を先頭から再生する
+                self.play_track()
+                return
+            pygame.mixer.music.unpause()
+            self.is_paused = False
+        else:
+            pygame.mixer.music.pause()
+            self.is_paused = True
+        self.notify()
+
+    def pause(self):
+        if not self.is_paused:
+            self.toggle_play()
+
+    def stop(self):
+        """再生を停止する（次に再生すると現在の曲の先頭から）"""
+        self.clear_loop()
+        pygame.mixer.music.stop()
+        self.is_paused = True
+        self.queued_track_id = None
+        self.current_position = 0
+        self.notify()
+
+    def next_track(self):
+        if self.playlist and self.current_track < len(self.playlist) - 1:
+            self.play_track(self.current_track + 1)
+
+    def prev_track(self):
+        if self.playlist and self.current_track > 0:
+            self.play_track(self.current_track - 1)
+
+    def set_repeat(self, repeat):
+        self.repeat_track = repeat
+        self.refresh_queue()
+
+    def forward(self, seconds):
+        if self.loop is not None:
+            # 範囲繰り返し中はBを越えたらAから再生する（越えた分は足さない）
+            self.loop.seek(self.get_playback_position() + seconds)
+        elif self.playlist and pygame.mixer.music.get_busy():
+            self.seek(min(self.current_track_length, self.get_playback_position() + seconds))
+
+    def rewind(self, seconds):
+        if self.loop is not None:
+            # 範囲繰り返し中はAより前には戻らない
+            self.loop.seek(max(self.loop.start, self.get_playback_position() - seconds))
+        elif self.playlist and pygame.mixer.music.get_busy():
+            self.seek(max(0, self.get_playback_position() - seconds))
+
+    @metrics.timed('seek')
+    def seek(self, position):
+        """再生中の曲の再生位置を変更する"""
+        if self.loop is not None:
+            if self.loop.start <= position < self.loop.end:
+                self.loop.seek(position)
+                self.loop.resume()
+                self.is_paused = False
+                return
+            # 範囲の外に移動した場合は範囲繰り返しをやめる
+            self.clear_loop()
+            self.start_music(self.current_file, start=position)
+            self.current_position = self.seek_offset
+            self.is_paused = False
+            return
+        if self.current_file in self.seek_indexes or self.music_file is not None:
+            # インデックスがあればフレームの位置から読み直す（VBRでも正確で、長い曲でも速い）。
+            # 途中から読み込んだストリームの再生中は set_pos の位置がずれるので、読み直す
+            self.start_music(self.current_file, start=position)
+            self.current_position = self.seek_offset
+            return
+        pygame.mixer.music.set_pos(position)
+        # set_pos では get_pos が変わらないので、差分を覚えておく
+        self.seek_offset = position - pygame.mixer.music.get_pos() / 1000
+        self.current_position = position
+
+    def play_from(self, position):
+        """指定位置に移動する。停止・一時停止中ならその位置から再生を始める"""
+        if not self.playlist:
+            return
+        if self.loop is not None:
+            self.seek(position)
+            self.notify()
+        elif pygame.mixer.music.get_busy():
+            self.seek(position)
+        else:
+            self.start_music(self.playlist[self.current_track], start=position)
+            self.is_paused = False
+            self.current_position = position
+            self.notify()
+
+    def get_playback_position(self):
+        """ミキサーが実際に再生した位置（秒）を返す"""
+        if self.loop is not None:
+            return self.loop.position()
+        mixer_pos = pygame.mixer.music.get_pos()
+        if mixer_pos < 0:  # 再生していない
+            return self.current_position
+        position = self.seek_offset + mixer_pos / 1000
+        if self.current_track_length > 0:
+            position = min(position, self.current_track_length)
+        return max(0, position)
+
+    # --- 定期処理と曲の切り替え ---
+
+    def tick(self):
+        """再生中の定期処理（曲の終了確認とフェード）"""
+        if self.loop_future is not None and self.loop_future.done() and not self.is_paused:
+            self.start_loop()
+        if self.loop is not None:
+            if not self.is_paused:
+                self.loop.refill()
+            return
+
+        if not self.is_paused:  # 一時停止中は更新しない
+            # 曲の終了・キューの曲への切り替えを確認
+            self.process_music_events()
+
+        if not self.is_paused and self.crossfade_ms:
+            self.current_position = self.get_playback_position()
+            self.update_crossfade()
+
+    def process_music_events(self):
+        """ミキサーから曲の終了イベントを受け取る"""
+        if self.end_event is not None:
+            ended = False
+            for event in pygame.event.get():
+                if event.type == self.end_event:
+                    ended = True
+                elif event.type in (pygame.AUDIODEVICEADDED, pygame.AUDIODEVICEREMOVED):
+                    self.devices.rescan()
+        else:
+            # イベントが使えない環境では、get_pos の巻き戻りと再生状態で判断する
+            mixer_pos = pygame.mixer.music.get_pos()
+            ended = 0 <= mixer_pos < self.last_mixer_pos or not pygame.mixer.music.get_busy()
+            self.last_mixer_pos = mixer_pos
+        if ended:
+            self.on_music_end()
+
+    def on_music_end(self):
+        """曲が最後まで再生された時の処理"""
+        if pygame.mixer.music.get_busy():
+            if self.queued_track_id is not None:
+                # ミキサーがキューの曲に切り替えた
+                self.on_queued_track_started(pygame.mixer.music.get_pos() / 1000)
+                return
+            # キューを取り消した無音（または取り消せていなかった曲）に切り替わった場合は止めて、曲の終わりとして扱う
+            if not self.queue_cancelled:
+                logger.warning("キューに残っていた曲の再生を停止します")
+            self.queue_cancelled = False
+            pygame.mixer.music.stop()
+        if not self.playlist:
+            return
+
+        logger.info("曲の再生が終了しました")
+        if self.repeat_track:
+            logger.info("リピートモード: 同じ曲を先頭から再生します")
+            self.current_position = 0
+            self.start_music(self.playlist[self.current_track])
+            self.notify()
+        elif self.current_track < len(self.playlist) - 1:
+            logger.info("次の曲に進みます")
+            self.next_track()  # 次の曲を再生
+        else:
+            # プレイリストの最後まで再生した
+            logger.info("プレイリストの最後まで再生しました")
+            self.is_paused = True
+            self.current_position = self.current_track_length
+            self.notify()
+
+    @metrics.timed('track_load')
+    def start_music(self, file_path, start=0):
+        """ファイルを読み込んで再生を開始し、次の曲をキューに入れる"""
+        if self.loop is not None or file_path != self.loop_file:
+            self.clear_loop()  # 展開中の範囲は、同じ曲の中での移動なら残す
+        seek_index = self.seek_indexes.get(file_path) if start > 0 else None
+        previous_file = self.music_file
+        if seek_index is not None:
+            # 指定位置を含むフレームの先頭から読み込ませる
+            offset, frame_time = seek_index.locate(start)
+            self.music_file = OffsetFile(file_path, offset)
+            pygame.mixer.music.load(self.music_file, "mp3")
+            play_start = start - frame_time  # フレーム内の位置はデコーダーに合わせてもらう
+            self.seek_offset = start
+        else:
+            self.music_file = None
+            pygame.mixer.music.load(file_path)
+            play_start = start
+            self.seek_offset = start
+        if previous_file is not None:
+            previous_file.close()  # 前の曲はloadで解放済み
+        self.queue_cancelled = False  # loadでキューも破棄される
+        self.current_file = file_path
+        if self.end_event is not None:
+            pygame.mixer.music.set_endevent(self.end_event)
+            pygame.event.clear(self.end_event)  # 前の曲のイベントは捨てる
+        pygame.mixer.music.play(start=play_start)
+        self.request_seek_index(file_path)
+        self.last_mixer_pos = 0
+        self.fading_in = False
+        self.current_volume = 1.0
+        self.apply_gain(file_path)
+        self.queue_next_track()
+
+    def queue_next_track(self):
+        """次に再生する曲をミキサーのキューに入れる（ギャップレス再生）"""
+        queued = self.queued_track_id is not None
+        self.queued_track_id = None
+        if not self.gapless or not self.playlist or self.current_track >= len(self.playlist):
+            next_index = None
+        elif self.repeat_track:
+            next_index = self.current_track
+        elif self.current_track < len(self.playlist) - 1:
+            next_index = self.current_track + 1
+        else:
+            next_index = None
+        if next_index is None:
+            if queued:
+                self.cancel_queue()  # 前に入れた曲がミキサーのキューに残っている
+            return
+        try:
+            # キューは上書きされるので、状態が変わった時は呼び直せばよい
+            pygame.mixer.music.queue(self.playlist[next_index])
+            self.queued_track_id = self.playlist.id_at(next_index)
+            self.queue_cancelled = False
+            # 切り替わった時にすぐ音量を合わせられるように、ReplayGainを先に求めておく
+            self.queued_gain = self.loudness.gain(self.playlist[next_index], self.replaygain_mode,
+                                                  self.replaygain_preamp)
+        except Exception as e:
+            logger.warning(f"次の曲をキューに入れられませんでした: {e}")
+
+    def cancel_queue(self):
+        """ミキサーのキューに入れた曲を取り消す
+
+        pygameにはキューだけを取り消す方法が無いので、短い無音に差し替える
+        （再生中の曲は止めない）。無音に切り替わったら on_music_end で曲の終わりとして扱う。
+        """
+        try:
+            pygame.mixer.music.queue(io.BytesIO(SILENCE_WAV), "wav")
+            self.queue_cancelled = True
+        except Exception as e:
+            logger.warning(f"キューを取り消せませんでした: {e}")
+
+    def on_queued_track_started(self, position):
+        """ミキサーがキューの曲の再生を始めた時の処理"""
+        queued_id = self.queued_track_id
+        self.queued_track_id = None
+        index = self.playlist.index_of(queued_id) if queued_id is not None else None
+        if index is None:
+            # 取り消せなかったキュー（削除された曲やリピート解除後の曲）は再生しない
+            logger.warning("キューの曲が無効になっていたため再生を停止します")
+            pygame.mixer.music.stop()
+            self.on_music_end()
+            return
+
+        logger.info(f"ギャップレス再生: 次の曲に切り替わりました ({index})")
+        if self.music_file is not None:
+            self.music_file.close()  # 前の曲はミキサーが解放済み
+            self.music_file = None
+        self.current_track = index
+        self.current_file = self.playlist[index]
+        if self.loop_file is not None and self.loop_file != self.current_file:
+            self.clear_loop()  # 前の曲に設定したA点
+        self.current_position = position
+        self.seek_offset = 0  # キューの曲は先頭から再生される
+        self.request_seek_index(self.current_file)
+        metadata = self.playlist.metadata(index)
+        self.current_track_length = metadata['length']
+        self.current_title = metadata['title']
+        self.current_artist = metadata['artist']
+        self.fading_in = bool(self.crossfade_ms)
+        self.apply_gain(self.current_file, self.queued_gain)
+        self.queue_next_track()
+        self.notify()
+
+    def request_seek_index(self, file_path):
+        """シーク用インデックスをバックグラウンドで用意する"""
+        if not uses_seek_index(file_path) or file_path in self.seek_index_pending:
+            return
+        with self.seek_index_lock:
+            if file_path in self.seek_indexes:
+                self.seek_indexes.move_to_end(file_path)  # 最近使ったものとして残す
+                return
+        self.seek_index_pending.add(file_path)
+        self.seek_index_executor.submit(self.load_seek_index, file_path)
+
+    def load_seek_index(self, file_path):
+        """ワーカースレッドで呼ばれる。キャッシュに無ければフレームを走査して作る"""
+        try:
+            stat = os.stat(file_path)
+            cached = self.metadata_cache.get_seek_index(file_path, stat)
+            if cached is not None:
+                seek_index = SeekIndex.from_bytes(*cached)
+            else:
+                started = time.perf_counter()
+                seek_index = build_seek_index(file_path, self.seek_index_cancel)
+                if seek_index is None:
+                    return
+                self.metadata_cache.put_seek_index(
+                    file_path, seek_index.sample_rate, seek_index.samples_per_frame,
+                    seek_index.offsets.typecode, seek_index.to_bytes(), stat)
+                logger.info(f"シーク用インデックスを作成しました: {file_path} "
+                            f"({len(seek_index.offsets)} フレーム, {time.perf_counter() - started:.2f}秒)")
+            # 最近使ったものだけを残す
+            with self.seek_index_lock:
+                while len(self.seek_indexes) >= self.MAX_SEEK_INDEXES:
+                    self.seek_indexes.popitem(last=False)
+                self.seek_indexes[file_path] = seek_index
+        except Exception as e:
+            logger.error(f"シーク用インデックスの作成に失敗しました: {file_path}: {e}")
+        finally:
+            self.seek_index_pending.discard(file_path)
+
+    def update_crossfade(self):
+        """曲の終わりでフェードアウトし、切り替え直後にフェードインする"""
+        fade = self.crossfade_ms / 1000
+        volume = 1.0
+        remaining = self.current_track_length - self.current_position
+        if self.queued_track_id is not None and remaining < fade:
+            volume = max(0.0, remaining / fade)
+        elif self.fading_in:
+            if self.current_position < fade:
+                volume = self.current_position / fade
+            else:
+                self.fading_in = False
+        self.set_volume(volume)
+
+    def refresh_queue(self):
+        """プレイリストやリピート設定の変更に合わせてキューを入れ直す"""
+        if self.queued_track_id is not None or pygame.mixer.music.get_busy():
+            self.queue_next_track()
+
+    def set_volume(self, volume):
+        if volume != self.current_volume:
+            self.current_volume = volume
+            pygame.mixer.music.set_volume(volume * self.gain)
+
+    # --- ReplayGain ---
+
+    def apply_gain(self, file_path, gain=None):
+        """再生を始めた曲のReplayGainを音量に反映する（gain は求めてあった倍率）"""
+        if gain is None:
+            gain = self.loudness.gain(file_path, self.replaygain_mode, self.replaygain_preamp)
+        self.gain = gain
+        pygame.mixer.music.set_volume(self.current_volume * self.gain)
+        if self.loop is not None:
+            self.loop.set_volume(self.gain)
+
+    def set_replaygain_mode(self, mode):
+        """ReplayGainの方式（off / track / album）を変更する（再生中の曲にもすぐ反映する）"""
+        if mode not in REPLAYGAIN_MODES:
+            raise ValueError(f"ReplayGainの方式が不正です: {mode}")
+        self.replaygain_mode = mode
+        if self.current_file is not None:
+            self.apply_gain(self.current_file)
+        self.scan_loudness()
+
+    def scan_loudness(self):
+        """プレイリストの未解析の曲の音量をバックグラウンドで解析する"""
+        if self.replaygain_mode != 'off' and self.playlist:
+            self.loudness.scan(list(self.playlist.paths))
+
+    # --- 範囲繰り返し ---
+
+    def mark_loop_point(self):
+        """現在の位置をA点・B点に順に設定する（設定済みの場合は範囲繰り返しをやめる）"""
+        if not self.playlist or self.current_file is None:
+            return
+        if self.loop_points is not None:
+            self.end_loop()
+        elif self.loop_mark is None:
+            self.loop_mark = self.get_playback_position()
+            self.loop_file = self.current_file
+            self.notify()
+        else:
+            self.set_loop(self.loop_mark, self.get_playback_position())
+
+    def set_loop(self, start, end):
+        """再生中の曲の start～end秒を繰り返す（展開が終わるとAから繰り返し再生を始める）"""
+        if self.current_file is None:
+            raise ValueError("再生中の曲がありません")
+        start, end = sorted((max(0.0, start), max(0.0, end)))
+        if self.current_track_length > 0:
+            end = min(end, self.current_track_length)
+        if end - start < MIN_LOOP_SECONDS:
+            raise ValueError(f"範囲が短すぎます（{MIN_LOOP_SECONDS}秒以上にしてください）")
+        self.clear_loop()
+        self.loop_points = (start, end)
+        self.loop_file = self.current_file
+        # シーク用インデックスと同じスレッドで展開する（インデックスの作成中ならその後になる）
+        self.loop_future = self.seek_index_executor.submit(self.load_loop_segment, self.current_file, start, end)
+        logger.info(f"範囲繰り返し: {start:.2f}秒～{end:.2f}秒を展開しています")
+        self.notify()
+
+    def load_loop_segment(self, file_path, start, end):
+        """ワーカースレッドで呼ばれる。A-B間をメモリに展開する"""
+        return decode_segment(file_path, self.seek_indexes.get(file_path), start, end)
+
+    def start_loop(self):
+        """展開が終わったA-B間の繰り返し再生を始める"""
+        future, self.loop_future = self.loop_future, None
+        try:
+            samples = future.result()
+        except Exception as e:
+            logger.error(f"範囲繰り返しの準備に失敗しました: {e}")
+            self.clear_loop()
+            self.notify()
+            return
+        if self.current_file != self.loop_file or not len(samples):
+            self.clear_loop()
+            self.notify()
+            return
+        start, end = self.loop_points
+        position = self.get_playback_position()
+        if not start <= position < end:
+            position = start
+        # ファイルからの再生をやめて、メモリ上の音声に切り替える
+        pygame.mixer.music.stop()
+        self.queued_track_id = None
+        self.loop = SegmentLoop(samples, start, end)
+        self.loop.play(position, self.gain)
+        self.current_position = position
+        logger.info(f"範囲繰り返しを開始しました: {start:.2f}秒～{end:.2f}秒")
+        self.notify()
+
+    def clear_loop(self):
+        """範囲繰り返しの設定を消す（ファイルからの再生は再開しない）"""
+        if self.loop_future is not None:
+            self.loop_future.cancel()
+            self.loop_future = None
+        if self.loop is not None:
+            self.loop.stop()
+            self.loop = None
+        self.loop_mark = None
+        self.loop_points = None
+        self.loop_file = None
+
+    def end_loop(self):
+        """範囲繰り返しをやめて、今の位置からファイルの再生を続ける"""
+        if self.loop is None:
+            self.clear_loop()
+            self.notify()
+            return
+        position = self.loop.position()
+        self.clear_loop()
+        self.start_music(self.current_file, start=position)
+        self.current_position = self.seek_offset
+        if self.is_paused:
+            pygame.mixer.music.pause()
+        logger.info("範囲繰り返しを終了しました")
+        self.notify()
+
+    # --- 再生デバイス ---
+
+    def list_devices(self):
+        """出力デバイス名の一覧（監視スレッドが取得したもの）"""
+        return self.devices.list()
+
+    @staticmethod
+    def mixer_info():
+        """ミキサーの (周波数, フォーマット, チャンネル数)（未初期化の場合はNone）"""
+        return pygame.mixer.get_init()
+
+    def open_device(self, device_name):
+        """ミキサーを指定したデバイスで初期化し直す（見つからない場合はデフォルト）"""
+        with self.devices.lock:  # デバイスの一覧の取得と重ならないようにする
+            return self._open_device(device_name)
+
+    def _open_device(self, device_name):
+        pygame.mixer.quit()
+        if device_name:
+            try:
+                pygame.mixer.init(devicename=device_name)
+                self.device_name = device_name
+                logger.info(f"再生デバイスを設定しました: {device_name}")
+                return True
+            except pygame.error as e:
+                logger.warning(f"デバイスを開けませんでした（デフォルトデバイスを使用します）: {device_name}: {e}")
+        else:
+            logger.info("デフォルトデバイスを使用します。")
+        pygame.mixer.init()
+        self.device_name = ''
+        return not device_name
+
+    def set_device(self, device_name):
+        """選択されたデバイスに切り替える（切り替えられた場合はTrue）"""
+        opened = self.switch_device(device_name)
+        if opened:
+            self.preferred_device = device_name
+        return opened
+
+    def check_devices(self):
+        """デバイスの抜き差しに合わせて再生デバイスを切り替える（一覧が変わった場合はTrue）"""
+        if self.devices.version == self.device_version:
+            return False
+        self.device_version = self.devices.version
+        names = self.devices.names
+        if self.device_name and self.device_name not in names:
+            logger.warning(f"使用中のデバイスが取り外されました（既定のデバイスに切り替えます）: {self.device_name}")
+            self.switch_device('')
+        elif self.preferred_device and self.device_name != self.preferred_device and self.preferred_device in names:
+            logger.info(f"選択していたデバイスが接続されました: {self.preferred_device}")
+            self.switch_device(self.preferred_device)
+        return True
+
+    def switch_device(self, device_name):
+        """再生デバイスを切り替える。再生中・一時停止中の曲は同じサンプル位置から続ける
+
+        pygame（SDL_mixer）のミキサーは1つのデバイスしか開けないので、新しいデバイスを
+        開く前に今のデバイスを閉じる。そのため切り替えの間（ミキサーの初期化し直しと
+        曲の読み込み）は音が途切れる。
+        切り替え先が一覧に無い場合は今のデバイスのまま何もしない。開けなかった場合は
+        元のデバイスに戻す。範囲繰り返し中は展開済みの音声をそのまま使う。
+        """
+        if device_name and device_name not in self.devices.list():
+            logger.warning(f"デバイスが見つかりません: {device_name}")
+            return False
+        started = time.perf_counter()
+        # 位置が進まないように止めてから位置を取る（ミキサーの再生位置なのでずれない）
+        loop = self.loop
+        resume = self.current_file is not None and (loop is not None or pygame.mixer.music.get_pos() >= 0)
+        if loop is not None:
+            loop.pause()
+        elif resume:
+            pygame.mixer.music.pause()
+        position = self.get_playback_position()
+        mixer_format = pygame.mixer.get_init()
+        if loop is not None:
+            loop.stop()
+            self.loop = None
+        self.queued_track_id = None
+        previous_device = self.device_name
+        opened = self.open_device(device_name)
+        if not opened and device_name != previous_device:
+            self.open_device(previous_device)
+        if resume and self.playlist:
+            if loop is not None and pygame.mixer.get_init() == mixer_format:
+                self.loop = SegmentLoop(loop.samples, loop.start, loop.end)
+                self.loop.play(position, self.gain)
+                if self.is_paused:
+                    self.loop.pause()
+            else:
+                # 範囲繰り返し中でミキサーの形式が変わった場合は展開し直す
+                loop_points = self.loop_points
+                self.start_music(self.current_file, start=position)
+                if self.is_paused:
+                    pygame.mixer.music.pause()
+                if loop_points is not None:
+                    self.set_loop(*loop_points)
+            self.current_position = position
+            logger.info(f"再生デバイスを切り替えました: {(time.perf_counter() - started) * 1000:.0f}ms")
+        self.notify()
+        return opened
+
+    # --- 終了処理 ---
+
+    def shutdown(self):
+        """バックグラウンド処理を止めてキャッシュとプレイリストを保存し、ミキサーを閉じる"""
+        self.seek_index_cancel.set()
+        self.devices.stop()
+        self.clear_loop()
+        self.seek_index_executor.shutdown(wait=True, cancel_futures=True)
+        self.loudness.stop()
+        try:
+            self.metadata_cache.close()
+        except Exception as e:
+            logger.error(f"メタデータキャッシュの保存中にエラーが発生しました: {e}")
+        try:
+            self.store.close()
+        except Exception as e:
+            logger.error(f"プレイリストの保存中にエラーが発生しました: {e}")
+        pygame.mixer.quit()
@@ -0,0 +1,210 @@
+import sys
+from array import array
+from search_index import SearchIndex, normalize
+
+# 並べ替えに使える列
+SORT_COLUMNS = ('track', 'title', 'artist', 'length')
+
+NO_TRACK_NUMBER = 2 ** 62  # トラック番号が無い曲は最後に並べる
+# カタカナをひらがなとして並べる（「ア」と「あ」を同じ位置にする）
+_KANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def parse_track_number(text):
+    """TRCKの値（"3/12" など）からトラック番号を数値で取り出す"""
+    try:
+        return int(text.split('/')[0])
+    except ValueError:
+        return NO_TRACK_NUMBER
+
+
+def collation_key(text):
+    """曲名・アーティスト名の並べ替え用のキー（全角・半角、大文字・小文字、ひらがな・カタカナを区別しない）"""
+    return normalize(text).translate(_KANA_TO_HIRAGANA)
+
+
+class PlaylistModel:
+    """プレイリストの曲情報を列ごとの配列で保持する
+
+    各曲には追加時に一意なIDを振り、行番号とIDの対応を双方向に引けるようにする。
+    ID→行番号の辞書は削除された位置以降だけを必要になった時に作り直すので、
+    行の削除で全件を振り直すことはない。
+    検索用の索引は曲の追加・削除に合わせて更新する。
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.titles = []
+        self.artists = []
+        self.track_numbers = []  # TRCKの値（"3/12" など）をそのまま保持
+        self.track_keys = array('q')  # 並べ替え用のトラック番号
+        self.lengths = array('d')  # 曲の長さ（秒）
+        self.ids = array('q')  # 行番号 → 曲ID
+        self._index_of = {}  # 曲ID → 行番号（_valid_upto 未満の行のみ有効）
+        self._valid_upto = 0
+        self._next_id = 1
+        self._search = SearchIndex()
+        self._collation_keys = {}  # 列名 → {曲ID: 並べ替え用のキー}（最初に並べ替えた時に作る）
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        """行のファイルパスを返す"""
+        return self.paths[index]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __delitem__(self, index):
+        self.delete(index)
+
+    def append(self, path, metadata):
+        """曲を末尾に追加し、曲IDを返す"""
+        track_id = self._next_id
+        self._next_id += 1
+        index = len(self.paths)
+        self.paths.append(path)
+        self.titles.append(metadata['title'])
+        # アーティスト名は重複が多いので同じ文字列オブジェクトを共有する
+        self.artists.append(sys.intern(metadata['artist']))
+        self.track_numbers.append(sys.intern(metadata['track_number']))
+        self.track_keys.append(parse_track_number(metadata['track_number']))
+        self.lengths.append(metadata['length'] or 0)
+        self.ids.append(track_id)
+        if self._valid_upto == index:
+            self._index_of[track_id] = index
+            self._valid_upto = index + 1
+        self._search.add(track_id, metadata['title'], metadata['artist'], path)
+        return track_id
+
+    def delete(self, index):
+        """行を削除する"""
+        track_id = self.ids[index]
+        del self.paths[index]
+        del self.titles[index]
+        del self.artists[index]
+        del self.track_numbers[index]
+        del self.track_keys[index]
+        del self.lengths[index]
+        del self.ids[index]
+        self._index_of.pop(track_id, None)
+        # 削除位置以降の行番号は次に参照された時に作り直す
+        self._valid_upto = min(self._valid_upto, index)
+        self._search.remove(track_id)
+
+    def delete_rows(self, indexes):
+        """複数の行をまとめて削除する（各列を1回だけ作り直す）"""
+        removed = set(indexes)
+        if len(removed) <= 1:
+            for index in removed:
+                self.delete(index)
+            return
+        for index in removed:
+            track_id = self.ids[index]
+            self._index_of.pop(track_id, None)
+            self._search.remove(track_id)
+        keep = [i for i in range(len(self.ids)) if i not in removed]
+        self._take(keep)
+        # 最初の削除位置より前の行番号はそのまま使える
+        self._valid_upto = min(self._valid_upto, min(removed))
+
+    def clear(self):
+        self.paths.clear()
+        self.titles.clear()
+        self.artists.clear()
+        self.track_numbers.clear()
+        del self.track_keys[:]
+        del self.lengths[:]
+        del self.ids[:]
+        self._index_of.clear()
+        self._valid_upto = 0
+        self._search.clear()
+        self._collation_keys.clear()
+
+    def id_at(self, index):
+        """行番号から曲IDを返す"""
+        return self.ids[index]
+
+    def index_of(self, track_id):
+        """曲IDから行番号を返す（削除済みの場合はNone）"""
+        index = self._index_of.get(track_id)
+        if index is not None and index < self._valid_upto:
+            return index
+        if self._valid_upto < len(self.ids):
+            self._update_index_of()
+            return self._index_of.get(track_id)
+        return None
+
+    def _update_index_of(self):
+        for i in range(self._valid_upto, len(self.ids)):
+            self._index_of[self.ids[i]] = i
+        self._valid_upto = len(self.ids)
+
+    def sort_order(self, keys):
+        """並べ替え後の行の順番（元の行番号の一覧）を返す
+
+        keys: (列名, 降順かどうか) の一覧で、先頭ほど優先する。
+        安定ソートを優先度の低い列から順に行うので、同じ値の曲は元の順番を保つ。
+        """
+        order = list(range(len(self.ids)))
+        for column, reverse in reversed(keys):
+            order.sort(key=self._sort_values(column).__getitem__, reverse=reverse)
+        return order
+
+    def _sort_values(self, column):
+        """行番号で引ける並べ替え用のキーの一覧"""
+        if column == 'track':
+            return self.track_keys
+        if column == 'length':
+            return self.lengths
+        if column not in ('title', 'artist'):
+            raise ValueError(f"並べ替えできない列です: {column}")
+        texts = self.titles if column == 'title' else self.artists
+        cached = self._collation_keys.get(column, {})
+        keys = {}  # 削除済みの曲のキーはここで捨てる
+        for track_id, text in zip(self.ids, texts):
+            key = cached.get(track_id)
+            keys[track_id] = key if key is not None else collation_key(text)
+        self._collation_keys[column] = keys
+        return [keys[track_id] for track_id in self.ids]
+
+    def reorder(self, order):
+        """行を order（元の行番号の一覧）の順に並べ替える"""
+        if len(order) != len(self.ids):
+            raise ValueError("並べ替えの順番が行数と一致しません")
+        self._take(order)
+        self._index_of.clear()
+        self._valid_upto = 0
+
+    def _take(self, rows):
+        """各列を rows（元の行番号の一覧）の行だけで作り直す"""
+        self.paths = [self.paths[i] for i in rows]
+        self.titles = [self.titles[i] for i in rows]
+        self.artists = [self.artists[i] for i in rows]
+        self.track_numbers = [self.track_numbers[i] for i in rows]
+        self.track_keys = array('q', [self.track_keys[i] for i in rows])
+        self.lengths = array('d', [self.lengths[i] for i in rows])
+        self.ids = array('q', [self.ids[i] for i in rows])
+
+    def find(self, query):
+        """検索語をすべて含む行の番号をプレイリスト順に返す（検索語が空の場合はNone）"""
+        track_ids = self._search.search(query)
+        if track_ids is None:
+            return None
+        self._update_index_of()
+        rows = list(map(self._index_of.__getitem__, track_ids))
+        rows.sort()  # 曲IDの順（追加順）のままならほぼ並べ替え済み
+        return rows
+
+    def row(self, index):
+        """表示用の値 (トラック番号, 曲名, アーティスト, 長さ) を返す"""
+        return (self.track_numbers[index], self.titles[index], self.artists[index], self.lengths[index])
+
+    def metadata(self, index):
+        return {
+            'title': self.titles[index],
+            'artist': self.artists[index],
+            'track_number': self.track_numbers[index],
+            'length': self.lengths[index],
+        }
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+from itertools import groupby
+
+
+class PlaylistStore:
+    """プレイリストをSQLiteに保存する
+
+    複数のプレイリストを保存でき、読み書きするのは選択中（active_id）の1つだけ。
+    追加・削除のたびに全件を書き直さず、変更だけを溜めておき flush() で
+    1つのトランザクションとしてまとめて書き込む（途中で落ちても前回の保存状態に戻るだけ）。
+    行IDはこのクラスで振り、PlaylistModel の曲IDとの対応を保持する。
+    """
+
+    DEFAULT_NAME = "プレイリスト1"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.is_new = not os.path.exists(db_path)  # 旧形式（settings.ini）からの移行判定用
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            " id INTEGER PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " ord INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " id INTEGER PRIMARY KEY,"
+            " playlist_id INTEGER NOT NULL DEFAULT 1,"
+            " ord INTEGER NOT NULL,"
+            " path TEXT NOT NULL)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(tracks)")]
+        if 'playlist_id' not in columns:
+            # プレイリストが1つだけだった頃のデータベース
+            self.conn.execute("ALTER TABLE tracks ADD COLUMN playlist_id INTEGER NOT NULL DEFAULT 1")
+            self.conn.execute("DROP INDEX IF EXISTS tracks_ord")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tracks_playlist_ord ON tracks (playlist_id, ord)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        if self.conn.execute("SELECT COUNT(*) FROM playlists").fetchone()[0] == 0:
+            self.conn.execute("INSERT INTO playlists (id, name, ord) VALUES (1, ?, 1)", (self.DEFAULT_NAME,))
+        self.conn.commit()
+
+        self.next_row_id = (self.conn.execute("SELECT MAX(id) FROM tracks").fetchone()[0] or 0) + 1
+        self.row_of = {}  # 曲ID（PlaylistModel）→ 行ID
+        self.pending = []  # 未書き込みの変更 (SQL, パラメータ)
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'active_playlist'").fetchone()
+        active_id = int(row[0]) if row else None
+        if active_id not in dict(self.list_playlists()):
+            active_id = self.list_playlists()[0][0]
+        self.active_id = None
+        self.activate(active_id)
+
+    # --- プレイリストの一覧 ---
+
+    def list_playlists(self):
+        """プレイリストの (ID, 名前) を表示順に返す"""
+        return self.conn.execute("SELECT id, name FROM playlists ORDER BY ord").fetchall()
+
+    def name_of(self, playlist_id):
+        row = self.conn.execute("SELECT name FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+        return row[0] if row else None
+
+    def create_playlist(self, name):
+        """空のプレイリストを末尾に作り、IDを返す"""
+        with self.conn:
+            max_ord = self.conn.execute("SELECT MAX(ord) FROM playlists").fetchone()[0] or 0
+            cur = self.conn.execute("INSERT INTO playlists (name, ord) VALUES (?, ?)", (name, max_ord + 1))
+        return cur.lastrowid
+
+    def rename_playlist(self, playlist_id, name):
+        with self.conn:
+            self.conn.execute("UPDATE playlists SET name = ? WHERE id = ?", (name, playlist_id))
+
+    def delete_playlist(self, playlist_id):
+        """選択中でないプレイリストを曲ごと削除する"""
+        if playlist_id == self.active_id:
+            raise ValueError("選択中のプレイリストは削除できません")
+        with self.conn:
+            self.conn.execute("DELETE FROM tracks WHERE playlist_id = ?", (playlist_id,))
+            self.conn.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
+
+    def activate(self, playlist_id):
+        """読み書きするプレイリストを切り替える（未保存の変更は先に書き込む）"""
+        self.flush()
+        self.row_of.clear()
+        self.active_id = playlist_id
+        max_ord = self.conn.execute(
+            "SELECT MAX(ord) FROM tracks WHERE playlist_id = ?", (playlist_id,)).fetchone()[0]
+        self.next_ord = (max_ord or 0) + 1
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('active_playlist', ?)",
+                              (str(playlist_id),))
+
+    # --- 選択中のプレイリストの曲 ---
+
+    def load(self):
+        """保存されている曲を順番に (行ID, パス) で返す"""
+        return self.conn.execute(
+            "SELECT id, path FROM tracks WHERE playlist_id = ? ORDER BY ord", (self.active_id,)).fetchall()
+
+    def bind(self, track_id, row_id):
+        """読み込んだ行を曲IDに対応付ける"""
+        self.row_of[track_id] = row_id
+
+    def append(self, track_id, path):
+        """末尾に曲を追加する"""
+        self.row_of[track_id] = self._insert(path)
+
+    def import_paths(self, paths):
+        """パスの一覧を末尾に追加してすぐに保存する（旧形式からの移行用）"""
+        for path in paths:
+            self._insert(path)
+        self.flush()
+
+    def _insert(self, path):
+        row_id = self.next_row_id
+        self.next_row_id += 1
+        self.pending.append(("INSERT INTO tracks (id, playlist_id, ord, path) VALUES (?, ?, ?, ?)",
+                             (row_id, self.active_id, self.next_ord, path)))
+        self.next_ord += 1
+        return row_id
+
+    def delete(self, track_id):
+        row_id = self.row_of.pop(track_id, None)
+        if row_id is not None:
+            self.delete_row(row_id)
+
+    def delete_row(self, row_id):
+        self.pending.append(("DELETE FROM tracks WHERE id = ?", (row_id,)))
+
+    def reorder(self, track_ids):
+        """曲を track_ids の順に並べ替える（読み込み済みの全曲を渡す）
+
+        読み込まれていない行（復元をキャンセルした場合など）は、元の順番のまま後ろに並べる。
+        """
+        self.next_ord = 1
+        loaded = set()
+        for track_id in track_ids:
+            row_id = self.row_of.get(track_id)
+            if row_id is not None:
+                loaded.add(row_id)
+                self.pending.append(("UPDATE tracks SET ord = ? WHERE id = ?", (self.next_ord, row_id)))
+                self.next_ord += 1
+        rows = self.conn.execute(
+            "SELECT id FROM tracks WHERE playlist_id = ? ORDER BY ord", (self.active_id,)).fetchall()
+        for (row_id,) in rows:
+            if row_id not in loaded:
+                self.pending.append(("UPDATE tracks SET ord = ? WHERE id = ?", (self.next_ord, row_id)))
+                self.next_ord += 1
+
+    def clear(self):
+        self.row_of.clear()
+        self.pending.append(("DELETE FROM tracks WHERE playlist_id = ?", (self.active_id,)))
+
+    @property
+    def dirty(self):
+        return bool(self.pending)
+
+    def flush(self):
+        """溜まっている変更を1つのトランザクションで書き込み、書き込んだ件数を返す"""
+        if not self.pending:
+            return 0
+        with self.conn:  # 失敗した場合はロールバックされ、変更は次回に持ち越す
+            # 同じ種類の変更が続く部分はまとめて実行する
+            for sql, group in groupby(self.pending, key=lambda change: change[0]):
+                self.conn.executemany(sql, [params for _, params in group])
+        count = len(self.pending)
+        self.pending.clear()
+        return count
+
+    def close(self):
+        self.flush()
+        self.conn.close()
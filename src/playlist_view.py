@@ -0,0 +1,314 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+from contextlib import contextmanager
+from instrumentation import metrics
+
+
+class PlaylistView:
+    """表示されている行の分だけTreeviewのアイテムを作る仮想化プレイリスト
+
+    Treeviewには画面に収まる数のアイテムだけを作り、スクロール時は各アイテムの
+    内容を書き換える。曲数が増えてもアイテム数・再描画コストは一定になる。
+    行の内容は row_values(index) でプレイリスト側から取得する。
+    選択は行番号の集合で持つので、何行選択しても再描画は表示中の行だけで済む。
+    """
+
+    DRAG_DISTANCE = 5  # ドラッグとみなす移動量（ピクセル）
+
+    def __init__(self, parent, columns, row_count, row_values, style=None, on_move=None):
+        """
+        columns: 列名（先頭は再生中マーク用の列）
+        row_count: 行数を返す関数
+        row_values: 指定行の値（再生中マーク以外の列）を返す関数
+        on_move: 選択行をドラッグで移動した時に (選択行の一覧, 移動先の行) で呼ぶ関数
+                 （移動先はその行の前に入れる位置。末尾なら行数）
+        """
+        self.row_count = row_count
+        self.row_values = row_values
+        self.on_move = on_move
+        self.frame = tk.Frame(parent)
+        options = {'style': style} if style else {}
+        # 選択状態はこのクラスで管理する（Treeview標準の選択は使わない）
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", selectmode="none", **options)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.top = 0  # 先頭に表示している行
+        self.items = []  # 表示用に作成したアイテムID
+        self.slot_of = {}  # アイテムID → 表示位置
+        self.item_values = []  # 各アイテムに最後に設定した値（変化が無ければ書き換えない）
+        self.selected = set()  # 選択中の行
+        self.cursor = None  # キー操作の基準になる行（最後にクリック・選択した行）
+        self.anchor = None  # Shift+クリックで範囲選択する時の起点
+        self.press = None  # ボタンを押した行とY座標（ドラッグの判定用）
+        self.drop_before = None  # ドラッグ中の移動先
+        self.playing = None  # 再生中マークを付ける行
+        self.visible_rows = 1  # 完全に表示できる行数
+        linespace = tkfont.nametofont('TkDefaultFont').metrics('linespace')
+        self.row_height = linespace + 4  # 実際のアイテムから測れるまでの仮の値
+        self.header_height = linespace + 8
+        self.refresh_id = None
+        self.batching = False
+        # ドラッグ中に移動先を示す線
+        self.drop_line = tk.Frame(self.tree, height=2, bg="black")
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<Button-1>", self.on_click, add="+")
+        self.tree.bind("<Control-Button-1>", lambda e: self.on_click(e, toggle=True))
+        self.tree.bind("<Shift-Button-1>", lambda e: self.on_click(e, extend=True))
+        self.tree.bind("<B1-Motion>", self.on_drag)
+        self.tree.bind("<ButtonRelease-1>", self.on_release)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda e: self.move_page(-1))
+        self.tree.bind("<Next>", lambda e: self.move_page(1))
+        self.tree.bind("<Home>", lambda e: self.move_to(0))
+        self.tree.bind("<End>", lambda e: self.move_to(self.row_count() - 1))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    # --- 行と表示位置 ---
+
+    def _measure(self):
+        """実際のアイテムから行の高さとヘッダーの高さを測る"""
+        if self.items:
+            bbox = self.tree.bbox(self.items[0])
+            if bbox:
+                self.header_height = bbox[1]
+                self.row_height = max(1, bbox[3])
+
+    def on_configure(self, event=None):
+        self._measure()
+        height = self.tree.winfo_height()
+        self.visible_rows = max(1, (height - self.header_height) // self.row_height)
+        self.refresh()
+
+    def _clamp_top(self):
+        count = self.row_count()
+        self.top = max(0, min(self.top, count - self.visible_rows))
+
+    def scroll(self, rows):
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    def on_mousewheel(self, event):
+        # Windowsでは1ノッチで120
+        return self.scroll(-3 * int(event.delta / 120) if abs(event.delta) >= 120 else (-1 if event.delta > 0 else 1))
+
+    def on_scrollbar(self, *args):
+        count = self.row_count()
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * count)
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows
+            self.top += amount
+        self.refresh()
+
+    def see(self, index):
+        """指定行が表示されるようにスクロールする"""
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible_rows:
+            self.top = index - self.visible_rows + 1
+        self.refresh()
+
+    def index_at(self, y):
+        """画面上のY座標から行を求める"""
+        item = self.tree.identify_row(y)
+        if not item or item not in self.slot_of:
+            return None
+        index = self.top + self.slot_of[item]
+        return index if index < self.row_count() else None
+
+    # --- 選択 ---
+
+    def selection(self):
+        """選択中の行の一覧を返す（行番号の順）"""
+        count = self.row_count()
+        return sorted(index for index in self.selected if index < count)
+
+    def current(self):
+        """キー操作の基準になる行（選択されていない場合はNone）"""
+        if self.cursor is not None and self.cursor in self.selected and self.cursor < self.row_count():
+            return self.cursor
+        selection = self.selection()
+        return selection[0] if selection else None
+
+    def select(self, index):
+        """行を1つだけ選択して表示する"""
+        self.selected = {index}
+        self.cursor = self.anchor = index
+        self.see(index)
+
+    def set_selection(self, rows, cursor=None):
+        """複数の行を選択する（cursor を省略した場合は最初の行を基準にして表示する）"""
+        self.selected = set(rows)
+        if cursor is None and self.selected:
+            cursor = min(self.selected)
+        self.cursor = self.anchor = cursor
+        if cursor is not None:
+            self.see(cursor)
+        else:
+            self.refresh()
+
+    def select_range(self, index):
+        """起点から指定行までを選択する（起点は変えない）"""
+        anchor = self.anchor if self.anchor is not None and self.anchor < self.row_count() else index
+        self.selected = set(range(min(anchor, index), max(anchor, index) + 1))
+        self.cursor = index
+        self.anchor = anchor
+        self.see(index)
+
+    def toggle(self, index):
+        """行の選択を切り替える"""
+        if index in self.selected:
+            self.selected.discard(index)
+        else:
+            self.selected.add(index)
+        self.cursor = self.anchor = index
+        self.refresh()
+
+    def select_all(self):
+        count = self.row_count()
+        if count:
+            self.selected = set(range(count))
+            self.cursor = self.cursor if self.cursor is not None and self.cursor < count else 0
+            self.refresh()
+        return "break"
+
+    def clear_selection(self):
+        self.selected = set()
+        self.cursor = self.anchor = None
+        self.refresh()
+
+    def move_page(self, direction):
+        step = max(1, self.visible_rows - 1) * direction
+        current = self.current()
+        return self.move_to((current if current is not None else self.top) + step)
+
+    def move_to(self, index):
+        count = self.row_count()
+        if count:
+            self.select(max(0, min(index, count - 1)))
+        return "break"
+
+    def on_click(self, event, toggle=False, extend=False):
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return  # ヘッダーや列の境界は標準の処理に任せる
+        self.tree.focus_set()
+        index = self.index_at(event.y)
+        self.press = None
+        if index is None:
+            return "break" if toggle or extend else None
+        if toggle:
+            self.toggle(index)
+        elif extend:
+            self.select_range(index)
+        else:
+            # 選択中の行はまとめてドラッグできるように、ボタンを離すまで選択を変えない
+            if index not in self.selected:
+                self.select(index)
+            self.press = (index, event.y)
+        return "break" if toggle or extend else None
+
+    def on_drag(self, event):
+        if self.press is None or self.on_move is None:
+            return
+        if self.drop_before is None and abs(event.y - self.press[1]) < self.DRAG_DISTANCE:
+            return
+        # 上下の端ではスクロールする
+        if event.y < self.header_height:
+            self.scroll(-1)
+        elif event.y > self.tree.winfo_height() - self.row_height // 2:
+            self.scroll(1)
+        self.drop_before = self.drop_position(event.y)
+        y = self.header_height + (self.drop_before - self.top) * self.row_height
+        self.drop_line.place(x=0, y=max(self.header_height, y - 1), relwidth=1.0)
+
+    def drop_position(self, y):
+        """Y座標から移動先（その行の前に入れる位置）を求める"""
+        slot = (y - self.header_height + self.row_height // 2) // self.row_height
+        return max(0, min(self.top + slot, self.top + self.visible_rows, self.row_count()))
+
+    def on_release(self, event):
+        press, self.press = self.press, None
+        drop_before, self.drop_before = self.drop_before, None
+        if drop_before is not None:
+            self.drop_line.place_forget()
+            self.on_move(self.selection(), drop_before)
+        elif press is not None and len(self.selected) > 1:
+            # 選択中の行をドラッグせずにクリックした場合はその行だけを選択する
+            self.select(press[0])
+
+    def set_playing(self, index):
+        """再生中マークを付ける行を変更する（表示中の行だけを書き換える）"""
+        if index != self.playing:
+            self.playing = index
+            self.refresh()
+
+    # --- 描画 ---
+
+    def schedule_refresh(self):
+        """行の追加など、連続する変更をまとめて1回だけ再描画する"""
+        if self.refresh_id is None:
+            self.refresh_id = self.tree.after_idle(self.refresh)
+
+    @contextmanager
+    def batch(self):
+        """まとめて変更する間は再描画せず、最後に1回だけ再描画する"""
+        self.batching = True
+        try:
+            yield
+        finally:
+            self.batching = False
+            self.refresh()
+
+    @metrics.timed('tree_refresh')
+    def refresh(self):
+        """表示中の行の内容を更新する"""
+        if self.refresh_id is not None:
+            self.tree.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        if self.batching:
+            return
+        self._clamp_top()
+        count = self.row_count()
+        # 一部だけ見える最下行の分も含めてアイテムを用意する
+        shown = max(0, min(self.visible_rows + 1, count - self.top))
+        measure = not self.items and shown
+        while len(self.items) < shown:
+            item = self.tree.insert("", "end")
+            self.slot_of[item] = len(self.items)
+            self.items.append(item)
+            self.item_values.append(None)
+        while len(self.items) > shown:
+            item = self.items.pop()
+            del self.slot_of[item]
+            self.tree.delete(item)
+            self.item_values.pop()
+
+        selected_items = []
+        for slot, item in enumerate(self.items):
+            index = self.top + slot
+            values = (">" if index == self.playing else "",) + tuple(self.row_values(index))
+            if values != self.item_values[slot]:
+                self.tree.item(item, values=values)
+                self.item_values[slot] = values
+            if index in self.selected:
+                selected_items.append(item)
+        self.tree.selection_set(selected_items)
+
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + self.visible_rows) / count))
+        else:
+            self.scrollbar.set(0, 1)
+        if measure:
+            # 最初のアイテムを作った時に実際の行の高さで表示行数を計算し直す
+            self.tree.after_idle(self.on_configure)
@@ -0,0 +1,96 @@
+import os
+import unicodedata
+
+
+def normalize(text):
+    """検索用に文字列を正規化する（全角・半角と大文字・小文字を区別しない）"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class SearchIndex:
+    """曲名・アーティスト・ファイル名を3文字単位（trigram）で索引する
+
+    trigramごとに曲IDのリスト（追加順）を持ち、検索時は検索語に含まれる
+    trigramのうち最も曲数の少ないリストだけを候補として文字列を照合する。
+    削除した曲はリストからすぐには消さず、照合時に読み飛ばす（溜まったら作り直す）。
+    """
+
+    GRAM = 3
+
+    def __init__(self):
+        self.texts = {}  # 曲ID → 正規化した検索用の文字列
+        self.postings = {}  # trigram → 曲IDのリスト（追加順）
+        self.removed = 0  # リストに残っている削除済みの曲の数
+        self.last_query = None  # 直前の検索（入力途中の絞り込みに使う）
+        self.last_result = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, track_id, title, artist, path):
+        text = normalize(f"{title}\n{artist}\n{os.path.basename(path)}")
+        self.texts[track_id] = text
+        self._index(track_id, text)
+        self.last_query = None  # 追加した曲が直前の検索結果に含まれていない
+
+    def _index(self, track_id, text):
+        postings = self.postings
+        for gram in {text[i:i + self.GRAM] for i in range(len(text) - self.GRAM + 1)}:
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = []
+            ids.append(track_id)
+
+    def remove(self, track_id):
+        if self.texts.pop(track_id, None) is None:
+            return
+        self.removed += 1
+        if self.removed > len(self.texts) + 1000:
+            self.rebuild()
+
+    def rebuild(self):
+        """削除済みの曲を除いて索引を作り直す"""
+        self.postings = {}
+        for track_id, text in self.texts.items():
+            self._index(track_id, text)
+        self.removed = 0
+
+    def clear(self):
+        self.texts.clear()
+        self.postings = {}
+        self.removed = 0
+        self.last_query = None
+
+    def search(self, query):
+        """すべての語を含む曲のIDの一覧を返す（検索語が空の場合はNone）"""
+        query = normalize(query)
+        words = query.split()
+        if not words:
+            return None
+        get_text = self.texts.get
+        if self.last_query is not None and query.startswith(self.last_query):
+            # 入力を続けている場合は直前の結果の中から絞り込む
+            # （入力中だった最後の語より前の語は照合済み）
+            candidates = self.last_result
+            words = words[len(self.last_query.split()) - 1:]
+        else:
+            candidates = None
+            for word in words:
+                for i in range(len(word) - self.GRAM + 1):
+                    ids = self.postings.get(word[i:i + self.GRAM])
+                    if ids is None:
+                        candidates = ()
+                        break
+                    if candidates is None or len(ids) < len(candidates):
+                        candidates = ids
+            if candidates is None:
+                # 3文字未満の語だけの場合は索引を使えない（結果も多いので全件を照合する）
+                candidates = [track_id for track_id, text in self.texts.items() if words[0] in text]
+                words = words[1:]
+        # 語ごとに候補を絞り込む（削除済みの曲もここで除かれる）
+        result = list(candidates)
+        for word in words:
+            result = [track_id for track_id in result if word in get_text(track_id, '')]
+        self.last_query = query
+        self.last_result = result
+        return result
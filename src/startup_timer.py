@@ -0,0 +1,32 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """起動処理の各段階にかかった時間を記録する"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.marks = []  # (段階の名前, かかった時間（ミリ秒）)
+
+    def mark(self, name):
+        """前回の記録からここまでを1つの段階として記録する"""
+        now = time.perf_counter()
+        self.marks.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (self.last - self.started) * 1000
+
+    def report(self, budget_ms=0):
+        """各段階の時間を表示する。目標時間内に収まったかどうかを返す"""
+        total = self.total_ms()
+        stages = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.marks)
+        logger.info(f"起動時間: {total:.0f}ms ({stages})")
+        if budget_ms and total > budget_ms:
+            logger.warning(f"起動時間が目標（{budget_ms}ms）を超えています")
+            return False
+        return True
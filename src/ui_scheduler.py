@@ -0,0 +1,98 @@
+import time
+
+
+class _Subscriber:
+    __slots__ = ('callback', 'interval', 'when_hidden', 'next_due')
+
+    def __init__(self, callback, interval, when_hidden):
+        self.callback = callback
+        self.interval = interval
+        self.when_hidden = when_hidden
+        self.next_due = 0.0
+
+
+class TickScheduler:
+    """再生中だけ動く定期処理のスケジューラ
+
+    登録された処理（サブスクライバー）ごとに次回の実行時刻を持ち、
+    一番早いものに合わせて root.after を1つだけ予約する。
+    一時停止・停止中は止まり、ウィンドウが最小化されている間は
+    when_hidden=True の処理だけを実行する。
+    """
+
+    MIN_DELAY = 10  # ミリ秒
+
+    def __init__(self, root, is_active):
+        """is_active: 定期処理を続けるかどうかを返す関数（再生中ならTrue）"""
+        self.root = root
+        self.is_active = is_active
+        self.subscribers = []
+        self.after_id = None
+        self.hidden = False
+        root.bind("<Unmap>", self._on_unmap, add="+")
+        root.bind("<Map>", self._on_map, add="+")
+
+    def subscribe(self, callback, interval, when_hidden=False):
+        """定期処理を登録する
+
+        interval: 実行間隔（ミリ秒）、または実行後に次の間隔を返す関数
+        when_hidden: ウィンドウが隠れている間も実行するかどうか
+        """
+        subscriber = _Subscriber(callback, interval, when_hidden)
+        self.subscribers.append(subscriber)
+        self.wake()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def wake(self):
+        """再生開始時などに呼び、すぐに定期処理を再開する"""
+        for subscriber in self.subscribers:
+            subscriber.next_due = 0.0
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+        self.after_id = self.root.after(0, self._tick)
+
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self.hidden = True
+
+    def _on_map(self, event):
+        if event.widget is self.root and self.hidden:
+            self.hidden = False
+            self.wake()  # 表示が戻ったらすぐに描画する
+
+    @staticmethod
+    def _interval(subscriber):
+        interval = subscriber.interval
+        return interval() if callable(interval) else interval
+
+    def _tick(self):
+        self.after_id = None
+        now = time.perf_counter()
+        ran = set()
+        for subscriber in list(self.subscribers):
+            if self.hidden and not subscriber.when_hidden:
+                continue
+            if now >= subscriber.next_due:
+                subscriber.callback()
+                subscriber.next_due = now + self._interval(subscriber) / 1000
+                ran.add(subscriber)
+
+        if not self.is_active():
+            # 停止・一時停止した場合は、表示を最終状態にしてから止まる
+            for subscriber in self.subscribers:
+                if subscriber not in ran and (subscriber.when_hidden or not self.hidden):
+                    subscriber.callback()
+            return
+
+        if self.after_id is not None:
+            # 処理中に wake() が呼ばれた場合は、予約が二重にならないように取り消す
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        due = [s.next_due for s in self.subscribers if s.when_hidden or not self.hidden]
+        if due:
+            delay = int((min(due) - time.perf_counter()) * 1000)
+            self.after_id = self.root.after(max(self.MIN_DELAY, delay), self._tick)
@@ -0,0 +1,114 @@
+import os
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PEAK_COLUMNS = 1024  # 1曲あたりのピークの数（表示幅に合わせて間引く・引き伸ばす）
+
+
+def compute_peaks(file_path):
+    """曲を展開して、区間ごとの最小値・最大値を交互に並べたint8のバイト列を返す
+
+    展開は decode_chunks で一定の長さずつ行い、各区間の最小値・最大値だけを残す
+    （長い曲でも曲全体をメモリに展開しない）。
+    """
+    import numpy as np
+    from audio_decode import decode_chunks
+    total, _, chunks = decode_chunks(file_path)
+    count = min(PEAK_COLUMNS, total)
+    if not count:
+        return b''
+    starts = np.arange(count) * total // count  # 各区間の先頭のサンプル位置
+    low = np.full(count, 32767, dtype=np.int16)
+    high = np.full(count, -32768, dtype=np.int16)
+    position = 0
+    for samples in chunks:
+        # チャンネルをまとめて、展開した範囲に含まれる区間ごとの最小値・最大値を求める
+        cuts = starts[(starts > position) & (starts < position + len(samples))] - position
+        bounds = np.concatenate(([0], cuts))
+        columns = np.searchsorted(starts, position + bounds, side='right') - 1
+        low[columns] = np.minimum(low[columns], np.minimum.reduceat(samples.min(axis=1), bounds))
+        high[columns] = np.maximum(high[columns], np.maximum.reduceat(samples.max(axis=1), bounds))
+        position += len(samples)
+    # 曲の長さの見積もりより短かった場合、展開されなかった区間は無音にする
+    empty = low > high
+    low[empty] = high[empty] = 0
+    peaks = np.empty(count * 2, dtype=np.int8)
+    peaks[0::2] = low.astype(np.int32) * 127 // 32768
+    peaks[1::2] = high.astype(np.int32) * 127 // 32768
+    return peaks.tobytes()
+
+
+def resample(peaks, width):
+    """ピークを表示幅の列数に合わせ、列ごとの (最小値, 最大値) の配列を返す（-1.0～1.0）"""
+    import numpy as np
+    values = np.frombuffer(peaks, dtype=np.int8)
+    low, high = values[0::2], values[1::2]
+    # 列数が多い場合は区間をまとめ、少ない場合は同じ値を繰り返す
+    starts = np.arange(width) * len(low) // width
+    return np.minimum.reduceat(low, starts) / 127.0, np.maximum.reduceat(high, starts) / 127.0
+
+
+def _init_worker():
+    from audio_decode import init_worker
+    init_worker()
+
+
+class PeakLoader:
+    """波形表示用のピークをキャッシュから読み、無ければワーカープロセスで計算する
+
+    計算結果は poll() でメインスレッドに渡し、その時にキャッシュへ書き込む。
+    ワーカーは最初の計算の依頼で起動する（画面の起動を遅くしない）。
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.executor = None
+        self.pending = {}  # パス → (Future, stat)
+
+    def request(self, file_path):
+        """キャッシュ済みのピークを返す。無ければ計算を依頼してNoneを返す"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        peaks = self.cache.get_waveform(file_path, stat)
+        if peaks is not None or file_path in self.pending:
+            return peaks
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker)
+        self.pending[file_path] = (self.executor.submit(compute_peaks, file_path), stat)
+        return None
+
+    def is_busy(self):
+        return bool(self.pending)
+
+    def poll(self):
+        """計算が終わったピークを (パス, ピーク) の一覧で返す（失敗した曲のピークはNone）"""
+        results = []
+        for file_path, (future, stat) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[file_path]
+            from audio_decode import TooLongError
+            try:
+                try:
+                    peaks = future.result()
+                except TooLongError as e:
+                    logger.warning(f"長い曲のため波形を作成しませんでした: {file_path}: {e}")
+                    peaks = b''  # 次に再生した時に作り直さないように、空のピークを保存する
+                self.cache.put_waveform(file_path, peaks, stat)
+            except Exception as e:
+                logger.error(f"波形の作成中にエラーが発生しました: {file_path}: {e}")
+                peaks = None
+            results.append((file_path, peaks))
+        return results
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending.clear()
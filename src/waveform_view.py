@@ -0,0 +1,118 @@
+import tkinter as tk
+from waveform import resample
+
+
+class WaveformView:
+    """曲の波形を表示するプログレスバー
+
+    1ピクセル幅の列ごとに線を1本作り、再生位置より前の列を再生済みの色にする。
+    再生位置が動いた時は、前回の位置から新しい位置までの列の色だけを変える
+    （曲の長さや表示幅に関係なく、書き換えるのは動いたピクセル分だけ）。
+    波形が無い曲（計算中・展開できない曲）は細いバーを表示する。
+    """
+
+    HEIGHT = 40
+    PLAYED_COLOR = '#3a7bd5'
+    UNPLAYED_COLOR = '#b8c0c8'
+    PLAYHEAD_COLOR = '#202020'
+    MARKER_COLOR = '#e0a000'  # 範囲繰り返しのA点・B点
+    BAR_HEIGHT = 6  # 波形が無い場合のバーの高さ
+
+    def __init__(self, parent, on_seek):
+        """on_seek: クリックされた位置（0.0～1.0）を受け取る関数"""
+        self.on_seek = on_seek
+        self.canvas = tk.Canvas(parent, height=self.HEIGHT, highlightthickness=0, bd=0,
+                                background=parent.cget('background'))
+        self.peaks = None
+        self.columns = []  # 列ごとの線のアイテムID
+        self.played = 0  # 再生済みの色にしている列の数
+        self.fraction = 0.0
+        self.playhead = None
+        self.markers = []  # 範囲繰り返しのA点・B点の位置（0.0～1.0）
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def width(self):
+        return self.canvas.winfo_width()
+
+    def set_peaks(self, peaks):
+        """表示する波形を変える（Noneの場合はバーを表示する）"""
+        self.peaks = peaks or None
+        self.redraw()
+
+    def redraw(self):
+        """表示幅に合わせて全体を描き直す（曲の切り替え・ウィンドウのサイズ変更時）"""
+        canvas = self.canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if width <= 1:
+            self.columns = []
+            return
+        middle = height // 2
+        if self.peaks is not None:
+            low, high = resample(self.peaks, width)
+            scale = (height - 2) / 2
+            tops = (middle - high * scale).astype(int).tolist()
+            bottoms = (middle - low * scale).astype(int).tolist()
+        else:
+            tops = [middle - self.BAR_HEIGHT // 2] * width
+            bottoms = [middle + self.BAR_HEIGHT // 2] * width
+        self.played = self.pixel_of(self.fraction, width)
+        create_line = canvas.create_line
+        self.columns = [
+            create_line(x, top, x, max(bottom, top + 1),
+                        fill=self.PLAYED_COLOR if x < self.played else self.UNPLAYED_COLOR)
+            for x, (top, bottom) in enumerate(zip(tops, bottoms))
+        ]
+        self.draw_markers()
+        self.playhead = canvas.create_line(self.played, 0, self.played, height, fill=self.PLAYHEAD_COLOR)
+
+    def set_markers(self, markers):
+        """範囲繰り返しのA点・B点を表示する（変わった時だけ描き直す）"""
+        if markers != self.markers:
+            self.markers = markers
+            self.draw_markers()
+
+    def draw_markers(self):
+        canvas = self.canvas
+        canvas.delete('marker')
+        width = len(self.columns)
+        if not width:
+            return
+        height = canvas.winfo_height()
+        pixels = [self.pixel_of(marker, width) for marker in self.markers]
+        if len(pixels) == 2:
+            canvas.create_rectangle(pixels[0], 0, pixels[1], 3, fill=self.MARKER_COLOR, width=0, tags='marker')
+        for x in pixels:
+            canvas.create_line(x, 0, x, height, fill=self.MARKER_COLOR, width=2, tags='marker')
+
+    @staticmethod
+    def pixel_of(fraction, width):
+        return min(width, max(0, int(fraction * width)))
+
+    def set_fraction(self, fraction):
+        """再生位置（0.0～1.0）を表示する。動いた列の色だけを変える"""
+        self.fraction = fraction
+        if not self.columns:
+            return
+        pixel = self.pixel_of(fraction, len(self.columns))
+        if pixel == self.played:
+            return
+        if pixel > self.played:
+            color, changed = self.PLAYED_COLOR, self.columns[self.played:pixel]
+        else:
+            color, changed = self.UNPLAYED_COLOR, self.columns[pixel:self.played]
+        itemconfig = self.canvas.itemconfigure
+        for item in changed:
+            itemconfig(item, fill=color)
+        self.played = pixel
+        self.canvas.coords(self.playhead, pixel, 0, pixel, self.canvas.winfo_height())
+
+    def on_click(self, event):
+        width = self.canvas.winfo_width()
+        if width > 1:
+            self.on_seek(min(1.0, max(0.0, event.x / width)))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# src のモジュールは互いに同じフォルダから読み込む（アプリの起動時と同じにする）
+sys.path.insert(0, os.path.join(REPO_DIR, 'src'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench'))  # テスト用のMP3は bench/corpus.py で作る
@@ -0,0 +1,61 @@
+import io
+import struct
+from duplicates import payload_range
+
+
+def payload(data):
+    return payload_range(io.BytesIO(data), len(data))
+
+
+def id3v2(body_size):
+    size = bytes([(body_size >> 21) & 0x7F, (body_size >> 14) & 0x7F, (body_size >> 7) & 0x7F, body_size & 0x7F])
+    return b'ID3\x03\x00\x00' + size + bytes(body_size)
+
+
+def test_mp3_excludes_id3v2_and_id3v1():
+    audio = b'\xff\xfb\x90\x00' + bytes(413)
+    data = id3v2(200) + audio + b'TAG' + bytes(125)
+    assert payload(data) == (210, 210 + len(audio))
+
+
+def test_mp3_excludes_ape_tag():
+    audio = b'\xff\xfb\x90\x00' + bytes(413)
+    items = bytes(40)
+    footer = b'APETAGEX' + struct.pack('<IIII', 2000, 32 + len(items), 1, 0) + bytes(8)
+    data = audio + items + footer
+    assert payload(data) == (0, len(audio))
+
+
+def flac_block(block_type, body, last=False):
+    return bytes([block_type | (0x80 if last else 0)]) + len(body).to_bytes(3, 'big') + body
+
+
+def test_flac_excludes_metadata_blocks():
+    audio = b'\xff\xf8' + bytes(500)
+    metadata = flac_block(0, bytes(34)) + flac_block(4, b'comment' * 10) + flac_block(1, bytes(64), last=True)
+    data = b'fLaC' + metadata + audio
+    assert payload(data) == (4 + len(metadata), len(data))
+
+
+def test_flac_with_leading_id3_tag():
+    audio = b'\xff\xf8' + bytes(100)
+    data = id3v2(50) + b'fLaC' + flac_block(0, bytes(34), last=True) + audio
+    assert payload(data) == (60 + 4 + 38, len(data))
+
+
+def wav_chunk(chunk_id, body):
+    return chunk_id + struct.pack('<I', len(body)) + body + (b'\x00' if len(body) & 1 else b'')
+
+
+def test_wav_uses_data_chunk_only():
+    samples = bytes(range(100))
+    chunks = wav_chunk(b'fmt ', bytes(16)) + wav_chunk(b'LIST', b'INFO!') + wav_chunk(b'data', samples)
+    chunks += wav_chunk(b'id3 ', bytes(30))
+    data = b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
+    start, end = payload(data)
+    assert data[start:end] == samples
+
+
+def test_other_formats_use_whole_file():
+    data = b'OggS' + bytes(300)
+    assert payload(data) == (0, len(data))
@@ -0,0 +1,87 @@
+import struct
+import pytest
+from corpus import write_mp3
+from loudness import read_replaygain_tags, gain_factor, integrated_loudness, segment_power, gated_loudness
+
+np = pytest.importorskip('numpy')
+
+
+def write_flac(path, tags):
+    """STREAMINFOだけのFLACファイルにVorbis Commentを書く"""
+    from mutagen.flac import FLAC
+    info = (44100 << 44) | (1 << 41) | (15 << 36) | 44100
+    streaminfo = struct.pack('>HH', 4096, 4096) + bytes(6) + info.to_bytes(8, 'big') + bytes(16)
+    with open(path, 'wb') as f:
+        f.write(b'fLaC' + b'\x80' + len(streaminfo).to_bytes(3, 'big') + streaminfo + bytes(100))
+    audio = FLAC(path)
+    for key, value in tags.items():
+        audio[key] = value
+    audio.save()
+
+
+def test_reads_id3_txxx(tmp_path):
+    from mutagen.id3 import ID3, TXXX
+    path = str(tmp_path / 'a.mp3')
+    write_mp3(path, 1.0, tags={'title': "A", 'artist': "B", 'album': "C", 'track': "1"})
+    tags = ID3(path)
+    tags.add(TXXX(encoding=3, desc='REPLAYGAIN_TRACK_GAIN', text=['-3.20 dB']))
+    tags.add(TXXX(encoding=3, desc='replaygain_album_gain', text=['+1.5 dB']))
+    tags.add(TXXX(encoding=3, desc='REPLAYGAIN_TRACK_PEAK', text=['0.912']))
+    tags.save()
+    assert read_replaygain_tags(path) == {'track_gain': -3.2, 'album_gain': 1.5, 'track_peak': 0.912}
+
+
+def test_reads_vorbis_comment_and_r128(tmp_path):
+    path = str(tmp_path / 'a.flac')
+    write_flac(path, {'REPLAYGAIN_TRACK_GAIN': '-6.50 dB', 'replaygain_track_peak': '0.98',
+                      'R128_ALBUM_GAIN': '-512'})
+    assert read_replaygain_tags(path) == {'track_gain': -6.5, 'track_peak': 0.98, 'album_gain': 3.0}
+
+
+def test_replaygain_wins_over_r128(tmp_path):
+    path = str(tmp_path / 'a.flac')
+    write_flac(path, {'R128_TRACK_GAIN': '256', 'REPLAYGAIN_TRACK_GAIN': '-1.0 dB'})
+    assert read_replaygain_tags(path) == {'track_gain': -1.0}
+
+
+def test_missing_or_unsupported_files(tmp_path):
+    path = str(tmp_path / 'plain.mp3')
+    write_mp3(path, 1.0)
+    assert read_replaygain_tags(path) == {}
+    assert read_replaygain_tags(str(tmp_path / 'missing.mp3')) == {}
+    assert read_replaygain_tags(str(tmp_path / 'notes.txt')) == {}
+
+
+def test_gain_factor():
+    assert gain_factor(None, None) == 1.0
+    assert gain_factor(-6.0, None) == pytest.approx(10 ** (-6 / 20))
+    assert gain_factor(-6.0, 0.5, preamp_db=3.0) == pytest.approx(10 ** (-3 / 20))
+    assert gain_factor(4.0, 0.5) == 1.0  # 音量は上げない
+    assert gain_factor(-1.0, 1.25) == pytest.approx(0.8)  # ピークで音割れしない倍率
+
+
+def sine(seconds, amplitude, frequency=1000, sample_rate=44100):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * 32767 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def test_integrated_loudness_of_full_scale_sine():
+    # BS.1770: 片方のチャンネルだけの1kHz・0dBFSの正弦波は -3.01 LKFS
+    samples = np.zeros((44100 * 5, 2), dtype=np.int16)
+    samples[:, 0] = sine(5, 1.0)
+    loudness, blocks = integrated_loudness(samples, 44100)
+    assert loudness == pytest.approx(-3.01, abs=0.1)
+    assert blocks == 47
+
+
+def test_silence_and_short_input_have_no_loudness():
+    assert integrated_loudness(np.zeros((44100 * 2, 2), dtype=np.int16), 44100) == (None, 0)
+    assert integrated_loudness(np.zeros((4410 * 3, 2), dtype=np.int16), 44100) == (None, 0)
+
+
+def test_chunked_segment_power_matches_whole():
+    samples = np.stack([sine(3, 0.5), sine(3, 0.1, frequency=200)], axis=1)
+    whole = segment_power(samples, 44100)
+    chunks = [segment_power(samples[i:i + 44100], 44100) for i in range(0, len(samples), 44100)]
+    assert np.allclose(np.concatenate(chunks), whole)
+    assert gated_loudness(np.concatenate(chunks)) == pytest.approx(integrated_loudness(samples, 44100))
@@ -0,0 +1,40 @@
+import os
+from m3u import iter_m3u, write_m3u
+
+
+def test_round_trip(tmp_path):
+    paths = [str(tmp_path / "music" / "曲 1.mp3"), str(tmp_path / "music" / "b.flac")]
+    playlist = str(tmp_path / "list.m3u8")
+    entries = [(paths[0], "曲", "歌手", 201.4), (paths[1], "B", "", None)]
+    assert write_m3u(playlist, entries) == 2
+    with open(playlist, encoding='utf-8') as f:
+        assert f.read().splitlines()[:3] == ["#EXTM3U", "#EXTINF:201,歌手 - 曲", paths[0]]
+    assert list(iter_m3u(playlist)) == paths
+
+
+def test_relative_paths_urls_and_unsupported_lines(tmp_path):
+    playlist = tmp_path / "list.m3u8"
+    lines = ["﻿#EXTM3U", "", "sub/a.mp3", "../b.ogg", "http://example.com/stream.mp3",
+             "notes.txt", "file:///data/c%20d.wav", "#EXTINF:1,x", "e.MP3"]
+    playlist.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    assert list(iter_m3u(str(playlist))) == [
+        os.path.normpath(str(tmp_path / "sub" / "a.mp3")),
+        os.path.normpath(str(tmp_path.parent / "b.ogg")),
+        os.path.normpath("/data/c d.wav"),
+        os.path.normpath(str(tmp_path / "e.MP3")),
+    ]
+
+
+def test_m3u_falls_back_to_shift_jis(tmp_path):
+    playlist = tmp_path / "list.m3u"
+    playlist.write_bytes("曲.mp3\r\n".encode('cp932'))
+    assert list(iter_m3u(str(playlist))) == [str(tmp_path / "曲.mp3")]
+
+
+def test_cancel(tmp_path):
+    import threading
+    playlist = tmp_path / "list.m3u8"
+    playlist.write_text("a.mp3\n", encoding='utf-8')
+    cancel = threading.Event()
+    cancel.set()
+    assert list(iter_m3u(str(playlist), cancel)) == []
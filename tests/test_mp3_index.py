@@ -0,0 +1,80 @@
+from array import array
+import pytest
+from corpus import write_mp3, frame_size, SAMPLES_PER_FRAME
+from mp3_index import parse_frame_header, SeekIndex, build_seek_index, audio_payload_range
+
+
+def test_parse_frame_header_mpeg1_layer3():
+    assert parse_frame_header(0xFF, 0xFB, 0x90, 0x00) == (417, 44100, 1152)
+    assert parse_frame_header(0xFF, 0xFB, 0x92, 0x00) == (418, 44100, 1152)  # パディングあり
+
+
+def test_parse_frame_header_mpeg2_layer3():
+    assert parse_frame_header(0xFF, 0xF3, 0x90, 0x00) == (261, 22050, 576)
+
+
+@pytest.mark.parametrize('header', [
+    (0xFE, 0xFB, 0x90, 0x00),  # 同期ワードではない
+    (0xFF, 0xEB, 0x90, 0x00),  # 予約済みのバージョン
+    (0xFF, 0xF9, 0x90, 0x00),  # 予約済みのレイヤー
+    (0xFF, 0xFB, 0xF0, 0x00),  # 不正なビットレート
+    (0xFF, 0xFB, 0x00, 0x00),  # フリーフォーマット
+    (0xFF, 0xFB, 0x9C, 0x00),  # 予約済みのサンプリング周波数
+])
+def test_parse_frame_header_rejects_invalid(header):
+    assert parse_frame_header(*header) is None
+
+
+def make_index(count, frame_length=417):
+    return SeekIndex(44100, 1152, array('L', [100 + i * frame_length for i in range(count)]))
+
+
+def test_locate_returns_frame_containing_time():
+    index = make_index(100)
+    duration = index.frame_duration
+    assert index.locate(0) == (100, 0.0)
+    assert index.locate(duration * 2.5) == (100 + 2 * 417, pytest.approx(duration * 2))
+    assert index.locate(duration * 3.01) == (100 + 3 * 417, pytest.approx(duration * 3))
+
+
+def test_locate_clamps_to_first_and_last_frame():
+    index = make_index(10)
+    assert index.locate(-1.0) == (100, 0.0)
+    assert index.locate(3600.0) == (100 + 9 * 417, pytest.approx(index.frame_duration * 9))
+    assert SeekIndex(44100, 1152, array('L')).locate(5.0) == (0, 0.0)
+
+
+def test_byte_range_includes_margin_frames():
+    index = make_index(100)
+    duration = index.frame_duration
+    start_offset, start_time, end_offset = index.byte_range(duration * 10, duration * 20)
+    assert (start_offset, start_time) == (100 + 8 * 417, pytest.approx(duration * 8))
+    assert end_offset == 100 + 23 * 417
+    assert index.byte_range(duration * 90, duration * 99)[2] is None  # ファイルの終わりまで
+
+
+def test_build_seek_index_skips_tags(tmp_path):
+    path = str(tmp_path / 'cbr.mp3')
+    tags = {'title': "曲", 'artist': "A", 'album': "B", 'track': "1"}
+    seconds = write_mp3(path, 2.0, tags=tags)
+    with open(path, 'rb') as f:
+        tag_size = audio_payload_range(f, f.seek(0, 2))[0]
+    index = build_seek_index(path)
+    assert index.sample_rate == 44100 and index.samples_per_frame == SAMPLES_PER_FRAME
+    assert len(index.offsets) == round(seconds * 44100 / SAMPLES_PER_FRAME)
+    assert index.offsets[0] == tag_size
+    assert index.offsets[1] - index.offsets[0] == frame_size(128)
+
+
+def test_build_seek_index_skips_xing_frame(tmp_path):
+    path = str(tmp_path / 'vbr.mp3')
+    seconds = write_mp3(path, 2.0, vbr=True)
+    index = build_seek_index(path)
+    assert index.offsets[0] == frame_size(128)  # 先頭のXingフレームは音声を含まない
+    assert index.length == pytest.approx(seconds)
+
+
+def test_build_seek_index_empty_file(tmp_path):
+    path = tmp_path / 'empty.mp3'
+    path.write_bytes(b'')
+    assert build_seek_index(str(path)) is None
@@ -0,0 +1,89 @@
+import pytest
+from playlist_model import PlaylistModel, parse_track_number, collation_key, NO_TRACK_NUMBER
+
+
+def make_model(rows):
+    """(ファイル名, 曲名, アーティスト, トラック番号, 長さ) の一覧からモデルを作る"""
+    model = PlaylistModel()
+    for path, title, artist, track, length in rows:
+        model.append(path, {'title': title, 'artist': artist, 'track_number': track, 'length': length})
+    return model
+
+
+ROWS = [
+    ('a.mp3', "いろは", "B", "10/12", 200.0),
+    ('b.mp3', "Abc", "A", "2/12", 100.0),
+    ('c.mp3', "イロハ", "A", "", 300.0),
+    ('d.mp3', "ｂｃｄ", "B", "1", 100.0),
+]
+
+
+def test_parse_track_number():
+    assert parse_track_number("3/12") == 3
+    assert parse_track_number("7") == 7
+    assert parse_track_number("") == NO_TRACK_NUMBER
+
+
+def test_collation_key_ignores_width_case_and_kana():
+    assert collation_key("ＡＢＣ") == collation_key("abc")
+    assert collation_key("イロハ") == collation_key("いろは")
+
+
+def test_sort_by_track_number_numerically_and_missing_last():
+    model = make_model(ROWS)
+    assert [model[i] for i in model.sort_order([('track', False)])] == ['d.mp3', 'b.mp3', 'a.mp3', 'c.mp3']
+
+
+def test_sort_by_title_keeps_original_order_for_equal_keys():
+    model = make_model(ROWS)
+    # 「いろは」と「イロハ」は同じ位置なので元の順番のまま
+    assert [model[i] for i in model.sort_order([('title', False)])] == ['b.mp3', 'd.mp3', 'a.mp3', 'c.mp3']
+    assert [model[i] for i in model.sort_order([('title', True)])] == ['a.mp3', 'c.mp3', 'd.mp3', 'b.mp3']
+
+
+def test_sort_by_several_columns():
+    model = make_model(ROWS)
+    order = model.sort_order([('artist', False), ('length', True)])
+    assert [model[i] for i in order] == ['c.mp3', 'b.mp3', 'a.mp3', 'd.mp3']
+
+
+def test_sort_rejects_unknown_column():
+    with pytest.raises(ValueError):
+        make_model(ROWS).sort_order([('path', False)])
+
+
+def test_reorder_keeps_ids_and_lookup():
+    model = make_model(ROWS)
+    ids = {model[i]: model.id_at(i) for i in range(len(model))}
+    model.reorder(model.sort_order([('track', False)]))
+    assert list(model) == ['d.mp3', 'b.mp3', 'a.mp3', 'c.mp3']
+    assert model.row(0) == ("1", "ｂｃｄ", "B", 100.0)
+    for index, path in enumerate(model):
+        assert model.id_at(index) == ids[path]
+        assert model.index_of(ids[path]) == index
+
+
+def test_reorder_rejects_wrong_length():
+    model = make_model(ROWS)
+    with pytest.raises(ValueError):
+        model.reorder([0, 1])
+
+
+def test_delete_rows_updates_lookup_and_search():
+    model = make_model(ROWS)
+    removed = [model.id_at(1), model.id_at(3)]
+    kept = [model.id_at(0), model.id_at(2)]
+    model.delete_rows([3, 1])
+    assert list(model) == ['a.mp3', 'c.mp3']
+    assert [model.index_of(track_id) for track_id in kept] == [0, 1]
+    assert [model.index_of(track_id) for track_id in removed] == [None, None]
+    assert model.find("abc") == []
+    assert model.find("いろは") == [0]
+    assert model.find("c.mp3") == [1]
+
+
+def test_sort_after_delete_uses_remaining_rows():
+    model = make_model(ROWS)
+    model.sort_order([('title', False)])  # 並べ替え用のキーを作っておく
+    model.delete(1)
+    assert [model[i] for i in model.sort_order([('title', False)])] == ['d.mp3', 'a.mp3', 'c.mp3']
@@ -0,0 +1,62 @@
+from search_index import SearchIndex
+
+SONGS = [
+    (1, "Blue Monday", "New Order", "/music/01 blue monday.mp3"),
+    (2, "Blue Velvet", "Bobby Vinton", "/music/02 blue velvet.mp3"),
+    (3, "Monday Monday", "The Mamas & the Papas", "/music/03 monday.mp3"),
+    (4, "ブルー・ライト・ヨコハマ", "いしだあゆみ", "/music/04 ブルー.mp3"),
+]
+
+
+def make_index():
+    index = SearchIndex()
+    for song in SONGS:
+        index.add(*song)
+    return index
+
+
+def fresh_search(query):
+    return sorted(make_index().search(query))
+
+
+def test_matches_all_words_in_any_field():
+    index = make_index()
+    assert sorted(index.search("blue")) == [1, 2]
+    assert sorted(index.search("monday order")) == [1]
+    assert sorted(index.search("vinton")) == [2]
+    assert index.search("   ") is None
+
+
+def test_ignores_width_and_case():
+    index = make_index()
+    assert sorted(index.search("ＢＬＵＥ")) == [1, 2]
+    assert sorted(index.search("ﾌﾞﾙｰ")) == [4]
+
+
+def test_short_words_are_matched_without_trigrams():
+    assert fresh_search("bl") == [1, 2]
+    assert fresh_search("o") == [1, 2, 3]
+
+
+def test_refinement_while_typing_matches_fresh_search():
+    index = make_index()
+    for query in ("m", "mo", "mon", "monday", "monday ", "monday m", "monday ma", "monday mamas"):
+        assert sorted(index.search(query)) == fresh_search(query), query
+
+
+def test_refinement_after_editing_query():
+    index = make_index()
+    index.search("blue v")
+    assert sorted(index.search("blue")) == [1, 2]  # 文字を消した場合は絞り込みに使わない
+    assert sorted(index.search("blue mon")) == [1] == fresh_search("blue mon")
+
+
+def test_added_and_removed_tracks():
+    index = make_index()
+    assert sorted(index.search("blue")) == [1, 2]
+    index.add(5, "Blue Hotel", "Chris Isaak", "/music/05.mp3")
+    assert sorted(index.search("blue h")) == [5]
+    index.remove(1)
+    assert sorted(index.search("blue")) == [2, 5]
+    index.rebuild()
+    assert sorted(index.search("monday")) == [3]